@@ -0,0 +1,114 @@
+"""
+Benchmarks the vectorized BatchMinHash engine against the per-value MinHash loop on the bundled data/sfdc_*.csv tables.
+
+Run from the repository root:
+
+    python benchmarks/minhash_benchmark.py --data-dir data --num-perm 128
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import duckdb
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers.minhash_class import compute_minhash
+from helpers.similarity_index_class import same_type_column_pairs
+
+def load_columns(data_dir):
+    """
+    Loads every data/sfdc_*.csv file into an in-memory DuckDB database and fetches each column as a pandas Series.
+
+    Args:
+        data_dir (str): Directory containing the CSV files.
+
+    Returns:
+        tuple: (dict mapping (table_name, column_name) to pandas.Series, pandas.DataFrame of information_schema.columns)
+    """
+    conn = duckdb.connect()
+
+    for path in sorted(glob.glob(os.path.join(data_dir, 'sfdc_*.csv'))):
+        table_name = os.path.splitext(os.path.basename(path))[0]
+        conn.execute(f"create table {table_name} as select * from '{path}'")
+
+    schema_df = conn.execute("select table_name, column_name, data_type from information_schema.columns").fetchdf()
+
+    columns = {}
+    for table_name, column_name, _ in schema_df.itertuples(index=False):
+        columns[(table_name, column_name)] = conn.execute(f'select "{column_name}" from {table_name}').fetchdf()[column_name]
+
+    conn.close()
+
+    return columns, schema_df
+
+def time_sketches(sketch_method, columns, num_perm):
+    """
+    Sketches every column with the given method.
+
+    Args:
+        sketch_method (str): 'python' or 'numpy'.
+        columns (dict): Maps (table_name, column_name) to a pandas.Series of values.
+        num_perm (int): Number of permutations used in MinHash calculation.
+
+    Returns:
+        tuple: (elapsed seconds, dict mapping (table_name, column_name) to MinHash)
+    """
+    start = time.perf_counter()
+    minhashes = {key: compute_minhash(values, num_perm=num_perm, sketch_method=sketch_method) for key, values in columns.items()}
+    elapsed = time.perf_counter() - start
+
+    return elapsed, minhashes
+
+def exact_jaccard(values1, values2):
+    """
+    Computes the exact Jaccard similarity of the non-null values of two columns.
+    """
+    set1 = set(values1.dropna().tolist())
+    set2 = set(values2.dropna().tolist())
+    union = set1 | set2
+
+    return len(set1 & set2) / len(union) if union else 0.0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--num-perm', type=int, default=128)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    columns, schema_df = load_columns(args.data_dir)
+    total_values = sum(len(values) for values in columns.values())
+    print(f"Columns: {len(columns)}, values: {total_values}, num_perm: {args.num_perm}")
+
+    results = {}
+    best_timings = {}
+    for sketch_method in ('python', 'numpy'):
+        timings = []
+        for _ in range(args.repeat):
+            elapsed, minhashes = time_sketches(sketch_method, columns, args.num_perm)
+            timings.append(elapsed)
+        results[sketch_method] = minhashes
+        best_timings[sketch_method] = min(timings)
+        print(f"{sketch_method:>6}: best {min(timings):.3f}s over {args.repeat} runs ({total_values / min(timings):,.0f} values/s)")
+
+    print(f"speedup: {best_timings['python'] / best_timings['numpy']:.1f}x")
+
+    # Accuracy of both engines against the exact Jaccard of same-type pairs that overlap at all
+    errors = {'python': [], 'numpy': []}
+    for table1, col1, table2, col2 in same_type_column_pairs(schema_df, 'table_name', 'column_name', 'data_type'):
+        exact = exact_jaccard(columns[(table1, col1)], columns[(table2, col2)])
+        if exact == 0:
+            continue
+        for sketch_method, minhashes in results.items():
+            estimate = minhashes[(table1, col1)].jaccard(minhashes[(table2, col2)])
+            errors[sketch_method].append(abs(estimate - exact))
+
+    for sketch_method, method_errors in errors.items():
+        if method_errors:
+            print(f"{sketch_method:>6}: mean absolute Jaccard error {sum(method_errors) / len(method_errors):.4f} over {len(method_errors)} overlapping pairs")
+
+if __name__ == '__main__':
+    main()
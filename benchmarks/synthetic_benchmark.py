@@ -0,0 +1,284 @@
+"""
+Benchmarks the index build on a generated database with planted primary key/foreign key relations. Every stage is timed
+and its peak memory measured, and the relations recovered by the relation map are counted, so speed changes cannot
+silently trade away accuracy.
+
+Run from the repository root:
+
+    python benchmarks/synthetic_benchmark.py --tables 20 --columns 12 --rows 100000 --relations 15
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers.cardinality_class import DuckDBCardinalityIndex
+from helpers.connection_class import DuckDBConnectionManager
+from helpers.initialize_db_class import CSVLoaderToDuckDB
+from helpers.relation_map_class import DuckDBRelationMap
+from helpers.similarity_index_class import DuckDBSimilarityIndex
+
+def parse_type_mix(type_mix):
+    """
+    Parses a type mix such as 'int=0.4,varchar=0.4,double=0.1,date=0.1' into normalized weights.
+
+    Returns:
+        dict: Maps each type to its share of the generated columns.
+    """
+    weights = {}
+    for item in type_mix.split(','):
+        data_type, weight = item.split('=')
+        weights[data_type.strip()] = float(weight)
+
+    total = sum(weights.values())
+
+    return {data_type: weight / total for data_type, weight in weights.items()}
+
+def skewed_choice(rng, values, size, skew):
+    """
+    Samples values with a Zipf-like skew: the value of rank r is drawn with probability proportional to 1 / r^skew.
+    A skew of 0 samples uniformly.
+    """
+    if skew <= 0:
+        return values[rng.integers(0, len(values), size)]
+
+    probabilities = 1.0 / np.arange(1, len(values) + 1) ** skew
+
+    return values[rng.choice(len(values), size=size, p=probabilities / probabilities.sum())]
+
+def generate_column(rng, data_type, rows, skew):
+    """
+    Generates the values of a filler column of the given type, with a random number of distinct values.
+    """
+    distinct = int(rng.choice([2, 10, 100, max(rows // 10, 1), rows]))
+
+    if data_type == 'int':
+        offset = int(rng.integers(0, 10 ** 6))
+        pool = np.arange(offset, offset + distinct)
+    elif data_type == 'double':
+        pool = np.round(rng.normal(rng.uniform(-1000, 1000), rng.uniform(1, 100), distinct), 2)
+    elif data_type == 'date':
+        pool = np.datetime64('2000-01-01') + rng.integers(0, 365 * 30, distinct).astype('timedelta64[D]')
+    else:
+        prefix = ''.join(rng.choice(list('abcdefghijklmnopqrstuvwxyz'), 3))
+        pool = np.array([f"{prefix}_{i}" for i in rng.permutation(distinct)])
+
+    return skewed_choice(rng, pool, rows, skew)
+
+def generate_database(data_dir, tables, columns, rows, type_mix, skew, relations, null_fraction, seed):
+    """
+    Writes one CSV file per generated table. Every table has a unique key column '<table>_key'. Each planted relation
+    adds a column to a child table whose values are drawn, with skew, from the key of a parent table. Column names are
+    prefixed with their table, so relations can only be found from the data and not from matching names.
+
+    Returns:
+        list of tuples: The planted relations as (child_table, child_column, parent_table, parent_column).
+    """
+    rng = np.random.default_rng(seed)
+    weights = parse_type_mix(type_mix)
+    table_names = [f"t{i:03d}" for i in range(tables)]
+    table_rows = {table_name: int(rows * rng.uniform(0.5, 1.5)) for table_name in table_names}
+
+    # Keys of different tables come from disjoint ranges, so unrelated keys never overlap
+    keys = {table_name: i * 10 ** 9 + rng.permutation(table_rows[table_name]) for i, table_name in enumerate(table_names)}
+
+    planted = []
+    child_columns = {table_name: {} for table_name in table_names}
+    for r in range(relations):
+        child, parent = rng.choice(table_names, 2, replace=False)
+        column_name = f"{child}_ref{r}"
+        values = skewed_choice(rng, keys[parent], table_rows[child], skew).astype(object)
+        values[rng.random(table_rows[child]) < null_fraction] = None
+        child_columns[child][column_name] = values
+        planted.append((child, column_name, parent, f"{parent}_key"))
+
+    for table_name in table_names:
+        data = {f"{table_name}_key": keys[table_name]}
+        data_types = rng.choice(list(weights), columns, p=list(weights.values()))
+        for c, data_type in enumerate(data_types):
+            data[f"{table_name}_c{c}"] = generate_column(rng, data_type, table_rows[table_name], skew)
+        data.update(child_columns[table_name])
+
+        pd.DataFrame(data).to_csv(os.path.join(data_dir, f"{table_name}.csv"), index=False)
+
+    return planted
+
+class StageMeter:
+    """
+    Measures the wall time and peak resident memory of a stage. Resident memory is sampled from /proc while the stage
+    runs, and falls back to the process-wide maximum where /proc is unavailable.
+    """
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.results = []
+
+    def rss(self):
+        try:
+            with open('/proc/self/statm') as statm:
+                return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except OSError:
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def measure(self, stage, fn):
+        peak = [self.rss()]
+        start_rss = peak[0]
+        stop = threading.Event()
+
+        def sample():
+            while not stop.wait(self.interval):
+                peak[0] = max(peak[0], self.rss())
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+
+        start = time.perf_counter()
+        try:
+            result = fn()
+        finally:
+            elapsed = time.perf_counter() - start
+            stop.set()
+            sampler.join()
+            peak[0] = max(peak[0], self.rss())
+
+        self.results.append({
+            'stage': stage,
+            'seconds': round(elapsed, 3),
+            'peak_rss_mb': round(peak[0] / 2 ** 20, 1),
+            'rss_growth_mb': round((peak[0] - start_rss) / 2 ** 20, 1),
+            'log': result if isinstance(result, str) else None,
+        })
+        print(f"{stage:>22}: {elapsed:8.3f}s  peak RSS {peak[0] / 2 ** 20:8.1f} MB  (+{(peak[0] - start_rss) / 2 ** 20:.1f} MB)")
+
+        return result
+
+def recovered_relations(db_path, planted, serialized):
+    """
+    Counts the planted relations found in the relation map, in either direction, and in the serialized map.
+
+    Returns:
+        dict: Recall in the relation map and in the serialized map, and the number of edges of each.
+    """
+    with DuckDBConnectionManager.get(db_path).reader() as conn:
+        edges = set(conn.execute(
+            "select table_name_left, column_name_left, table_name_right, column_name_right from relation_map"
+        ).fetchall())
+
+    in_map = [
+        relation for relation in planted
+        if relation in edges or (relation[2], relation[3], relation[0], relation[1]) in edges
+    ]
+    in_serialized = [
+        relation for relation in planted
+        if f"**{relation[0]}.{relation[1]}** references **{relation[2]}.{relation[3]}**" in serialized
+        or f"**{relation[2]}.{relation[3]}** references **{relation[0]}.{relation[1]}**" in serialized
+    ]
+
+    return {
+        'planted': len(planted),
+        'relation_map_edges': len(edges),
+        'relation_map_recall': len(in_map) / len(planted) if planted else None,
+        'serialized_edges': serialized.count(' references '),
+        'serialized_recall': len(in_serialized) / len(planted) if planted else None,
+        'missed': [relation for relation in planted if relation not in in_serialized],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tables', type=int, default=10)
+    parser.add_argument('--columns', type=int, default=8, help="Filler columns per table, besides the key and planted foreign keys.")
+    parser.add_argument('--rows', type=int, default=20000, help="Average rows per table; each table gets 0.5x to 1.5x.")
+    parser.add_argument('--type-mix', default='int=0.4,varchar=0.4,double=0.1,date=0.1')
+    parser.add_argument('--skew', type=float, default=1.0, help="Zipf exponent of value frequencies, 0 for uniform.")
+    parser.add_argument('--relations', type=int, default=8, help="Number of planted foreign keys.")
+    parser.add_argument('--null-fraction', type=float, default=0.05, help="Share of nulls in planted foreign keys.")
+    parser.add_argument('--num-perm', type=int, default=128)
+    parser.add_argument('--similarity-threshold', type=float, default=0.8)
+    parser.add_argument('--use-lsh', action='store_true')
+    parser.add_argument('--prune-with-statistics', action='store_true')
+    parser.add_argument('--containment', action='store_true', help="Also build the containment index and add its edges to the relation map.")
+    parser.add_argument('--verify', action='store_true', help="Verify the relation map and serialize only verified edges.")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--work-dir', help="Directory for the generated files and database. Defaults to a temporary directory.")
+    parser.add_argument('--json', help="Write the results to this JSON file.")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='oqr_benchmark_')
+    data_dir = os.path.join(work_dir, 'data')
+    db_path = os.path.join(work_dir, 'benchmark.duckdb')
+    shutil.rmtree(data_dir, ignore_errors=True)
+    os.makedirs(data_dir)
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    meter = StageMeter()
+    planted = meter.measure('generate', lambda: generate_database(
+        data_dir, args.tables, args.columns, args.rows, args.type_mix, args.skew, args.relations, args.null_fraction, args.seed
+    ))
+    print(f"Generated {args.tables} tables of ~{args.rows} rows with {len(planted)} planted relations in {work_dir}")
+
+    loader = CSVLoaderToDuckDB(data_dir, db_path)
+    cardinality = DuckDBCardinalityIndex(db_path)
+    similarity = DuckDBSimilarityIndex(db_path)
+    relation_map = DuckDBRelationMap(db_path)
+    statistics_table_id = 'column_statistics' if args.prune_with_statistics else None
+
+    meter.measure('load_csv_files', lambda: "\n".join(loader.load_csv_files(display=False)))
+    meter.measure('create_cardinality_table', cardinality.create_cardinality_table)
+    meter.measure('cardinality_approximate', lambda: cardinality.update_duckdb_table_with_cardinality(approximate=True))
+    meter.measure('cardinality_exact', lambda: cardinality.update_duckdb_table_with_cardinality(approximate=False))
+
+    with DuckDBConnectionManager.get(db_path).reader() as conn:
+        columns_df = conn.execute("select * from information_schema.columns").fetchdf()
+
+    similarity_results = meter.measure('similarity_index', lambda: similarity.compute_similarity_index_for_assets(
+        columns_df, args.num_perm, similarity_threshold=args.similarity_threshold, use_lsh=args.use_lsh,
+        statistics_table_id=statistics_table_id
+    ))
+    meter.measure('create_similarity_table', lambda: similarity.create_similarity_index_table(similarity_results))
+
+    containment_table_id = None
+    if args.containment:
+        containment_results = meter.measure('containment_index', lambda: similarity.compute_containment_index_for_assets(
+            columns_df, args.num_perm, containment_threshold=args.similarity_threshold, refresh_signatures=False
+        ))
+        meter.measure('create_containment_table', lambda: similarity.create_containment_index_table(containment_results))
+        containment_table_id = 'containment_index'
+
+    meter.measure('create_relation_map', lambda: relation_map.create_relation_map(
+        'cardinality_index', 'similarity_index', statistics_table_id=statistics_table_id, containment_table_id=containment_table_id
+    ))
+
+    if args.verify:
+        meter.measure('verify_relation_map', lambda: relation_map.verify_relation_map('relation_map'))
+
+    serialized = meter.measure('serialize_relation_map', lambda: relation_map.serialize_relation_map(
+        'relation_map', min_verified_ratio=0.95 if args.verify else None
+    ))
+
+    accuracy = recovered_relations(db_path, planted, serialized)
+    print(f"Recovered {accuracy['relation_map_recall']:.0%} of planted relations in the relation map ({accuracy['relation_map_edges']} edges) "
+          f"and {accuracy['serialized_recall']:.0%} in the serialized map ({accuracy['serialized_edges']} edges)")
+
+    for stage in meter.results:
+        if stage['log'] and 'error' in stage['log'].lower():
+            print(f"{stage['stage']} reported: {stage['log']}")
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump({'arguments': vars(args), 'stages': meter.results, 'accuracy': accuracy}, file, indent=2, default=str)
+
+    DuckDBConnectionManager.close_all()
+
+if __name__ == '__main__':
+    main()
@@ -4,3 +4,13 @@ from .relation_map_class import DuckDBRelationMap, BigQueryRelationMap
 from .api_call_class import callOpenAI
 from .initialize_db_class import CSVLoaderToDuckDB
 from .utility_class import BigQueryHelper
+from .minhash_class import BatchMinHash
+from .worker_pool_class import DuckDBWorkerPool
+from .connection_class import DuckDBConnectionManager
+from .bulk_writer_class import DuckDBBulkWriter
+from .incremental_index_class import DuckDBTableFingerprint, DuckDBIncrementalIndex
+from .column_statistics_class import DuckDBColumnStatistics
+from .pipeline_class import DuckDBIndexPipeline
+from .metrics_class import BuildMetrics, BuildCancelled
+from .job_runner_class import BuildJob, BuildJobRunner
+from .query_cache_class import QueryResultCache
@@ -0,0 +1,151 @@
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+
+from .connection_class import DuckDBConnectionManager
+
+class DuckDBBulkWriter:
+    def __init__(self, db_path):
+        """
+        Initialize the BulkWriter class, which persists index tables in bulk. Data is handed to DuckDB as Arrow tables
+        or DataFrames without row-by-row inserts, and every write runs in a single transaction, so readers see either
+        the previous or the new contents of a table.
+
+        Args:
+            db_path (str): Path to the DuckDB database file.
+        """
+
+        self.db_path = db_path
+        self.connections = DuckDBConnectionManager.get(db_path)
+
+    def to_arrow(self, data, schema=None):
+        """
+        Converts columnar data to an Arrow table.
+
+        Args:
+            data (pyarrow.Table, pyarrow.RecordBatch, list of pyarrow.RecordBatch, pandas.DataFrame, dict or list of
+                  tuples): The rows to write. Lists of tuples require a schema.
+            schema (pyarrow.Schema, optional): Schema of the data. Gives empty data and lists of tuples their column
+                                               names and types.
+
+        Returns:
+            pyarrow.Table: The data as an Arrow table.
+        """
+
+        if isinstance(data, pa.Table):
+            table = data
+        elif isinstance(data, pa.RecordBatch):
+            table = pa.Table.from_batches([data])
+        elif isinstance(data, pd.DataFrame):
+            table = pa.Table.from_pandas(data, preserve_index=False)
+        elif isinstance(data, dict):
+            table = pa.table(data)
+        elif data and isinstance(data[0], pa.RecordBatch):
+            table = pa.Table.from_batches(data)
+        else:
+            if schema is None:
+                raise ValueError("A schema is required to write a list of rows")
+
+            columns = list(zip(*data)) if data else [[] for _ in schema.names]
+            return pa.Table.from_arrays([pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema)
+
+        return table.cast(schema) if schema is not None else table
+
+    def write(self, table_name, data, mode='replace', key_columns=None, delete_where=None, delete_params=None, schema=None):
+        """
+        Writes columnar data to a table in a single transaction.
+
+        Args:
+            table_name (str): Name of the target table.
+            data: The rows to write, in any form accepted by to_arrow.
+            mode (str): 'replace' recreates the table from the data, 'append' inserts the data (after deleting the rows
+                        matching delete_where, if given), and 'merge' updates the rows matching the data on key_columns
+                        and inserts the others. The table is created from the data if it does not exist.
+            key_columns (list of str, optional): Columns identifying a row. Required for 'merge'.
+            delete_where (str, optional): SQL predicate of the rows deleted before an 'append'.
+            delete_params (list, optional): Parameters of delete_where.
+            schema (pyarrow.Schema, optional): Schema of the data, see to_arrow.
+
+        Returns:
+            int: Number of rows written.
+        """
+
+        table = self.to_arrow(data, schema=schema)
+
+        with self.connections.writer() as conn:
+            conn.register('bulk_data', table)
+
+            try:
+                self._write_query(conn, table_name, "select * from bulk_data", None, mode, key_columns, delete_where, delete_params)
+            finally:
+                conn.unregister('bulk_data')
+
+        return table.num_rows
+
+    def write_query(self, table_name, query, params=None, mode='replace', key_columns=None, delete_where=None, delete_params=None):
+        """
+        Writes the result of a query to a table in a single transaction, without fetching it into Python.
+
+        Args:
+            table_name (str): Name of the target table.
+            query (str): Query producing the rows to write.
+            params (list, optional): Parameters of the query.
+            mode (str): 'replace', 'append' or 'merge', see write.
+            key_columns (list of str, optional): Columns identifying a row. Required for 'merge'.
+            delete_where (str, optional): SQL predicate of the rows deleted before an 'append'.
+            delete_params (list, optional): Parameters of delete_where.
+        """
+
+        with self.connections.writer() as conn:
+            self._write_query(conn, table_name, query, params, mode, key_columns, delete_where, delete_params)
+
+    def _write_query(self, conn, table_name, query, params, mode, key_columns, delete_where, delete_params):
+        """
+        Runs the statements of a write in one transaction, rolling it back if any of them fails.
+        """
+
+        if mode not in ('replace', 'append', 'merge'):
+            raise ValueError(f"Unknown write mode: {mode}")
+
+        if mode == 'merge' and not key_columns:
+            raise ValueError("Merge writes require key_columns")
+
+        conn.begin()
+
+        try:
+            if mode == 'replace':
+                conn.execute(f"create or replace table {table_name} as {query}", params)
+            else:
+                conn.execute(f"create table if not exists {table_name} as select * from ({query}) where false", params)
+
+                if mode == 'append':
+                    if delete_where is not None:
+                        conn.execute(f"delete from {table_name} where {delete_where}", delete_params)
+
+                    conn.execute(f"insert into {table_name} by name {query}", params)
+                else:
+                    # UPDATE ... FROM and INSERT BY NAME rather than MERGE INTO, which needs DuckDB 1.4. The source is
+                    # materialized once, as both statements read it
+                    source_table = f"merge_source_{uuid.uuid4().hex}"
+                    conn.execute(f"create temp table {source_table} as {query}", params)
+
+                    columns = [description[0] for description in conn.execute(f"select * from {source_table} limit 0").description]
+                    match = " and ".join(f'{table_name}."{column}" = source."{column}"' for column in key_columns)
+                    updates = ", ".join(f'"{column}" = source."{column}"' for column in columns if column not in key_columns)
+
+                    if updates:
+                        conn.execute(f"update {table_name} set {updates} from {source_table} as source where {match}")
+
+                    conn.execute(f"""
+                        insert into {table_name} by name
+                        select * from {source_table} as source
+                        where not exists (select 1 from {table_name} where {match})
+                    """)
+                    # A failed write rolls the temporary table back with the rest of the transaction
+                    conn.execute(f"drop table {source_table}")
+
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
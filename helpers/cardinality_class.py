@@ -1,108 +1,290 @@
-import duckdb
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
 from google.cloud import bigquery
 from google.cloud.bigquery import SchemaField
 from google.cloud.exceptions import NotFound
 
-from .utility_class import BigQueryHelper
+from .bulk_writer_class import DuckDBBulkWriter
+from .column_statistics_class import DuckDBColumnStatistics, COLUMN_STATISTICS_SCHEMA
+from .connection_class import DuckDBConnectionManager
+from .metrics_class import BuildMetrics
+from .utility_class import BigQueryHelper, INDEX_TABLES
+from .worker_pool_class import DuckDBWorkerPool
+
+# Relative standard error of the HyperLogLog estimators behind approx_count_distinct (1.04 / sqrt(registers)).
+# DuckDB's sketch uses 64 registers; BigQuery's HLL++ uses precision 15 (2^15 registers).
+DUCKDB_APPROX_RELATIVE_ERROR = 1.04 / 64 ** 0.5
+BIGQUERY_APPROX_RELATIVE_ERROR = 1.04 / 2 ** 7.5
+
+CARDINALITY_PROFILE_SCHEMA = pa.schema([
+    ('table_name', pa.string()),
+    ('column_name', pa.string()),
+    ('cardinality', pa.float32()),
+    ('cardinality_method', pa.string()),
+    ('cardinality_error', pa.float32()),
+])
+
 class DuckDBCardinalityIndex:
-    def __init__(self, db_path):
+    def __init__(self, db_path, max_workers=None):
         """
         Initialize the CardinalityIndex class, which connects to a DuckDB database to manage cardinality information.
 
         Args:
             db_path (str): Path to the DuckDB database file.
+            max_workers (int, optional): Number of tables profiled concurrently. Defaults to the number of CPUs.
         """
         
         self.db_path = db_path
+        self.connections = DuckDBConnectionManager.get(db_path)
+        self.bulk_writer = DuckDBBulkWriter(db_path)
+        self.column_statistics = DuckDBColumnStatistics(db_path)
+        self.worker_pool = DuckDBWorkerPool(db_path, max_workers=max_workers)
 
-    def create_cardinality_table(self):
+    def create_cardinality_table(self, tables=None):
         """
         Creates a table in the DuckDB database named 'cardinality_index'. This table will store cardinality information 
         for each column in the database, helping to understand the uniqueness of data in each column.
 
+        Args:
+            tables (list of str, optional): If given, only the rows of these tables are replaced, which also drops the
+                                            rows of tables and columns that no longer exist. Otherwise the whole
+                                            table is rebuilt.
+
         Returns:
             str: A log message indicating the success or failure of the operation.
         """
-        conn = duckdb.connect(database=self.db_path, read_only=False)
-        
         log = ""
         
         try:
-            create_table_sql = """
-                create or replace table cardinality_index as
-
+            index_columns_sql = f"""
                     select
                         table_name,
                         column_name,
                         data_type,
-                        null::float AS cardinality
+                        null::float AS cardinality,
+                        null::varchar AS cardinality_method,
+                        null::float AS cardinality_error
                     
                     from information_schema.columns
+                    
+                    where table_name not in {INDEX_TABLES}
             """
             
-            conn.execute(create_table_sql)
+            if tables is None:
+                self.bulk_writer.write_query('cardinality_index', index_columns_sql)
+            else:
+                self.bulk_writer.write_query(
+                    'cardinality_index', f"{index_columns_sql} and table_name in (select unnest(?::varchar[]))", [list(tables)],
+                    mode='append', delete_where="table_name in (select unnest(?::varchar[]))", delete_params=[list(tables)]
+                )
             
             log = log + ("Cardinality table successful")
             
         except Exception as e:
+            BuildMetrics.active().fail(e)
             
             log = log + (f"Cardinality table error: {e}")
             
-        conn.commit()
-        conn.close()
-
         return log
 
-    def update_duckdb_table_with_cardinality(self):
+    def profile_duckdb_table_cardinality(self, conn, table_name, column_names, approximate=False):
+        """
+        Computes distinct and non-null counts for every listed column of a table in a single aggregate query,
+        so the table is scanned once regardless of how many columns it has.
+
+        Args:
+            conn (duckdb.DuckDBPyConnection): Open connection to the DuckDB database.
+            table_name (str): Name of the table to profile.
+            column_names (list of str): Columns of the table to profile.
+            approximate (bool): If True, estimates distinct counts with HyperLogLog (approx_count_distinct).
+
+        Returns:
+            list of tuples: Each tuple contains (table_name, column_name, cardinality, cardinality_method, cardinality_error).
+        """
+        
+        return self.profile_duckdb_table(conn, table_name, [(column_name, None) for column_name in column_names], approximate=approximate)[0]
+
+    def profile_duckdb_table(self, conn, table_name, columns, approximate=False, statistics=False):
+        """
+        Profiles the cardinality of every listed column of a table, and optionally its column statistics, in a single
+        aggregate query.
+
+        Args:
+            conn (duckdb.DuckDBPyConnection): Open connection to the DuckDB database.
+            table_name (str): Name of the table to profile.
+            columns (list of tuples): (column_name, data_type) of the columns to profile.
+            approximate (bool): If True, estimates distinct counts with HyperLogLog (approx_count_distinct).
+            statistics (bool): If True, also gathers the statistics described by DuckDBColumnStatistics.
+
+        Returns:
+            tuple: (cardinality rows as returned by profile_duckdb_table_cardinality, rows of the statistics table)
+        """
+        
+        method = 'approx' if approximate else 'exact'
+        relative_error = DUCKDB_APPROX_RELATIVE_ERROR if approximate else 0.0
+        
+        aggregates = ['count(*) as row_count']
+        
+        for i, (column_name, data_type) in enumerate(columns):
+            if approximate:
+                aggregates.append(f'approx_count_distinct("{column_name}") as distinct_{i}')
+            else:
+                aggregates.append(f'count(distinct "{column_name}") as distinct_{i}')
+            aggregates.append(f'count("{column_name}") as non_null_{i}')
+            
+            if statistics:
+                aggregates.extend(self.column_statistics.statistics_aggregates(column_name, data_type, i))
+
+        sql = f"""
+        select
+            {", ".join(aggregates)}
+        from "{table_name}"
+        """
+        
+        metrics = BuildMetrics.active()
+        
+        with metrics.measure('profile_table', table_name), metrics.profile('profile_table'):
+            cursor = conn.execute(sql)
+            profile = dict(zip([description[0] for description in cursor.description], cursor.fetchone()))
+            metrics.add(rows=profile['row_count'], queries=1)
+        
+        results = []
+        statistics_rows = []
+        
+        for i, (column_name, data_type) in enumerate(columns):
+            distinct_count = profile[f'distinct_{i}']
+            non_null_count = profile[f'non_null_{i}']
+            if non_null_count:
+                # An estimate can overshoot the number of non-null values, which is the true upper bound
+                cardinality = min(distinct_count * 1.0 / non_null_count, 1.0)
+                results.append((table_name, column_name, cardinality, method, cardinality * relative_error))
+            else:
+                results.append((table_name, column_name, None, method, None))
+            
+            if statistics:
+                distinct_count = min(distinct_count, non_null_count)
+                statistics_rows.append(self.column_statistics.statistics_row(
+                    table_name, column_name, data_type, profile['row_count'], non_null_count,
+                    distinct_count, distinct_count * relative_error, profile, i
+                ))
+            
+        return results, statistics_rows
+
+    def update_duckdb_table_with_cardinality(self, single_scan=True, approximate=False, tables=None, statistics=True):
         """
         Updates the 'cardinality_index' table with cardinality information for each column in the database.
         Cardinality is calculated as the ratio of distinct values to total non-null values for a given column.
+        Alongside the estimate, the index records the method used and its absolute error bound (one standard
+        error for approximate counts, zero for exact counts).
+
+        Args:
+            single_scan (bool): If True, profiles all columns of a table in one aggregate query, profiling tables
+                                concurrently, and writes the whole index in a single bulk update. If False, issues one
+                                update (and one table scan) per column.
+            approximate (bool): If True, uses approx_count_distinct instead of an exact count(distinct ...).
+            tables (list of str, optional): If given, only the columns of these tables are profiled.
+            statistics (bool): If True, the single scan also rebuilds the 'column_statistics' table, see
+                               DuckDBColumnStatistics.
 
         Returns:
             str: A log message indicating the success or failure of the operation.
         """
         
-        conn = duckdb.connect(database=self.db_path, read_only=False)
+        query = f"select table_name, column_name, data_type from cardinality_index"
         
-        query = f"select table_name, column_name from cardinality_index"
+        with self.connections.reader() as conn:
+            df = conn.execute(query).fetchdf()
         
-        df = conn.execute(query).fetchdf()
+        if tables is not None:
+            df = df[df['table_name'].isin(tables)]
         
         log = ""
         
         try:
             
-            for index, row in df.iterrows():
-                target_table = row['table_name']
-                target_column = row['column_name']
-
-                sql = f"""
-                update cardinality_index
-                set cardinality = (
-                    select count(distinct \"{target_column}\") * 1.0 / count(\"{target_column}\")
-                    from {target_table}
-                    where \"{target_column}\" is not null
+            if single_scan:
+                profiled_tables = [
+                    (target_table, list(zip(columns['column_name'], columns['data_type'])))
+                    for target_table, columns in df.groupby('table_name', sort=False)
+                ]
+                
+                table_profiles = self.worker_pool.map_cursors(
+                    lambda cursor, table: self.profile_duckdb_table(cursor, table[0], table[1], approximate, statistics), profiled_tables
                 )
-                where table_name = '{target_table}' and column_name = '{target_column}'
-                """
+                profile = [row for table_profile, _ in table_profiles for row in table_profile]
                 
-                conn.execute(sql)
+                self.bulk_writer.write(
+                    'cardinality_index', profile, mode='merge', key_columns=['table_name', 'column_name'], schema=CARDINALITY_PROFILE_SCHEMA
+                )
+                
+                if statistics:
+                    statistics_rows = [row for _, table_statistics in table_profiles for row in table_statistics]
+                    statistics_table_id = self.column_statistics.statistics_table_id
+                    
+                    if tables is None:
+                        self.bulk_writer.write(statistics_table_id, statistics_rows, schema=COLUMN_STATISTICS_SCHEMA)
+                    else:
+                        self.bulk_writer.write(
+                            statistics_table_id, statistics_rows, mode='append', schema=COLUMN_STATISTICS_SCHEMA,
+                            delete_where="table_name in (select unnest(?::varchar[]))", delete_params=[list(tables)]
+                        )
+                
+            else:
+                method = 'approx' if approximate else 'exact'
+                relative_error = DUCKDB_APPROX_RELATIVE_ERROR if approximate else 0.0
+            
+                with self.connections.writer() as conn:
+                    for index, row in df.iterrows():
+                        target_table = row['table_name']
+                        target_column = row['column_name']
+                
+                        if approximate:
+                            distinct_count = f'approx_count_distinct(\"{target_column}\")'
+                        else:
+                            distinct_count = f'count(distinct \"{target_column}\")'
+
+                        sql = f"""
+                        update cardinality_index
+                        set cardinality = profile.cardinality,
+                            cardinality_method = '{method}',
+                            cardinality_error = profile.cardinality * {relative_error}
+                        from (
+                            select least({distinct_count} * 1.0 / count(\"{target_column}\"), 1.0) as cardinality
+                            from {target_table}
+                            where \"{target_column}\" is not null
+                        ) profile
+                        where table_name = '{target_table}' and column_name = '{target_column}'
+                        """
+                
+                        with BuildMetrics.active().measure('profile_column', target_table, target_column) as record:
+                            conn.execute(sql)
+                            record.add(queries=1)
 
             log = log + ("Update cardinality successful")
-            
+        
         except Exception as e:
-            
+            BuildMetrics.active().fail(e)
+        
             log = log + (f"Update cardinality error: {e}")
 
-        conn.commit()
-        conn.close()
-        
         return log
 
 class BigQueryCardinalityIndex:
-    def __init__(self, key_path):
+    def __init__(self, key_path, client=None, max_workers=None):
+        """
+        Initialize the CardinalityIndex class for BigQuery.
+
+        Args:
+            key_path (str): Path to the service account key file.
+            client (google.cloud.bigquery.Client, optional): Client to use instead of one created from key_path.
+            max_workers (int, optional): Number of tables profiled concurrently. Defaults to the number of CPUs.
+        """
         self.key_path = key_path
-        self.bigquery_helper = BigQueryHelper(key_path)
+        self.bigquery_helper = BigQueryHelper(key_path, client=client)
+        self.max_workers = max_workers or os.cpu_count() or 1
 
     def build_bigquery_index(self, project_id, df, dataset_id, table_id, replace):
         df = df[~((df['dataset'] == dataset_id) & (df['table'] == table_id))]
@@ -114,6 +296,8 @@ class BigQueryCardinalityIndex:
             SchemaField('datatype', 'STRING', mode='REQUIRED'),
             SchemaField('description', 'STRING'),
             SchemaField('cardinality', 'FLOAT'),
+            SchemaField('cardinality_method', 'STRING'),
+            SchemaField('cardinality_error', 'FLOAT'),
         ]
 
         dataset_ref = self.bigquery_helper.client.dataset(dataset_id)
@@ -130,22 +314,141 @@ class BigQueryCardinalityIndex:
         
         return log
 
-    def update_bigquery_table_with_cardinality(self, project_id, dataset_id, table_id):
+    def profile_bigquery_table_cardinality(self, target_dataset, target_table, column_names, approximate=False):
+        """
+        Computes distinct and non-null counts for every listed column of a table in a single SELECT job, so the table
+        is scanned once regardless of how many columns it has.
+
+        Args:
+            target_dataset (str): Dataset of the table to profile.
+            target_table (str): Name of the table to profile.
+            column_names (list of str): Columns of the table to profile.
+            approximate (bool): If True, estimates distinct counts with HyperLogLog++ (APPROX_COUNT_DISTINCT).
+
+        Returns:
+            list of tuples: Each tuple contains (dataset, table, column, cardinality, cardinality_method, cardinality_error).
+        """
+        method = 'approx' if approximate else 'exact'
+        relative_error = BIGQUERY_APPROX_RELATIVE_ERROR if approximate else 0.0
+
+        aggregates = []
+
+        for i, column_name in enumerate(column_names):
+            if approximate:
+                aggregates.append(f"APPROX_COUNT_DISTINCT(`{column_name}`) AS distinct_{i}")
+            else:
+                aggregates.append(f"COUNT(DISTINCT `{column_name}`) AS distinct_{i}")
+            aggregates.append(f"COUNT(`{column_name}`) AS non_null_{i}")
+
+        sql = f"""
+        SELECT
+            {", ".join(aggregates)}
+        FROM `{target_dataset}.{target_table}`
+        """
+
+        counts = list(list(self.bigquery_helper.client.query(sql).result())[0].values())
+
+        results = []
+
+        for i, column_name in enumerate(column_names):
+            distinct_count = counts[2 * i]
+            non_null_count = counts[2 * i + 1]
+            if non_null_count:
+                # An estimate can overshoot the number of non-null values, which is the true upper bound
+                cardinality = min(distinct_count * 1.0 / non_null_count, 1.0)
+                results.append((target_dataset, target_table, column_name, cardinality, method, cardinality * relative_error))
+            else:
+                results.append((target_dataset, target_table, column_name, None, method, None))
+
+        return results
+
+    def update_bigquery_table_with_cardinality(self, project_id, dataset_id, table_id, approximate=False, single_scan=True):
+        """
+        Updates the cardinality index with the cardinality of every column it lists.
+
+        Args:
+            project_id (str): Project of the cardinality index.
+            dataset_id (str): Dataset of the cardinality index.
+            table_id (str): Name of the cardinality index table.
+            approximate (bool): If True, uses APPROX_COUNT_DISTINCT instead of an exact COUNT(DISTINCT ...).
+            single_scan (bool): If True, profiles all columns of a source table in one SELECT, profiling tables
+                                concurrently, then loads the results into a staging table and applies them with a
+                                single MERGE. If False, issues one UPDATE job (and one table scan) per column.
+
+        Returns:
+            str: A log message.
+        """
+        method = 'approx' if approximate else 'exact'
+        relative_error = BIGQUERY_APPROX_RELATIVE_ERROR if approximate else 0.0
+
         query = f"SELECT dataset, table, column FROM `{project_id}.{dataset_id}.{table_id}`"
         df = self.bigquery_helper.client.query(query).result().to_dataframe()
 
+        if single_scan:
+            tables = [(target_dataset, target_table, list(columns['column'])) for (target_dataset, target_table), columns in df.groupby(['dataset', 'table'], sort=False)]
+
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                table_profiles = list(executor.map(
+                    lambda table: self.profile_bigquery_table_cardinality(table[0], table[1], table[2], approximate), tables
+                ))
+            profile = [row for table_profile in table_profiles for row in table_profile]
+
+            profile_df = pd.DataFrame(profile, columns=['dataset', 'table', 'column', 'cardinality', 'cardinality_method', 'cardinality_error'])
+            profile_schema = [
+                SchemaField('dataset', 'STRING', mode='REQUIRED'),
+                SchemaField('table', 'STRING', mode='REQUIRED'),
+                SchemaField('column', 'STRING', mode='REQUIRED'),
+                SchemaField('cardinality', 'FLOAT'),
+                SchemaField('cardinality_method', 'STRING'),
+                SchemaField('cardinality_error', 'FLOAT'),
+            ]
+
+            profile_ref = self.bigquery_helper.client.dataset(dataset_id).table(f"{table_id}_profile")
+            job_config = bigquery.LoadJobConfig(schema=profile_schema)
+            job_config.write_disposition = bigquery.WriteDisposition.WRITE_TRUNCATE
+            # The staging table is dropped even if the load or the MERGE fails, so none is left behind in the dataset
+            try:
+                self.bigquery_helper.client.load_table_from_dataframe(profile_df, profile_ref, job_config=job_config).result()
+
+                sql = f"""
+                MERGE INTO `{project_id}.{dataset_id}.{table_id}` AS cardinality_index
+                USING `{project_id}.{dataset_id}.{table_id}_profile` AS profile
+                ON cardinality_index.dataset = profile.dataset
+                    AND cardinality_index.table = profile.table
+                    AND cardinality_index.column = profile.column
+                WHEN MATCHED THEN UPDATE SET
+                    cardinality = profile.cardinality,
+                    cardinality_method = profile.cardinality_method,
+                    cardinality_error = profile.cardinality_error
+                """
+                self.bigquery_helper.client.query(sql).result()
+            finally:
+                self.bigquery_helper.client.delete_table(profile_ref, not_found_ok=True)
+
+            log = (f"Cardinality index at {project_id}.{dataset_id}.{table_id} successfully populated")
+
+            return log
+
         for index, row in df.iterrows():
             target_dataset = row['dataset']
             target_table = row['table']
             target_column = row['column']
 
+            if approximate:
+                distinct_count = f"APPROX_COUNT_DISTINCT({target_column})"
+            else:
+                distinct_count = f"COUNT(DISTINCT {target_column})"
+
             sql = f"""
             UPDATE `{project_id}.{dataset_id}.{table_id}`
-            SET Cardinality = (
-                SELECT SAFE_DIVIDE(COUNT(DISTINCT {target_column}), COUNT({target_column}))
+            SET Cardinality = profile.cardinality,
+                cardinality_method = '{method}',
+                cardinality_error = profile.cardinality * {relative_error}
+            FROM (
+                SELECT LEAST(SAFE_DIVIDE({distinct_count}, COUNT({target_column})), 1) AS cardinality
                 FROM `{target_dataset}.{target_table}`
                 WHERE {target_column} IS NOT NULL
-            )
+            ) profile
             WHERE Dataset = '{target_dataset}' AND table = '{target_table}' AND column = '{target_column}'
             """
             self.bigquery_helper.client.query(sql).result()
@@ -0,0 +1,206 @@
+import pyarrow as pa
+
+from .connection_class import DuckDBConnectionManager
+
+COLUMN_STATISTICS_SCHEMA = pa.schema([
+    ('table_name', pa.string()),
+    ('column_name', pa.string()),
+    ('data_type', pa.string()),
+    ('row_count', pa.int64()),
+    ('non_null_count', pa.int64()),
+    ('null_fraction', pa.float64()),
+    ('distinct_count', pa.float64()),
+    ('distinct_error', pa.float64()),
+    ('min_value', pa.string()),
+    ('max_value', pa.string()),
+    ('min_numeric', pa.float64()),
+    ('max_numeric', pa.float64()),
+    ('avg_length', pa.float64()),
+    ('top_k', pa.list_(pa.string())),
+])
+
+# Types whose values are compared as numbers; dates and timestamps are compared as epoch seconds
+NUMERIC_TYPES = ('TINYINT', 'SMALLINT', 'INTEGER', 'BIGINT', 'HUGEINT', 'UTINYINT', 'USMALLINT', 'UINTEGER', 'UBIGINT', 'FLOAT', 'DOUBLE', 'DECIMAL')
+TEMPORAL_TYPES = ('DATE', 'TIMESTAMP')
+
+class DuckDBColumnStatistics:
+    def __init__(self, db_path, statistics_table_id='column_statistics', top_k=5):
+        """
+        Initialize the ColumnStatistics class, which describes each column of the database in the 'column_statistics'
+        table: row and null counts, distinct count, minimum and maximum, average length and most frequent values.
+        The statistics are gathered in the same aggregate query that profiles a table's cardinality, and are used to
+        discard column pairs that cannot be similar before any column is sketched.
+
+        Args:
+            db_path (str): Path to the DuckDB database file.
+            statistics_table_id (str): Name of the statistics table.
+            top_k (int): Number of most frequent values kept per column.
+        """
+
+        self.db_path = db_path
+        self.statistics_table_id = statistics_table_id
+        self.top_k = top_k
+        self.connections = DuckDBConnectionManager.get(db_path)
+
+    def statistics_aggregates(self, column_name, data_type, i):
+        """
+        Returns the aggregate expressions gathering the statistics of one column, to be added to a table's profile query.
+
+        Args:
+            column_name (str): Name of the column.
+            data_type (str): DuckDB data type of the column.
+            i (int): Position of the column in the profile query, used to name the aggregates.
+
+        Returns:
+            list of str: Aggregate expressions.
+        """
+
+        column = f'"{column_name}"'
+        data_type = (data_type or '').upper()
+
+        # Nested values have no useful order or frequent values
+        nested = data_type.endswith(']') or data_type.startswith(('STRUCT', 'MAP', 'UNION'))
+
+        if data_type.startswith(NUMERIC_TYPES):
+            numeric = f'{column}::double'
+        elif data_type.startswith(TEMPORAL_TYPES):
+            numeric = f'epoch({column})'
+        else:
+            numeric = None
+
+        return [
+            f'null::varchar as min_value_{i}' if nested else f'min({column})::varchar as min_value_{i}',
+            f'null::varchar as max_value_{i}' if nested else f'max({column})::varchar as max_value_{i}',
+            f'min({numeric}) as min_numeric_{i}' if numeric else f'null::double as min_numeric_{i}',
+            f'max({numeric}) as max_numeric_{i}' if numeric else f'null::double as max_numeric_{i}',
+            f'avg(length({column}::varchar)) as avg_length_{i}',
+            f'null::varchar[] as top_k_{i}' if nested else f'approx_top_k({column}, {self.top_k})::varchar[] as top_k_{i}',
+        ]
+
+    def statistics_row(self, table_name, column_name, data_type, row_count, non_null_count, distinct_count, distinct_error, profile, i):
+        """
+        Builds the statistics row of one column from the results of its aggregates.
+
+        Args:
+            profile (dict): Maps aggregate names of the profile query to their values.
+            i (int): Position of the column in the profile query.
+
+        Returns:
+            tuple: A row of the statistics table.
+        """
+
+        return (
+            table_name,
+            column_name,
+            data_type,
+            row_count,
+            non_null_count,
+            1.0 - non_null_count / row_count if row_count else None,
+            distinct_count,
+            distinct_error,
+            profile[f'min_value_{i}'],
+            profile[f'max_value_{i}'],
+            profile[f'min_numeric_{i}'],
+            profile[f'max_numeric_{i}'],
+            profile[f'avg_length_{i}'],
+            profile[f'top_k_{i}'],
+        )
+
+    def load_statistics(self):
+        """
+        Loads the statistics table.
+
+        Returns:
+            dict: Maps (table_name, column_name) to a dict of the column's statistics. Empty if the table does not exist.
+        """
+
+        with self.connections.reader() as conn:
+            if not conn.execute("select count(*) from information_schema.tables where table_name = ?", [self.statistics_table_id]).fetchone()[0]:
+                return {}
+
+            statistics_df = conn.execute(f"select * from {self.statistics_table_id}").fetchdf()
+
+        # Missing statistics are None rather than NaN, so they can be told apart from values
+        statistics_df = statistics_df.astype(object).where(statistics_df.notna(), None)
+
+        return {(row['table_name'], row['column_name']): row for row in statistics_df.to_dict('records')}
+
+    def max_key_likeness(self, column_statistics):
+        """
+        Upper bound of a column's cardinality (distinct values per non-null value), allowing two standard errors for
+        approximate distinct counts.
+        """
+
+        if not column_statistics['non_null_count']:
+            return 0.0
+
+        distinct_count = column_statistics['distinct_count'] + 2 * (column_statistics['distinct_error'] or 0)
+
+        return min(distinct_count / column_statistics['non_null_count'], 1.0)
+
+    def max_jaccard(self, statistics1, statistics2):
+        """
+        Upper bound of the Jaccard index of two columns from their statistics: zero if their value ranges do not
+        overlap, otherwise the ratio of their distinct counts, since the intersection is at most the smaller set and
+        the union at least the larger one.
+        """
+
+        if statistics1['min_numeric'] is not None and statistics2['min_numeric'] is not None:
+            if statistics1['max_numeric'] < statistics2['min_numeric'] or statistics2['max_numeric'] < statistics1['min_numeric']:
+                return 0.0
+        elif statistics1['min_value'] is not None and statistics2['min_value'] is not None:
+            if statistics1['max_value'] < statistics2['min_value'] or statistics2['max_value'] < statistics1['min_value']:
+                return 0.0
+
+        distinct1 = (statistics1['distinct_count'] or 0, statistics1['distinct_error'] or 0)
+        distinct2 = (statistics2['distinct_count'] or 0, statistics2['distinct_error'] or 0)
+        (smaller, smaller_error), (larger, larger_error) = sorted([distinct1, distinct2])
+
+        if smaller + 2 * smaller_error <= 0:
+            return 0.0
+
+        return min((smaller + 2 * smaller_error) / max(larger - 2 * larger_error, 1.0), 1.0)
+
+    def prune_columns(self, columns, statistics, min_key_likeness):
+        """
+        Keeps the columns that could be keys, i.e. whose cardinality can reach min_key_likeness. Columns without
+        statistics are kept.
+
+        Args:
+            columns (list of tuples): (table_name, column_name) of each column.
+            statistics (dict): Statistics returned by load_statistics.
+            min_key_likeness (float): Minimum cardinality of a key column.
+
+        Returns:
+            list of tuples: The columns that were kept.
+        """
+
+        return [
+            column for column in columns
+            if column not in statistics or self.max_key_likeness(statistics[column]) >= min_key_likeness
+        ]
+
+    def prune_column_pairs(self, column_pairs, statistics, similarity_threshold):
+        """
+        Keeps the column pairs whose Jaccard index can reach the threshold according to their statistics. Pairs with a
+        column without statistics are kept.
+
+        Args:
+            column_pairs (list of tuples): (table1, column1, table2, column2) of each pair.
+            statistics (dict): Statistics returned by load_statistics.
+            similarity_threshold (float): Minimum similarity index of a pair.
+
+        Returns:
+            list of tuples: The pairs that were kept.
+        """
+
+        kept = []
+
+        for table1, column1, table2, column2 in column_pairs:
+            statistics1 = statistics.get((table1, column1))
+            statistics2 = statistics.get((table2, column2))
+
+            if statistics1 is None or statistics2 is None or self.max_jaccard(statistics1, statistics2) >= similarity_threshold:
+                kept.append((table1, column1, table2, column2))
+
+        return kept
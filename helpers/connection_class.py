@@ -0,0 +1,267 @@
+import os
+import threading
+import weakref
+from contextlib import contextmanager
+
+import duckdb
+
+class DuckDBConnectionManager:
+    # Shared managers keyed by database path, so every helper working on the same file reuses one connection
+    _managers = {}
+    _managers_lock = threading.Lock()
+    # Cursor sets registered by the work running in each thread, see track_cursors
+    _tracking = threading.local()
+
+    def __init__(self, db_path, memory_limit=None, threads=None, temp_directory=None, read_only=False):
+        """
+        Initialize the ConnectionManager class, which owns a single long-lived connection to a DuckDB database and
+        hands out cursors on it. Reader sessions run concurrently, while writer sessions are serialized and committed
+        when they end. The connection is opened on first use and kept open until close, so it holds the database
+        file's lock: other processes, e.g. pipeline.py while the app runs, cannot open the same file meanwhile. Use
+        DuckDBConnectionManager.get to share a manager.
+
+        Args:
+            db_path (str): Path to the DuckDB database file, or ':memory:'.
+            memory_limit (str, optional): DuckDB memory_limit, e.g. '4GB'. Operators spill to temp_directory beyond it.
+            threads (int, optional): Number of threads DuckDB uses per query.
+            temp_directory (str, optional): Directory DuckDB spills to when a query exceeds the memory limit.
+            read_only (bool): If True, the database is opened read-only and writer sessions are refused.
+        """
+
+        self.db_path = db_path
+        self.read_only = read_only
+        self.settings = {}
+        # Settings DuckDB refused, with its error, e.g. a memory limit typed in the app
+        self.rejected_settings = {}
+        self.pid = os.getpid()
+        self._conn = None
+        self._cursors = weakref.WeakSet()
+        self._conn_lock = threading.Lock()
+        self._writer_lock = threading.RLock()
+
+        self.configure(memory_limit=memory_limit, threads=threads, temp_directory=temp_directory)
+
+    @classmethod
+    def get(cls, db_path, memory_limit=None, threads=None, temp_directory=None, read_only=False):
+        """
+        Returns the shared manager of a database, creating it on first use. Settings passed to a later call are
+        applied to the existing manager.
+
+        Args:
+            db_path (str): Path to the DuckDB database file, or ':memory:'.
+            memory_limit (str, optional): DuckDB memory_limit, e.g. '4GB'.
+            threads (int, optional): Number of threads DuckDB uses per query.
+            temp_directory (str, optional): Directory DuckDB spills to when a query exceeds the memory limit.
+            read_only (bool): Only used when the manager is created.
+
+        Returns:
+            DuckDBConnectionManager: The manager of the database.
+        """
+
+        with cls._managers_lock:
+            manager = cls._managers.get(db_path)
+
+            # A manager inherited from a parent process must not reuse the parent's connection
+            if manager is None or manager.pid != os.getpid():
+                manager = cls(db_path, memory_limit=memory_limit, threads=threads, temp_directory=temp_directory, read_only=read_only)
+                cls._managers[db_path] = manager
+            else:
+                manager.configure(memory_limit=memory_limit, threads=threads, temp_directory=temp_directory)
+
+        return manager
+
+    @classmethod
+    def close_all(cls):
+        """
+        Closes the connections of every shared manager.
+        """
+
+        with cls._managers_lock:
+            managers = list(cls._managers.values())
+            cls._managers.clear()
+
+        for manager in managers:
+            manager.close()
+
+    @classmethod
+    @contextmanager
+    def track_cursors(cls, cursors):
+        """
+        Context manager adding every cursor opened by the current thread, on any manager, to a set until it exits, so
+        the queries of one piece of work can be interrupted without touching the others, see interrupt.
+
+        Args:
+            cursors (weakref.WeakSet): The set cursors are added to. None stops tracking in the block.
+        """
+
+        previous = getattr(cls._tracking, 'cursors', None)
+        cls._tracking.cursors = cursors
+
+        try:
+            yield cursors
+        finally:
+            cls._tracking.cursors = previous
+
+    @classmethod
+    def tracked_cursors(cls):
+        """ Returns the set the cursors of the current thread are added to, or None. """
+        return getattr(cls._tracking, 'cursors', None)
+
+    def configure(self, memory_limit=None, threads=None, temp_directory=None):
+        """
+        Updates the DuckDB settings of the database. Settings left as None keep their current value. If the
+        connection is already open, the new settings take effect immediately.
+
+        Args:
+            memory_limit (str, optional): DuckDB memory_limit, e.g. '4GB'.
+            threads (int, optional): Number of threads DuckDB uses per query.
+            temp_directory (str, optional): Directory DuckDB spills to when a query exceeds the memory limit.
+        """
+
+        settings = {'memory_limit': memory_limit, 'threads': threads, 'temp_directory': temp_directory}
+        # Settings that did not change are not applied again, as the app configures the manager on every rerun
+        settings = {name: value for name, value in settings.items() if value is not None and self.settings.get(name) != value}
+
+        self.settings.update(settings)
+
+        with self._conn_lock:
+            if self._conn is not None:
+                for name, value in settings.items():
+                    self.apply_setting(self._conn, name, value)
+
+    def apply_setting(self, conn, name, value):
+        """
+        Applies a DuckDB setting to the connection. A value DuckDB refuses resets the setting to its default and is
+        recorded in rejected_settings, so one bad value does not fail every later session.
+        """
+
+        try:
+            conn.execute(f"set {name} = ?", [value])
+            self.rejected_settings.pop(name, None)
+        except duckdb.Error as e:
+            conn.execute(f"reset {name}")
+            self.settings.pop(name, None)
+            self.rejected_settings[name] = str(e)
+
+    @property
+    def connection(self):
+        """
+        The shared connection, opened with the configured settings on first use.
+        """
+
+        with self._conn_lock:
+            if self._conn is None:
+                self._conn = duckdb.connect(self.db_path, read_only=self.read_only)
+
+                for name, value in list(self.settings.items()):
+                    self.apply_setting(self._conn, name, value)
+
+            return self._conn
+
+    def cursor(self):
+        """
+        Returns a new cursor on the shared connection. Cursors can be used concurrently from different threads and
+        should be closed by the caller.
+
+        Returns:
+            duckdb.DuckDBPyConnection: A cursor on the database.
+        """
+
+        cursor = self.connection.cursor()
+        self._cursors.add(cursor)
+
+        tracked = self.tracked_cursors()
+        if tracked is not None:
+            tracked.add(cursor)
+
+        return cursor
+
+    def interrupt(self, cursors=None):
+        """
+        Interrupts running queries, which raise an InterruptException in the threads running them.
+
+        Args:
+            cursors (iterable, optional): The cursors to interrupt, e.g. those of a build, see track_cursors. Defaults
+                                          to the shared connection and every open cursor.
+        """
+
+        with self._conn_lock:
+            if self._conn is None:
+                return
+
+            if cursors is None:
+                connections = [self._conn] + list(self._cursors)
+            else:
+                connections = [cursor for cursor in list(cursors) if cursor in self._cursors]
+
+        for connection in connections:
+            try:
+                connection.interrupt()
+            except duckdb.Error:
+                # The cursor was closed in the meantime
+                pass
+
+    def version(self):
+        """
+        Returns a token of the current state of the database file, which changes whenever the database is written to:
+        commits are appended to the write-ahead log, and checkpoints move them into the file.
+
+        Returns:
+            tuple: Size and modification time of the file and of its write-ahead log, or None for ':memory:'.
+        """
+
+        if self.db_path == ':memory:':
+            return None
+
+        token = []
+
+        for path in (self.db_path, f"{self.db_path}.wal"):
+            try:
+                stat = os.stat(path)
+                token.append((stat.st_size, stat.st_mtime_ns))
+            except FileNotFoundError:
+                token.append(None)
+
+        return tuple(token)
+
+    @contextmanager
+    def reader(self):
+        """
+        Context manager yielding a cursor for read-only work. Readers do not wait for each other or for writers.
+        """
+
+        cursor = self.cursor()
+
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+
+    @contextmanager
+    def writer(self):
+        """
+        Context manager yielding a cursor for work that modifies the database. Writer sessions of the same manager
+        run one at a time and are committed when the block exits.
+        """
+
+        if self.read_only:
+            raise PermissionError(f"{self.db_path} is opened read-only")
+
+        with self._writer_lock:
+            cursor = self.cursor()
+
+            try:
+                yield cursor
+                cursor.commit()
+            finally:
+                cursor.close()
+
+    def close(self):
+        """
+        Closes the shared connection. It is reopened by the next session.
+        """
+
+        with self._conn_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
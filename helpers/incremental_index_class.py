@@ -0,0 +1,215 @@
+import datetime
+
+import pandas as pd
+
+from .bulk_writer_class import DuckDBBulkWriter
+from .cardinality_class import DuckDBCardinalityIndex
+from .connection_class import DuckDBConnectionManager
+from .similarity_index_class import DuckDBSimilarityIndex
+from .relation_map_class import DuckDBRelationMap
+from .utility_class import INDEX_TABLES
+from .worker_pool_class import DuckDBWorkerPool
+
+class DuckDBTableFingerprint:
+    def __init__(self, db_path, max_workers=None):
+        """
+        Initialize the TableFingerprint class, which tracks a fingerprint per source table in the 'table_fingerprints'
+        table so index builds can tell which tables changed since they last ran.
+
+        Args:
+            db_path (str): Path to the DuckDB database file.
+            max_workers (int, optional): Number of tables fingerprinted concurrently. Defaults to the number of CPUs.
+        """
+
+        self.db_path = db_path
+        self.connections = DuckDBConnectionManager.get(db_path)
+        self.bulk_writer = DuckDBBulkWriter(db_path)
+        self.worker_pool = DuckDBWorkerPool(db_path, max_workers=max_workers)
+
+    def fingerprint_table(self, conn, table_name):
+        """
+        Computes the row count and an order-independent content checksum of a table in a single scan.
+
+        Args:
+            conn (duckdb.DuckDBPyConnection): Connection or cursor to use.
+            table_name (str): Name of the table.
+
+        Returns:
+            tuple: (row_count, content_hash)
+        """
+
+        row_count, content_hash = conn.execute(f'select count(*), sum(hash(t)) from "{table_name}" t').fetchone()
+
+        return row_count, str(content_hash)
+
+    def compute_fingerprints(self):
+        """
+        Computes the current fingerprint of every source table: row count, a hash of its column names and types, and
+        a content checksum.
+
+        Returns:
+            pandas.DataFrame: One row per table with 'table_name', 'row_count', 'schema_hash' and 'content_hash'.
+        """
+
+        with self.connections.reader() as conn:
+            schema_df = conn.execute(f"""
+                select
+                    table_name,
+                    md5(string_agg(column_name || ':' || data_type, ',' order by ordinal_position)) as schema_hash
+                from information_schema.columns
+                where table_name not in {INDEX_TABLES}
+                group by table_name
+                order by table_name
+            """).fetchdf()
+
+        contents = self.worker_pool.map_cursors(self.fingerprint_table, list(schema_df['table_name']))
+
+        schema_df['row_count'] = [row_count for row_count, _ in contents]
+        schema_df['content_hash'] = [content_hash for _, content_hash in contents]
+
+        return schema_df[['table_name', 'row_count', 'schema_hash', 'content_hash']]
+
+    def load_fingerprints(self):
+        """
+        Loads the fingerprints recorded by the last call to save_fingerprints.
+
+        Returns:
+            pandas.DataFrame: The stored fingerprints, empty if none were recorded yet.
+        """
+
+        with self.connections.reader() as conn:
+            if not conn.execute("select count(*) from information_schema.tables where table_name = 'table_fingerprints'").fetchone()[0]:
+                return pd.DataFrame(columns=['table_name', 'row_count', 'schema_hash', 'content_hash'])
+
+            return conn.execute("select table_name, row_count, schema_hash, content_hash from table_fingerprints").fetchdf()
+
+    def save_fingerprints(self, fingerprints):
+        """
+        Records the given fingerprints as the state the indexes were last built from.
+
+        Args:
+            fingerprints (pandas.DataFrame): Fingerprints returned by compute_fingerprints.
+        """
+
+        self.bulk_writer.write('table_fingerprints', fingerprints.assign(fingerprinted_at=datetime.datetime.now()))
+
+    def compare_fingerprints(self, current, stored):
+        """
+        Compares current fingerprints against stored ones.
+
+        Args:
+            current (pandas.DataFrame): Fingerprints returned by compute_fingerprints.
+            stored (pandas.DataFrame): Fingerprints returned by load_fingerprints.
+
+        Returns:
+            tuple: (list of new or changed table names, list of dropped table names)
+        """
+
+        stored_by_table = {row.table_name: (row.row_count, row.schema_hash, row.content_hash) for row in stored.itertuples(index=False)}
+
+        changed = [
+            row.table_name for row in current.itertuples(index=False)
+            if stored_by_table.get(row.table_name) != (row.row_count, row.schema_hash, row.content_hash)
+        ]
+        dropped = sorted(set(stored_by_table) - set(current['table_name']))
+
+        return changed, dropped
+
+class DuckDBIncrementalIndex:
+    def __init__(self, db_path, k=128, similarity_threshold=0.8, approximate=False, use_lsh=False, max_workers=None, prune_with_statistics=False,
+                 use_containment=False, verify_relations=False):
+        """
+        Initialize the IncrementalIndex class, which keeps the cardinality index, MinHash signatures, similarity index
+        and relation map up to date by recomputing them only for tables whose fingerprint changed.
+
+        Args:
+            db_path (str): Path to the DuckDB database file.
+            k (int): Number of permutations used in MinHash calculation.
+            similarity_threshold (float): Minimum similarity index for a column pair to be stored.
+            approximate (bool): If True, cardinalities are estimated with approx_count_distinct.
+            use_lsh (bool): If True, similarity candidates are generated with MinHash LSH.
+            max_workers (int, optional): Number of concurrent workers. Defaults to the number of CPUs.
+            prune_with_statistics (bool): If True, similarity candidates and relation edges are pruned with the column
+                                          statistics gathered alongside the cardinality index.
+            use_containment (bool): If True, the containment index is refreshed too and its foreign key edges are
+                                    added to the relation map.
+            verify_relations (bool): If True, the refreshed edges of the relation map are verified against the data.
+        """
+
+        self.db_path = db_path
+        self.k = k
+        self.similarity_threshold = similarity_threshold
+        self.approximate = approximate
+        self.use_lsh = use_lsh
+        self.statistics_table_id = 'column_statistics' if prune_with_statistics else None
+        self.containment_table_id = 'containment_index' if use_containment else None
+        self.verify_relations = verify_relations
+        self.connections = DuckDBConnectionManager.get(db_path)
+        self.fingerprint = DuckDBTableFingerprint(db_path, max_workers=max_workers)
+        self.cardinality_index = DuckDBCardinalityIndex(db_path, max_workers=max_workers)
+        self.similarity_index = DuckDBSimilarityIndex(db_path, max_workers=max_workers)
+        self.relation_map = DuckDBRelationMap(db_path)
+
+    def refresh_indexes(self, full_rebuild=False):
+        """
+        Rebuilds the cardinality index, similarity index and relation map for the tables that were added or changed
+        since the last refresh, and removes the entries of dropped tables and columns. The first refresh, or one with
+        full_rebuild=True, rebuilds everything.
+
+        Args:
+            full_rebuild (bool): If True, ignores the stored fingerprints and rebuilds every index from scratch.
+
+        Returns:
+            str: A log message describing what was refreshed.
+        """
+
+        current = self.fingerprint.compute_fingerprints()
+        stored = self.fingerprint.load_fingerprints()
+
+        changed, dropped = self.fingerprint.compare_fingerprints(current, stored)
+
+        if full_rebuild or stored.empty:
+            changed, tables = list(current['table_name']), None
+        else:
+            tables = changed + dropped
+
+            if not tables:
+                return "Indexes are up to date"
+
+        logs = []
+        logs.append(self.cardinality_index.create_cardinality_table(tables=tables))
+        logs.append(self.cardinality_index.update_duckdb_table_with_cardinality(approximate=self.approximate, tables=tables))
+
+        if tables is None:
+            logs.append(self.similarity_index.remove_minhash_signatures(dropped))
+        else:
+            logs.append(self.similarity_index.remove_minhash_signatures(tables))
+
+        with self.connections.reader() as conn:
+            df_info_schema_cols = conn.execute("select * from information_schema.columns").fetchdf()
+
+        similarity_results = self.similarity_index.compute_similarity_index_for_assets(
+            df_info_schema_cols, self.k, similarity_threshold=self.similarity_threshold, use_lsh=self.use_lsh, tables=tables,
+            statistics_table_id=self.statistics_table_id
+        )
+        logs.append(self.similarity_index.create_similarity_index_table(similarity_results, tables=tables))
+        
+        if self.containment_table_id is not None:
+            containment_results = self.similarity_index.compute_containment_index_for_assets(
+                df_info_schema_cols, self.k, containment_threshold=self.similarity_threshold, refresh_signatures=False, tables=tables
+            )
+            logs.append(self.similarity_index.create_containment_index_table(containment_results, tables=tables))
+        
+        logs.append(self.relation_map.create_relation_map(
+            'cardinality_index', 'similarity_index', tables=tables, statistics_table_id=self.statistics_table_id,
+            containment_table_id=self.containment_table_id
+        ))
+        
+        if self.verify_relations:
+            logs.append(self.relation_map.verify_relation_map(tables=tables))
+
+        self.fingerprint.save_fingerprints(current)
+
+        logs.append(f"Refreshed {len(changed)} changed and {len(dropped)} dropped tables")
+
+        return "\n".join(logs)
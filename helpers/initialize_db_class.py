@@ -1,46 +1,268 @@
+import datetime
+import hashlib
+import json
 import os
-import duckdb
+import re
 import pandas as pd
+import pyarrow as pa
 import streamlit as st
 import pandas as pd
 from google.cloud.exceptions import NotFound
+
+from .bulk_writer_class import DuckDBBulkWriter
+from .connection_class import DuckDBConnectionManager
+from .metrics_class import BuildMetrics
+from .worker_pool_class import DuckDBWorkerPool
+
+CSV_LOAD_MANIFEST_SCHEMA = pa.schema([
+    ('file_name', pa.string()),
+    ('table_name', pa.string()),
+    ('file_size', pa.int64()),
+    ('file_mtime', pa.float64()),
+    ('content_hash', pa.string()),
+    ('read_options', pa.string()),
+    ('loaded_at', pa.timestamp('us')),
+    ('staged_path', pa.string()),
+])
+
+def sql_literal(value):
+    """ Render a Python value as a DuckDB literal, for read_csv options such as types={'id': 'VARCHAR'}. """
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, dict):
+        return "{" + ", ".join(f"{sql_literal(str(key))}: {sql_literal(item)}" for key, item in value.items()) + "}"
+    if isinstance(value, (list, tuple)):
+        return "[" + ", ".join(sql_literal(item) for item in value) + "]"
+    return "'" + str(value).replace("'", "''") + "'"
+
 class CSVLoaderToDuckDB:
-    def __init__(self, data_dir, db_file_path):
+    def __init__(self, data_dir, db_file_path, max_workers=None, csv_options=None, default_csv_options=None, manifest_table_id='csv_load_manifest',
+                 staging_dir=None, staging_mode='view', staged_columns=None):
+        """
+        Args:
+            data_dir (str): Directory of the CSV files. Each file is loaded into the table named after it.
+            db_file_path (str): Path to the DuckDB database file.
+            max_workers (int, optional): Number of files loaded concurrently. Defaults to the number of CPUs.
+            csv_options (dict, optional): Maps a file name to the read_csv options of that file, e.g.
+                                          {'wide.csv': {'types': {'id': 'VARCHAR'}, 'sample_size': 1000}}.
+                                          Explicit types and a small sample size avoid sniffing wide files.
+            default_csv_options (dict, optional): read_csv options applied to every file, overridden by csv_options.
+            manifest_table_id (str): Name of the table recording the size, mtime and content hash of loaded files.
+            staging_dir (str, optional): If given, each CSV file is converted once to a zstd-compressed Parquet file in
+                                         this directory, keyed by its content hash and read options, and the table is
+                                         built over the Parquet file. Reloads then skip CSV parsing, and profiling
+                                         scans read one column at a time.
+            staging_mode (str): 'view' creates a view over the Parquet file, 'table' copies it into a DuckDB table.
+            staged_columns (dict, optional): Maps a file name to the columns kept in its Parquet file.
+        """
         self.data_dir = data_dir
         self.db_file_path = db_file_path
+        self.csv_options = csv_options or {}
+        self.default_csv_options = default_csv_options or {}
+        self.manifest_table_id = manifest_table_id
+        # Views store the path they read, so a relative one would break when the app runs from another directory
+        self.staging_dir = os.path.abspath(staging_dir) if staging_dir is not None else None
+        self.staging_mode = staging_mode
+        self.staged_columns = staged_columns or {}
+        self.connections = DuckDBConnectionManager.get(db_file_path)
+        self.bulk_writer = DuckDBBulkWriter(db_file_path)
+        self.worker_pool = DuckDBWorkerPool(db_file_path, max_workers=max_workers)
 
     def connect_db(self):
-        """ Connect to a file-based DuckDB database. """
+        """ Open a cursor on the shared connection to a file-based DuckDB database. """
         try:
-            self.conn_build = duckdb.connect(self.db_file_path)
+            self.conn_build = self.connections.cursor()
             return True
         except Exception as e:
+            BuildMetrics.active().fail(e)
             st.write(f"Error: Unable to connect to database: {e}")
             return False
 
-    def load_csv_files(self):
-        """ Load all CSV files from the directory into the DuckDB database. """
+    def read_options(self, filename):
+        """ Return the read_csv options of a file: the defaults updated with the file's own options. """
+        return {**self.default_csv_options, **self.csv_options.get(filename, {})}
+
+    def file_fingerprint(self, filename, previous=None):
+        """
+        Return the size, mtime and content hash of a file. The file is only hashed when its size or mtime differ
+        from the previous manifest entry, so unchanged files are not read at all.
+        """
+        stat = os.stat(os.path.join(self.data_dir, filename))
+
+        if previous is not None and previous['file_size'] == stat.st_size and previous['file_mtime'] == stat.st_mtime:
+            return stat.st_size, stat.st_mtime, previous['content_hash']
+
+        content_hash = hashlib.sha256()
+        with open(os.path.join(self.data_dir, filename), 'rb') as file:
+            for chunk in iter(lambda: file.read(1 << 20), b''):
+                content_hash.update(chunk)
+
+        return stat.st_size, stat.st_mtime, content_hash.hexdigest()
+
+    def staged_path(self, filename, content_hash):
+        """ Return the Parquet file a CSV file is staged to, or None without a staging directory. """
+        if self.staging_dir is None:
+            return None
+
+        key = json.dumps([content_hash, self.read_options(filename), self.staged_columns.get(filename)], sort_keys=True)
+
+        return os.path.join(self.staging_dir, f"{os.path.splitext(filename)[0]}-{hashlib.sha256(key.encode('utf8')).hexdigest()[:16]}.parquet")
+
+    def stage_csv_file(self, filename, content_hash, conn):
+        """ Convert a CSV file to Parquet unless it was already staged with the same content and options, and return its path. """
+        staged_path = self.staged_path(filename, content_hash)
+
+        if not os.path.exists(staged_path):
+            os.makedirs(self.staging_dir, exist_ok=True)
+
+            options = "".join(f", {name} = {sql_literal(value)}" for name, value in self.read_options(filename).items())
+            columns = ", ".join(f'"{column}"' for column in self.staged_columns.get(filename, [])) or "*"
+
+            # Written under a temporary name, so an interrupted conversion never leaves a partial file behind
+            row_count = conn.execute(
+                f"copy (select {columns} from read_csv(?{options})) to {sql_literal(staged_path + '.tmp')} (format parquet, compression zstd)",
+                [os.path.join(self.data_dir, filename)]
+            ).fetchone()[0]
+            BuildMetrics.active().add(rows=row_count, queries=1)
+            os.replace(f"{staged_path}.tmp", staged_path)
+
+        return staged_path
+
+    def remove_stale_staged_files(self, filename, staged_path):
+        """ Delete the Parquet files staged from earlier versions of a CSV file. """
+        # The whole name is matched, so the files of orders-archive.csv are not taken for those of orders.csv
+        pattern = re.compile(rf"{re.escape(os.path.splitext(filename)[0])}-[0-9a-f]{{16}}\.parquet")
+
+        for staged_filename in os.listdir(self.staging_dir):
+            path = os.path.join(self.staging_dir, staged_filename)
+            if pattern.fullmatch(staged_filename) and path != staged_path:
+                os.remove(path)
+
+    def drop_other_relation(self, conn, table_name, relation_type):
+        """ Drop a table or view named table_name that is not of relation_type, so it can be replaced by one that is. """
+        existing = conn.execute("select table_type from information_schema.tables where table_name = ?", [table_name]).fetchone()
+
+        if existing is not None and (existing[0] == 'VIEW') != (relation_type == 'view'):
+            conn.execute(f"drop {'view' if existing[0] == 'VIEW' else 'table'} {table_name}")
+
+    def load_manifest(self):
+        """ Return the manifest of previously loaded files, keyed by file name. """
+        with self.connections.reader() as conn:
+            if not conn.execute("select count(*) from information_schema.tables where table_name = ?", [self.manifest_table_id]).fetchone()[0]:
+                return {}
+
+            manifest_df = conn.execute(f"select * from {self.manifest_table_id}").fetchdf()
+
+        return {row['file_name']: row for row in manifest_df.to_dict('records')}
+
+    def load_csv_files(self, skip_unchanged=True, display=True):
+        """
+        Load all CSV files from the directory into the DuckDB database, several files at a time. With skip_unchanged,
+        files whose size, mtime or content hash, read options and staging match the manifest, and whose table still
+        exists, are not loaded again. The log of each file is written to the app if display is True, and returned.
+        """
+        logs = []
         if self.connect_db():
             try:
-                # Iterate over all files in the directory
-                for filename in os.listdir(self.data_dir):
-                    if filename.endswith(".csv"):
-                        self.load_csv_file(filename)
+                filenames = sorted(filename for filename in os.listdir(self.data_dir) if filename.endswith(".csv"))
+                manifest = self.load_manifest() if skip_unchanged else {}
+
+                with self.connections.reader() as conn:
+                    existing_tables = dict(conn.execute("select table_name, table_type from information_schema.tables").fetchall())
+
+                # Load every changed CSV file in the directory, each worker on its own cursor
+                results = self.worker_pool.map_cursors(
+                    lambda cursor, filename: self.ingest_csv_file(filename, cursor, manifest.get(filename), existing_tables), filenames
+                )
+
+                entries = [entry for _, entry in results if entry is not None]
+                if entries:
+                    # Manifests written before staging existed lack the staged_path column
+                    with self.connections.writer() as conn:
+                        if conn.execute("select count(*) from information_schema.tables where table_name = ?", [self.manifest_table_id]).fetchone()[0]:
+                            conn.execute(f"alter table {self.manifest_table_id} add column if not exists staged_path varchar")
+                    self.bulk_writer.write(self.manifest_table_id, entries, mode='merge', key_columns=['file_name'], schema=CSV_LOAD_MANIFEST_SCHEMA)
+
+                logs = [log for log, _ in results]
+
+                # Streamlit output is written from the script thread, in file order
+                if display:
+                    for log in logs:
+                        st.write(log)
             finally:
                 self.conn_build.close()
+        return logs
+
+    def ingest_csv_file(self, filename, conn, previous, existing_tables):
+        """ Load a single CSV file unless it is unchanged since its manifest entry, and return (log, new manifest entry). """
+        table_name = os.path.splitext(filename)[0]
+        read_options = json.dumps(self.read_options(filename), sort_keys=True)
+
+        try:
+            file_size, file_mtime, content_hash = self.file_fingerprint(filename, previous)
+        except OSError as e:
+            BuildMetrics.active().fail(e)
+            return f"Error: Unable to read {filename}: {e}", None
+
+        staged_path = self.staged_path(filename, content_hash)
+        entry = (filename, table_name, file_size, file_mtime, content_hash, read_options, datetime.datetime.now(), staged_path)
+
+        unchanged = previous is not None and (previous['content_hash'], previous['read_options'], previous.get('staged_path')) == (content_hash, read_options, staged_path)
+
+        table_type = 'VIEW' if staged_path is not None and self.staging_mode == 'view' else 'BASE TABLE'
+
+        if unchanged and existing_tables.get(table_name) == table_type and (staged_path is None or os.path.exists(staged_path)):
+            # Only record a new mtime, so the file is not hashed again next time
+            if previous['file_mtime'] != file_mtime:
+                return f"Skipped {filename}: unchanged since it was loaded.", entry
+            return f"Skipped {filename}: unchanged since it was loaded.", None
+
+        with BuildMetrics.active().measure('load_csv_file', table_name) as record:
+            record.add(bytes=file_size)
+            log = self.load_csv_file(filename, conn=conn, content_hash=content_hash)
+
+        return log, entry if log.startswith("Successfully") else None
+
+    def load_csv_file(self, filename, conn=None, content_hash=None):
+        """ Load a single CSV file into the DuckDB database with its read_csv options, or from its staged Parquet file, and return a log message. """
+        conn = conn or self.conn_build
 
-    def load_csv_file(self, filename):
-        """ Load a single CSV file into the DuckDB database. """
         try:
             # Determine table name (without '.csv')
             table_name = os.path.splitext(filename)[0]
 
-            # Create a table in DuckDB from the DataFrame
-            self.conn_build.execute(f"create or replace table {table_name} as select * from '{self.data_dir}/{filename}'")
+            if self.staging_dir is not None:
+                if content_hash is None:
+                    content_hash = self.file_fingerprint(filename)[2]
+
+                staged_path = self.stage_csv_file(filename, content_hash, conn)
+
+                # Create a view or table in DuckDB over the Parquet file
+                relation_type = 'view' if self.staging_mode == 'view' else 'table'
+                self.drop_other_relation(conn, table_name, relation_type)
+                conn.execute(f"create or replace {relation_type} {table_name} as select * from read_parquet({sql_literal(staged_path)})")
+                BuildMetrics.active().add(queries=1)
+
+                self.remove_stale_staged_files(filename, staged_path)
+
+                return f"Successfully loaded {filename} into DuckDB as {relation_type} {table_name} over {staged_path}."
+
+            options = "".join(f", {name} = {sql_literal(value)}" for name, value in self.read_options(filename).items())
+
+            # Create a table in DuckDB from the CSV file
+            self.drop_other_relation(conn, table_name, 'table')
+            row_count = conn.execute(f"create or replace table {table_name} as select * from read_csv(?{options})", [os.path.join(self.data_dir, filename)]).fetchone()[0]
+            BuildMetrics.active().add(rows=row_count, queries=1)
 
             # Log successful loading
-            st.write(f"Successfully loaded {filename} into DuckDB as table {table_name}.")
-        except pd.errors.ParserError:
-            st.write(f"Error: Failed to parse {filename} as CSV.")
+            return f"Successfully loaded {filename} into DuckDB as table {table_name}."
+        except pd.errors.ParserError as e:
+            BuildMetrics.active().fail(e)
+            return f"Error: Failed to parse {filename} as CSV."
         except Exception as e:
-            st.write(f"Error: An unexpected error occurred while processing {filename}: {e}")
+            BuildMetrics.active().fail(e)
+            return f"Error: An unexpected error occurred while processing {filename}: {e}"
@@ -0,0 +1,235 @@
+import datetime
+import hashlib
+import json
+import threading
+import uuid
+import weakref
+
+from .connection_class import DuckDBConnectionManager
+from .metrics_class import BuildMetrics, BuildCancelled
+
+class BuildJob:
+    def __init__(self, key, label, target, db_path=None):
+        """
+        A build running in the background, see BuildJobRunner.
+
+        Args:
+            key (str): Identity of the build; two jobs with the same key are the same build.
+            label (str): Name of the build shown to the user.
+            target (callable): Function taking the job and returning a log string or a list of log strings.
+            db_path (str, optional): DuckDB database the build works on. The queries the job runs on it are interrupted
+                                     when the job is cancelled, and its metrics are written to the database.
+        """
+
+        self.job_id = uuid.uuid4().hex[:8]
+        self.key = key
+        self.label = label
+        self.target = target
+        self.db_path = db_path
+        self.status = 'queued'
+        self.submitted_at = datetime.datetime.now()
+        self.started_at = None
+        self.finished_at = None
+        self.logs = []
+        self.error = None
+        self.metrics = BuildMetrics(db_path)
+        # Cursors opened by the job, so cancelling it leaves the queries of other sessions running
+        self.cursors = weakref.WeakSet()
+        self.thread = None
+
+    def is_active(self):
+        """ Returns whether the job is queued or running. """
+        return self.status in ('queued', 'running')
+
+    def elapsed(self):
+        """ Returns the seconds the job has been running, or ran for. """
+        if self.started_at is None:
+            return 0.0
+        return ((self.finished_at or datetime.datetime.now()) - self.started_at).total_seconds()
+
+    def log(self, message):
+        """ Appends a message, or a list of messages, to the log of the job. """
+        if isinstance(message, (list, tuple)):
+            self.logs.extend(str(m) for m in message if m)
+        elif message:
+            self.logs.append(str(message))
+
+    def progress(self):
+        """ Returns the live counters of the job, see BuildMetrics.progress. """
+        return self.metrics.progress()
+
+    def cancel(self):
+        """
+        Cancels the job. A queued job never starts; a running job stops at its next table or column, and the queries
+        it is running on its database are interrupted.
+
+        Returns:
+            bool: False if the job had already finished.
+        """
+
+        if not self.is_active():
+            return False
+
+        self.metrics.cancel()
+
+        if self.status == 'running' and self.db_path is not None:
+            DuckDBConnectionManager.get(self.db_path).interrupt(self.cursors)
+
+        return True
+
+class BuildJobRunner:
+    # The runner shared by every session of the process, so a build outlives the browser tab that started it
+    _runner = None
+    _runner_lock = threading.Lock()
+
+    def __init__(self, max_finished=20):
+        """
+        Initialize the BuildJobRunner class, which runs index builds in background threads, one thread per build,
+        and keeps a registry of the builds of the process. A build identical to one still queued or running is not
+        started again. Builds run one after the other: they share the process-wide build metrics and would compete
+        for the database writer anyway. Use BuildJobRunner.get to share a runner.
+
+        Args:
+            max_finished (int): Number of finished jobs kept in the registry.
+        """
+
+        self.max_finished = max_finished
+        self.jobs = {}
+        # Number of jobs finished so far; caches of what builds write can be keyed by it
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    @classmethod
+    def get(cls):
+        """
+        Returns the shared runner of the process, creating it on first use.
+        """
+
+        with cls._runner_lock:
+            if cls._runner is None:
+                cls._runner = cls()
+
+            return cls._runner
+
+    @staticmethod
+    def job_key(kind, database, **params):
+        """
+        Returns the key identifying a build from its kind, its database and its options.
+
+        Args:
+            kind (str): Kind of build, e.g. 'cardinality'.
+            database (str): DuckDB file path or BigQuery project of the build.
+            **params: Options of the build.
+
+        Returns:
+            str: The key of the build.
+        """
+
+        return hashlib.sha256(json.dumps([kind, database, params], default=str, sort_keys=True).encode('utf8')).hexdigest()
+
+    def submit(self, label, target, key, db_path=None):
+        """
+        Starts a build in a background thread, unless an identical build is queued or running.
+
+        Args:
+            label (str): Name of the build shown to the user.
+            target (callable): Function taking the job and returning a log string or a list of log strings. It runs
+                               outside the Streamlit script, so it must not write to the app.
+            key (str): Identity of the build, see job_key.
+            db_path (str, optional): DuckDB database the build works on.
+
+        Returns:
+            tuple: (job, created), where job is the identical active job and created is False if there was one.
+        """
+
+        with self._lock:
+            for job in self.jobs.values():
+                if job.key == key and job.is_active():
+                    return job, False
+
+            job = BuildJob(key, label, target, db_path=db_path)
+            self.jobs[job.job_id] = job
+            self.prune()
+
+        job.thread = threading.Thread(target=self.run_job, args=(job,), name=f"build-{job.job_id}", daemon=True)
+        job.thread.start()
+
+        return job, True
+
+    def run_job(self, job):
+        """
+        Runs a job once the builds submitted before it have finished, and records its outcome.
+        """
+
+        with self._build_lock:
+            if job.metrics.cancelled:
+                job.status = 'cancelled'
+                job.finished_at = datetime.datetime.now()
+                return
+
+            job.status = 'running'
+            job.started_at = datetime.datetime.now()
+            status = 'failed'
+
+            try:
+                with job.metrics.activate(), DuckDBConnectionManager.track_cursors(job.cursors):
+                    job.log(job.target(job))
+
+                # Helpers record the failures they handle on the build metrics rather than raising
+                if job.metrics.cancelled:
+                    status = 'cancelled'
+                elif job.metrics.failures:
+                    status = 'failed'
+                else:
+                    status = 'completed'
+            except BuildCancelled:
+                status = 'cancelled'
+            except Exception as e:
+                # An interrupted query raises its own error in the middle of the build
+                status = 'cancelled' if job.metrics.cancelled else 'failed'
+                job.error = str(e)
+            finally:
+                job.finished_at = datetime.datetime.now()
+
+                try:
+                    job.metrics.flush()
+                except Exception as e:
+                    job.log(f"Build metrics error: {e}")
+
+                # The job is only reported finished once what it wrote is visible to the caches keyed by the generation
+                with self._lock:
+                    self.generation += 1
+                    job.status = status
+
+    def list_jobs(self):
+        """
+        Returns the jobs of the registry, most recently submitted first.
+        """
+
+        with self._lock:
+            return list(reversed(self.jobs.values()))
+
+    def has_active_jobs(self):
+        """ Returns whether a job is queued or running. """
+        with self._lock:
+            return any(job.is_active() for job in self.jobs.values())
+
+    def prune(self):
+        """
+        Drops the oldest finished jobs beyond max_finished from the registry. Called with the registry lock held.
+        """
+
+        finished = [job_id for job_id, job in self.jobs.items() if not job.is_active()]
+
+        for job_id in finished[:max(len(finished) - self.max_finished, 0)]:
+            del self.jobs[job_id]
+
+    def clear_finished(self):
+        """
+        Drops every finished job from the registry.
+        """
+
+        with self._lock:
+            for job_id in [job_id for job_id, job in self.jobs.items() if not job.is_active()]:
+                del self.jobs[job_id]
@@ -0,0 +1,382 @@
+import cProfile
+import datetime
+import json
+import os
+import pstats
+import resource
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import pyarrow as pa
+
+from .bulk_writer_class import DuckDBBulkWriter
+
+BUILD_METRICS_SCHEMA = pa.schema([
+    ('build_id', pa.string()),
+    ('stage', pa.string()),
+    ('table_name', pa.string()),
+    ('column_name', pa.string()),
+    ('started_at', pa.timestamp('us')),
+    ('seconds', pa.float64()),
+    ('rows_scanned', pa.int64()),
+    ('bytes_fetched', pa.int64()),
+    ('query_count', pa.int64()),
+    ('peak_rss_mb', pa.float64()),
+    ('status', pa.string()),
+    ('error', pa.string()),
+])
+
+class BuildCancelled(Exception):
+    """
+    Raised in a build whose metrics were cancelled, the next time it starts or adds to a record.
+    """
+
+def current_rss():
+    """
+    Returns the resident memory of the process in bytes, or its peak so far where /proc is unavailable.
+    """
+
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+class MetricRecord:
+    def __init__(self, stage, table_name=None, column_name=None):
+        """
+        Counters of one measured unit of work: a stage, or the part of a stage working on one table or column.
+
+        Args:
+            stage (str): Name of the stage.
+            table_name (str, optional): Table the work is about.
+            column_name (str, optional): Column the work is about.
+        """
+
+        self.stage = stage
+        self.table_name = table_name
+        self.column_name = column_name
+        self.started_at = datetime.datetime.now()
+        self.seconds = None
+        self.rows_scanned = 0
+        self.bytes_fetched = 0
+        self.query_count = 0
+        self.peak_rss = 0
+        self.errors = []
+
+    def add(self, rows=0, bytes=0, queries=0):
+        """
+        Adds rows scanned, bytes fetched into Python and queries issued to the record.
+        """
+
+        self.rows_scanned += int(rows or 0)
+        self.bytes_fetched += int(bytes or 0)
+        self.query_count += int(queries or 0)
+
+    def fail(self, error):
+        """
+        Marks the record as failed, for errors that are handled rather than raised.
+        """
+
+        self.errors.append(str(error))
+
+    def to_row(self, build_id):
+        return (
+            build_id,
+            self.stage,
+            self.table_name,
+            self.column_name,
+            self.started_at,
+            self.seconds,
+            self.rows_scanned,
+            self.bytes_fetched,
+            self.query_count,
+            round(self.peak_rss / 2 ** 20, 1),
+            'failed' if self.errors else 'ok',
+            "; ".join(self.errors) or None,
+        )
+
+class BuildMetrics:
+    # The metrics of the build in progress, shared by every thread of the process
+    _active = None
+
+    def __init__(self, db_path=None, log_path=None, table_id='oqr_build_metrics', profile=False, rss_interval=0.05):
+        """
+        Initialize the BuildMetrics class, which records per stage, and per table or column within a stage, the wall
+        time, rows scanned, bytes fetched, peak resident memory, query count and failures of an index build. Records are
+        written to the 'oqr_build_metrics' table and to a JSON-lines log when the build is flushed. Helpers record into
+        the active metrics, see activate; without active metrics, measuring costs next to nothing.
+
+        Args:
+            db_path (str, optional): DuckDB database the records are written to.
+            log_path (str, optional): JSON-lines file the records are appended to.
+            table_id (str): Name of the metrics table.
+            profile (bool): If True, the hot paths wrapped in profile() run under cProfile, see write_profiles.
+            rss_interval (float): Seconds between resident memory samples while the metrics are active.
+        """
+
+        self.db_path = db_path
+        self.log_path = log_path
+        self.table_id = table_id
+        self.profiling = profile
+        self.rss_interval = rss_interval
+        self.build_id = uuid.uuid4().hex
+        self.records = []
+        self.profiles = {}
+        self.counters = {}
+        # Every handled failure of the build, whether or not a record was open, so a build knows it failed
+        self.failures = []
+        self._open = set()
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @classmethod
+    def active(cls):
+        """
+        Returns the active metrics, or metrics that are discarded if no build is being measured.
+        """
+
+        return cls._active or NULL_METRICS
+
+    @contextmanager
+    def activate(self):
+        """
+        Context manager making these the metrics helpers record into, from any thread, until it exits. While active,
+        a single background thread samples resident memory into every open record.
+        """
+
+        previous = BuildMetrics._active
+        BuildMetrics._active = self
+
+        stop = threading.Event()
+
+        def sample():
+            while not stop.wait(self.rss_interval):
+                rss = current_rss()
+
+                with self._lock:
+                    for record in self._open:
+                        record.peak_rss = max(record.peak_rss, rss)
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+
+        try:
+            yield self
+        finally:
+            stop.set()
+            sampler.join()
+            BuildMetrics._active = previous
+
+    def cancel(self):
+        """
+        Cancels the build being measured: every later measure or add raises BuildCancelled, so per-table and
+        per-column loops stop at their next unit of work. Queries already running are not stopped, see
+        DuckDBConnectionManager.interrupt.
+        """
+
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def check_cancelled(self):
+        if self._cancelled.is_set():
+            raise BuildCancelled("Build cancelled")
+
+    @contextmanager
+    def measure(self, stage, table_name=None, column_name=None):
+        """
+        Context manager measuring a unit of work. It yields a MetricRecord to add counters to. An exception raised in
+        the block is recorded as a failure and re-raised.
+
+        Args:
+            stage (str): Name of the stage.
+            table_name (str, optional): Table the work is about.
+            column_name (str, optional): Column the work is about.
+        """
+
+        self.check_cancelled()
+
+        record = MetricRecord(stage, table_name=table_name, column_name=column_name)
+        record.peak_rss = current_rss()
+        stack = self._stack()
+        stack.append(record)
+
+        with self._lock:
+            self._open.add(record)
+
+        start = time.perf_counter()
+
+        try:
+            yield record
+        except Exception as e:
+            record.fail(e)
+            raise
+        finally:
+            record.seconds = time.perf_counter() - start
+            record.peak_rss = max(record.peak_rss, current_rss())
+            stack.pop()
+
+            with self._lock:
+                self._open.discard(record)
+                self.records.append(record)
+
+                counters = self.counters.setdefault(record.stage, {'completed': 0, 'failed': 0, 'rows_scanned': 0})
+                counters['completed'] += 1
+                counters['failed'] += 1 if record.errors else 0
+                counters['rows_scanned'] += record.rows_scanned
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+
+        return self._local.stack
+
+    def add(self, rows=0, bytes=0, queries=0):
+        """
+        Adds counters to the innermost record open in the calling thread, if any. Hot paths call this without knowing
+        which stage they run in.
+        """
+
+        self.check_cancelled()
+
+        stack = self._stack()
+        if stack:
+            stack[-1].add(rows=rows, bytes=bytes, queries=queries)
+
+    def fail(self, error):
+        """
+        Marks the innermost record open in the calling thread as failed, for errors that are handled rather than raised,
+        and adds the error to the failures of the build.
+        """
+
+        with self._lock:
+            self.failures.append(str(error))
+
+        stack = self._stack()
+        if stack:
+            stack[-1].fail(error)
+
+    @contextmanager
+    def profile(self, name):
+        """
+        Context manager running a hot path under cProfile when profiling is enabled. The statistics of every call of
+        the same name are accumulated, across threads.
+
+        Args:
+            name (str): Name of the hot path, e.g. 'compute_minhash'.
+        """
+
+        # cProfile cannot nest profilers within a thread, so nested hot paths count towards the outer one
+        if not self.profiling or getattr(self._local, 'profiling', False):
+            yield
+            return
+
+        profiler = cProfile.Profile()
+        self._local.profiling = True
+        profiler.enable()
+
+        try:
+            yield
+        finally:
+            profiler.disable()
+            self._local.profiling = False
+
+            with self._lock:
+                if name in self.profiles:
+                    self.profiles[name].add(profiler)
+                else:
+                    self.profiles[name] = pstats.Stats(profiler)
+
+    def write_profiles(self, directory):
+        """
+        Writes the accumulated statistics of each profiled hot path to '<directory>/<name>.prof', readable with pstats
+        or snakeviz.
+
+        Returns:
+            list of str: Paths of the written files.
+        """
+
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+
+        with self._lock:
+            for name, stats in self.profiles.items():
+                path = os.path.join(directory, f"{name}.prof")
+                stats.dump_stats(path)
+                paths.append(path)
+
+        return paths
+
+    def progress(self):
+        """
+        Returns live counters of the build: for each stage, the number of records completed and failed so far and the
+        rows they scanned. Flushing does not reset them.
+
+        Returns:
+            dict: Maps each stage name to a dict with 'completed', 'failed' and 'rows_scanned'.
+        """
+
+        with self._lock:
+            return {stage: dict(counters) for stage, counters in self.counters.items()}
+
+    def summary(self):
+        """
+        Returns the records measured so far as a list of dicts, in the order they completed.
+        """
+
+        columns = BUILD_METRICS_SCHEMA.names
+
+        with self._lock:
+            return [dict(zip(columns, record.to_row(self.build_id))) for record in self.records]
+
+    def flush(self):
+        """
+        Appends the records measured since the last flush to the metrics table and the JSON-lines log.
+
+        Returns:
+            int: Number of records written.
+        """
+
+        with self._lock:
+            records, self.records = self.records, []
+
+        rows = [record.to_row(self.build_id) for record in records]
+
+        if self.log_path is not None and rows:
+            with open(self.log_path, 'a') as log:
+                for row in rows:
+                    log.write(json.dumps(dict(zip(BUILD_METRICS_SCHEMA.names, row)), default=str) + "\n")
+
+        if self.db_path is not None and rows:
+            DuckDBBulkWriter(self.db_path).write(self.table_id, rows, mode='append', schema=BUILD_METRICS_SCHEMA)
+
+        return len(rows)
+
+class NullMetrics:
+    """
+    Stand-in for BuildMetrics when no build is measured: records are created for the caller but never kept.
+    """
+
+    profiling = False
+
+    @contextmanager
+    def measure(self, stage, table_name=None, column_name=None):
+        yield MetricRecord(stage, table_name=table_name, column_name=column_name)
+
+    def add(self, rows=0, bytes=0, queries=0):
+        pass
+
+    def fail(self, error):
+        pass
+
+    @contextmanager
+    def profile(self, name):
+        yield
+
+NULL_METRICS = NullMetrics()
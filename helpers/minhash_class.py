@@ -0,0 +1,170 @@
+from datasketch import MinHash
+import numpy as np
+import pandas as pd
+
+try:
+    from datasketch.minhash import _fmix
+except ImportError:
+    # Releases before datasketch 2.0 only have the legacy permutation scheme
+    _fmix = None
+
+# Constants of datasketch's legacy permutations, (a * hash + b) mod the Mersenne prime 2^61 - 1, truncated to 32 bits
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+# Empty MinHash templates keyed by (num_perm, seed, hashfunc). Copying a template reuses its permutations, whose
+# generation otherwise dominates the cost of sketching small columns.
+_TEMPLATES = {}
+
+def _precomputed_hash(value):
+    """
+    Hash function for MinHash objects that are fed values which have already been hashed.
+    """
+    return value
+
+def _empty_minhash(num_perm, seed, hashfunc=None):
+    """
+    Returns an empty MinHash, copied from a cached template so its permutations are only generated once.
+    """
+    key = (num_perm, seed, hashfunc)
+
+    if key not in _TEMPLATES:
+        if hashfunc is None:
+            _TEMPLATES[key] = MinHash(num_perm=num_perm, seed=seed)
+        else:
+            _TEMPLATES[key] = MinHash(num_perm=num_perm, seed=seed, hashfunc=hashfunc)
+
+    return _TEMPLATES[key].copy()
+
+class BatchMinHash:
+    def __init__(self, num_perm=128, seed=1, chunk_size=16384):
+        """
+        Initialize the BatchMinHash class, a vectorized MinHash engine that hashes whole column buffers at once and
+        applies all permutations as matrix operations, producing signatures compatible with datasketch's MinHash.
+
+        Args:
+        num_perm (int): Number of permutations used in MinHash calculation.
+        seed (int): Seed of the MinHash permutations.
+        chunk_size (int): Number of distinct hashes permuted per matrix operation, bounding the (chunk_size x num_perm)
+                          intermediate matrix.
+        """
+        self.num_perm = num_perm
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.row_count = 0
+        self._minhash = _empty_minhash(num_perm, seed, hashfunc=_precomputed_hash)
+
+    def hash_values(self, values):
+        """
+        Hashes a column buffer into the distinct set of 32-bit value hashes. Nulls are dropped, and values are
+        normalized by type first (integers and booleans as int64, floats as float64, dates and timestamps as int64
+        nanoseconds, everything else by its string form) so equal values hash equally across tables.
+
+        Args:
+        values (pandas.Series, numpy.ndarray, pyarrow.Array or iterable): Values of a column.
+
+        Returns:
+        numpy.ndarray: Sorted unique uint32 hashes of the non-null values.
+        """
+        if hasattr(values, 'to_pandas'):
+            series = values.to_pandas(date_as_object=False)
+        else:
+            series = pd.Series(values)
+
+        series = series.dropna()
+
+        if pd.api.types.is_bool_dtype(series.dtype) or pd.api.types.is_integer_dtype(series.dtype):
+            hashes = pd.util.hash_array(series.to_numpy(dtype='int64'))
+        elif pd.api.types.is_float_dtype(series.dtype):
+            # Integral floats hash like the equal integer, so integer columns that were widened to float to hold
+            # nulls still match integer columns without nulls
+            floats = series.to_numpy(dtype='float64')
+            integral = (np.floor(floats) == floats) & (np.abs(floats) < 2.0 ** 63)
+            hashes = np.empty(len(floats), dtype=np.uint64)
+            hashes[integral] = pd.util.hash_array(floats[integral].astype('int64'))
+            hashes[~integral] = pd.util.hash_array(floats[~integral])
+        elif isinstance(series.dtype, pd.DatetimeTZDtype):
+            hashes = pd.util.hash_array(series.dt.tz_convert(None).to_numpy().astype('datetime64[ns]').astype('int64'))
+        elif pd.api.types.is_datetime64_dtype(series.dtype):
+            hashes = pd.util.hash_array(series.to_numpy().astype('datetime64[ns]').astype('int64'))
+        else:
+            if not pd.api.types.is_string_dtype(series.dtype):
+                series = series.astype(str)
+            hashes = pd.util.hash_pandas_object(series, index=False).to_numpy()
+
+        return np.unique(np.bitwise_and(hashes, np.uint64(0xFFFFFFFF)).astype(np.uint32))
+
+    def update(self, values):
+        """
+        Updates the sketch with a batch of values. Can be called repeatedly to sketch a column chunk by chunk.
+
+        Args:
+        values (pandas.Series, numpy.ndarray, pyarrow.Array or iterable): Values of a column.
+        """
+        hashes = self.hash_values(values)
+        self.row_count += len(values)
+
+        for start in range(0, len(hashes), self.chunk_size):
+            self.permute(hashes[start:start + self.chunk_size])
+
+    def permute(self, hashes):
+        """
+        Applies the permutations of the sketch to a chunk of value hashes and keeps the minimum of each, as
+        MinHash.update_batch does, but on the whole array at once instead of calling a hash function per value.
+
+        Args:
+        hashes (numpy.ndarray): uint32 value hashes.
+        """
+        if len(hashes) == 0:
+            return
+
+        a, b = self._minhash.permutations
+
+        if getattr(self._minhash, 'scheme', 'legacy') == 'legacy':
+            hv = hashes.astype(np.uint64).reshape(-1, 1)
+            permuted = np.bitwise_and((hv * a + b) % _MERSENNE_PRIME, _MAX_HASH)
+        else:
+            # The affine schemes pre-mix the hashes, then wrap around at the width of their dtype
+            hv = hashes.astype(a.dtype).reshape(-1, 1)
+            permuted = _fmix(hv, a.dtype.itemsize * 8) * a + b
+
+        self._minhash.hashvalues = np.minimum(self._minhash.hashvalues, permuted.min(axis=0))
+
+    def minhash(self):
+        """
+        Returns the sketch as a datasketch MinHash.
+
+        Returns:
+        MinHash: MinHash object holding the signature of every value passed to update.
+        """
+        m = _empty_minhash(self.num_perm, self.seed)
+        m.hashvalues = self._minhash.hashvalues.copy()
+
+        return m
+
+def compute_minhash(values, num_perm=128, seed=1, sketch_method='numpy'):
+    """
+    Computes the MinHash of a collection of values. It needs no database, so it can run in a process pool.
+
+    Args:
+    values (iterable): Iterable of values to compute the MinHash.
+    num_perm (int): Number of permutations used in MinHash calculation.
+    seed (int): Seed of the MinHash permutations.
+    sketch_method (str): 'numpy' hashes the values with BatchMinHash, 'python' updates a MinHash one value at a time.
+                         Signatures built with different methods are not comparable.
+
+    Returns:
+    MinHash: MinHash object representing the MinHash of the given values.
+    """
+    if sketch_method == 'numpy':
+        sketch = BatchMinHash(num_perm=num_perm, seed=seed)
+        sketch.update(values)
+
+        return sketch.minhash()
+
+    m = _empty_minhash(num_perm, seed)
+
+    for v in values:
+        m.update(str(v).encode('utf8'))
+
+    return m
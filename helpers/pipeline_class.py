@@ -0,0 +1,355 @@
+import datetime
+import hashlib
+import json
+import os
+import re
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import pyarrow as pa
+
+from .bulk_writer_class import DuckDBBulkWriter
+from .cardinality_class import DuckDBCardinalityIndex
+from .connection_class import DuckDBConnectionManager
+from .incremental_index_class import DuckDBTableFingerprint
+from .initialize_db_class import CSVLoaderToDuckDB
+from .metrics_class import NULL_METRICS
+from .relation_map_class import DuckDBRelationMap
+from .similarity_index_class import DuckDBSimilarityIndex
+
+PIPELINE_STATE_SCHEMA = pa.schema([
+    ('stage', pa.string()),
+    ('input_token', pa.string()),
+    ('completed_at', pa.timestamp('us')),
+    ('log', pa.string()),
+])
+
+# Tables each stage writes; a stage whose outputs are missing runs even if its inputs are unchanged
+STAGE_OUTPUTS = {
+    'cardinality': ['cardinality_index'],
+    'similarity': ['similarity_index'],
+    'containment': ['containment_index'],
+    'relation_map': ['relation_map'],
+    'verify': ['relation_map'],
+}
+
+class DuckDBIndexPipeline:
+    def __init__(self, db_path, data_dir=None, output_path=None, k=128, similarity_threshold=0.8, approximate=False, use_lsh=False,
+                 prune_with_statistics=False, use_containment=False, verify_relations=False, min_verified_ratio=0.95, csv_options=None,
+                 staging_dir=None, max_workers=None, state_table_id='pipeline_state', metrics=None):
+        """
+        Initialize the IndexPipeline class, which builds every index of a DuckDB database without the app. The build is
+        a graph of stages: load -> {cardinality, similarity} -> relation_map -> serialize, plus the optional
+        containment and verify stages. Independent stages run in parallel, and a stage is skipped when the token of its
+        inputs matches the one recorded in the 'pipeline_state' table after its last successful run.
+
+        Args:
+            db_path (str): Path to the DuckDB database file.
+            data_dir (str, optional): Directory of the CSV files to load. Without it, the load stage is left out.
+            output_path (str, optional): File the serialized relation map is written to. Without it, the serialize
+                                         stage is left out.
+            k (int): Number of permutations used in MinHash calculation.
+            similarity_threshold (float): Minimum similarity index (and containment) for a column pair to be stored.
+            approximate (bool): If True, cardinalities are estimated with approx_count_distinct.
+            use_lsh (bool): If True, similarity candidates are generated with MinHash LSH.
+            prune_with_statistics (bool): If True, similarity candidates and relation edges are pruned with the column
+                                          statistics, which makes the similarity stage depend on cardinality.
+            use_containment (bool): If True, the containment stage adds foreign key edges to the relation map.
+            verify_relations (bool): If True, the verify stage checks the relation map against the data.
+            min_verified_ratio (float): Minimum verified ratio of a serialized edge when relations are verified.
+            csv_options (dict, optional): Per-file read_csv options, see CSVLoaderToDuckDB.
+            staging_dir (str, optional): Parquet staging directory, see CSVLoaderToDuckDB.
+            max_workers (int, optional): Number of concurrent workers per stage. Defaults to the number of CPUs.
+            state_table_id (str): Name of the table recording the input token of each stage.
+            metrics (BuildMetrics, optional): Metrics recorded for each stage, and for each table and column within
+                                              it, while the pipeline runs. They are flushed at the end of each run.
+        """
+
+        self.db_path = db_path
+        self.data_dir = data_dir
+        self.output_path = output_path
+        self.k = k
+        self.similarity_threshold = similarity_threshold
+        self.approximate = approximate
+        self.use_lsh = use_lsh
+        self.prune_with_statistics = prune_with_statistics
+        self.use_containment = use_containment
+        self.verify_relations = verify_relations
+        self.min_verified_ratio = min_verified_ratio
+        self.csv_options = csv_options
+        self.staging_dir = staging_dir
+        self.state_table_id = state_table_id
+        self.metrics = metrics
+        self.connections = DuckDBConnectionManager.get(db_path)
+        self.bulk_writer = DuckDBBulkWriter(db_path)
+        self.fingerprint = DuckDBTableFingerprint(db_path, max_workers=max_workers)
+        self.cardinality_index = DuckDBCardinalityIndex(db_path, max_workers=max_workers)
+        self.similarity_index = DuckDBSimilarityIndex(db_path, max_workers=max_workers)
+        self.relation_map = DuckDBRelationMap(db_path, max_workers=max_workers)
+        self.loader = CSVLoaderToDuckDB(data_dir, db_path, max_workers=max_workers, csv_options=csv_options, staging_dir=staging_dir) if data_dir else None
+        self._source_token = None
+        self._source_token_lock = threading.Lock()
+
+    def stage_dependencies(self):
+        """
+        Returns the stages of the pipeline with the stages each one depends on, according to its options.
+
+        Returns:
+            dict: Maps each stage name to the list of stage names it depends on.
+        """
+
+        load = ['load'] if self.loader is not None else []
+
+        stages = {}
+        if self.loader is not None:
+            stages['load'] = []
+        stages['cardinality'] = load
+        stages['similarity'] = ['cardinality'] if self.prune_with_statistics else load
+        relation_inputs = ['cardinality', 'similarity']
+
+        if self.use_containment:
+            stages['containment'] = ['cardinality', 'similarity']
+            relation_inputs.append('containment')
+
+        stages['relation_map'] = relation_inputs
+        last = 'relation_map'
+
+        if self.verify_relations:
+            stages['verify'] = ['relation_map']
+            last = 'verify'
+
+        if self.output_path is not None:
+            stages['serialize'] = [last]
+
+        return stages
+
+    def source_token(self):
+        """
+        Returns a token of the current contents of the source tables, from their fingerprints. It is computed once per
+        run, after the load stage.
+        """
+
+        with self._source_token_lock:
+            if self._source_token is None:
+                fingerprints = self.fingerprint.compute_fingerprints()
+                self._source_token = hashlib.sha256(fingerprints.to_json(orient='values').encode('utf8')).hexdigest()
+
+            return self._source_token
+
+    def stage_inputs(self, stage):
+        """
+        Returns what a stage reads besides the outputs of the stages it depends on: its options, and the CSV files
+        or source tables it reads.
+        """
+
+        if stage == 'load':
+            files = sorted(
+                (filename, os.path.getsize(os.path.join(self.data_dir, filename)), os.path.getmtime(os.path.join(self.data_dir, filename)))
+                for filename in os.listdir(self.data_dir) if filename.endswith(".csv")
+            )
+            return [files, self.csv_options, self.staging_dir]
+        if stage == 'cardinality':
+            return [self.source_token(), self.approximate]
+        if stage == 'similarity':
+            return [self.source_token(), self.k, self.similarity_threshold, self.use_lsh, self.prune_with_statistics]
+        if stage == 'containment':
+            return [self.source_token(), self.k, self.similarity_threshold]
+        if stage == 'relation_map':
+            return [self.prune_with_statistics, self.use_containment]
+        if stage == 'verify':
+            return [self.source_token()]
+        if stage == 'serialize':
+            return [self.output_path, self.min_verified_ratio if self.verify_relations else None]
+
+        raise ValueError(f"Unknown pipeline stage: {stage}")
+
+    def stage_token(self, stage, dependency_tokens):
+        """
+        Returns the input token of a stage: a hash of its inputs and of the tokens of the stages it depends on, so a
+        stage reruns whenever anything upstream of it changed.
+        """
+
+        # The source token already describes the tables loaded, so a load that changed nothing does not invalidate them
+        dependency_tokens = {dependency: token for dependency, token in dependency_tokens.items() if dependency != 'load'}
+
+        inputs = json.dumps([stage, self.stage_inputs(stage), dependency_tokens], default=str, sort_keys=True)
+
+        return hashlib.sha256(inputs.encode('utf8')).hexdigest()
+
+    def outputs_exist(self, stage):
+        """
+        Returns whether the tables or file a stage writes still exist.
+        """
+
+        if stage == 'serialize':
+            return os.path.exists(self.output_path)
+
+        tables = STAGE_OUTPUTS.get(stage, [])
+        if not tables:
+            return True
+
+        with self.connections.reader() as conn:
+            existing = conn.execute("select count(*) from information_schema.tables where table_name in (select unnest(?::varchar[]))", [tables]).fetchone()[0]
+
+        return existing == len(tables)
+
+    def load_state(self):
+        """
+        Loads the input token recorded for each stage after its last successful run.
+
+        Returns:
+            dict: Maps each stage name to its recorded input token.
+        """
+
+        with self.connections.reader() as conn:
+            if not conn.execute("select count(*) from information_schema.tables where table_name = ?", [self.state_table_id]).fetchone()[0]:
+                return {}
+
+            return dict(conn.execute(f"select stage, input_token from {self.state_table_id}").fetchall())
+
+    def save_state(self, stage, token, log):
+        """
+        Records the input token of a stage after a successful run.
+        """
+
+        self.bulk_writer.write(
+            self.state_table_id, [(stage, token, datetime.datetime.now(), log)], mode='merge', key_columns=['stage'], schema=PIPELINE_STATE_SCHEMA
+        )
+
+    def run_load(self):
+        """ Loads the CSV files that changed since they were last loaded. """
+        return "\n".join(self.loader.load_csv_files(display=False))
+
+    def run_cardinality(self):
+        """ Rebuilds the cardinality index and the column statistics. """
+        logs = [self.cardinality_index.create_cardinality_table()]
+        logs.append(self.cardinality_index.update_duckdb_table_with_cardinality(approximate=self.approximate, statistics=True))
+        return "\n".join(logs)
+
+    def info_schema_columns(self):
+        """ Returns information_schema.columns of the database. """
+        with self.connections.reader() as conn:
+            return conn.execute("select * from information_schema.columns").fetchdf()
+
+    def run_similarity(self):
+        """ Rebuilds the MinHash signatures and the similarity index. """
+        statistics_table_id = 'column_statistics' if self.prune_with_statistics else None
+        similarity_results = self.similarity_index.compute_similarity_index_for_assets(
+            self.info_schema_columns(), self.k, similarity_threshold=self.similarity_threshold, use_lsh=self.use_lsh,
+            statistics_table_id=statistics_table_id
+        )
+        return self.similarity_index.create_similarity_index_table(similarity_results)
+
+    def run_containment(self):
+        """ Rebuilds the containment index from the signatures of the similarity stage. """
+        containment_results = self.similarity_index.compute_containment_index_for_assets(
+            self.info_schema_columns(), self.k, containment_threshold=self.similarity_threshold, refresh_signatures=False
+        )
+        return self.similarity_index.create_containment_index_table(containment_results)
+
+    def run_relation_map(self):
+        """ Rebuilds the relation map. """
+        return self.relation_map.create_relation_map(
+            'cardinality_index', 'similarity_index', statistics_table_id='column_statistics' if self.prune_with_statistics else None,
+            containment_table_id='containment_index' if self.use_containment else None
+        )
+
+    def run_verify(self):
+        """ Verifies the edges of the relation map against the data. """
+        return self.relation_map.verify_relation_map('relation_map')
+
+    def run_serialize(self):
+        """ Writes the serialized relation map to the output file. """
+        serialized = self.relation_map.serialize_relation_map('relation_map', min_verified_ratio=self.min_verified_ratio if self.verify_relations else None)
+
+        with open(self.output_path, 'w') as file:
+            file.write(serialized)
+
+        return f"Relation map serialized to {self.output_path}"
+
+    def run_stage(self, stage, dependency_tokens, stored_token, force):
+        """
+        Runs a stage unless its input token is unchanged and its outputs exist.
+
+        Returns:
+            tuple: (status, input token, log), where status is 'ran', 'skipped' or 'failed'.
+        """
+
+        try:
+            token = self.stage_token(stage, dependency_tokens)
+
+            if not force and token == stored_token and self.outputs_exist(stage):
+                return 'skipped', token, f"{stage}: inputs unchanged"
+
+            started = datetime.datetime.now()
+            with (self.metrics or NULL_METRICS).measure(stage) as record:
+                log = getattr(self, f"run_{stage}")()
+
+                # Helpers report failures in their log rather than raising
+                failed = re.search(r"error:", log, re.IGNORECASE)
+                if failed:
+                    record.fail(log)
+            elapsed = (datetime.datetime.now() - started).total_seconds()
+        except Exception as e:
+            return 'failed', None, f"{stage} error: {e}"
+
+        if failed:
+            return 'failed', token, log
+
+        self.save_state(stage, token, log)
+
+        return 'ran', token, f"{log}\n{stage}: completed in {elapsed:.2f}s"
+
+    def run(self, force=False):
+        """
+        Runs the pipeline. Each stage starts as soon as the stages it depends on have finished, so independent stages
+        run in parallel. Stages depending on a failed stage are not run.
+
+        Args:
+            force (bool or list of str): If True, every stage runs regardless of its recorded token. A list forces only
+                                         the listed stages; the stages after them still run only if their own inputs
+                                         changed.
+
+        Returns:
+            dict: Maps each stage name to (status, log), where status is 'ran', 'skipped', 'failed' or 'blocked'.
+        """
+
+        stages = self.stage_dependencies()
+        stored = self.load_state()
+        self._source_token = None
+
+        tokens = {}
+        results = {}
+        pending = dict(stages)
+        running = {}
+
+        with self.metrics.activate() if self.metrics is not None else nullcontext(), ThreadPoolExecutor(max_workers=len(stages)) as executor:
+            while pending or running:
+                for stage, dependencies in list(pending.items()):
+                    if any(results.get(dependency, ('',))[0] in ('failed', 'blocked') for dependency in dependencies):
+                        results[stage] = ('blocked', f"{stage}: not run because a stage it depends on failed")
+                        del pending[stage]
+                    elif all(dependency in tokens for dependency in dependencies):
+                        stage_force = force is True or (isinstance(force, (list, tuple, set)) and stage in force)
+                        future = executor.submit(self.run_stage, stage, {dependency: tokens[dependency] for dependency in dependencies}, stored.get(stage), stage_force)
+                        running[future] = stage
+                        del pending[stage]
+
+                if not running:
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    stage = running.pop(future)
+                    status, token, log = future.result()
+                    results[stage] = (status, log)
+
+                    if status != 'failed':
+                        tokens[stage] = token
+
+        if self.metrics is not None:
+            self.metrics.flush()
+
+        return {stage: results[stage] for stage in stages}
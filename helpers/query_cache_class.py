@@ -0,0 +1,228 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+# Quoted strings and identifiers are kept as they are, comments are dropped and runs of whitespace collapsed
+SQL_TOKEN_PATTERN = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*"|`[^`]*`)|((?:\s|--[^\n]*|/\*.*?\*/)+)""", re.DOTALL)
+
+# Statements whose result only depends on the data they read
+CACHEABLE_STATEMENTS = ('select', 'with', 'from', 'values', 'table', 'describe', 'show', 'summarize')
+
+# Functions whose result changes between runs, or that read outside the database, so the version does not cover them
+VOLATILE_FUNCTIONS = re.compile(
+    r"\b(random|rand|uuid|gen_random_uuid|generate_uuid|setseed|nextval|now|current_date|current_time|current_timestamp|"
+    r"get_current_time|get_current_timestamp|read_csv|read_csv_auto|read_parquet|read_json|read_json_auto|glob)\b",
+    re.IGNORECASE
+)
+
+# Tables referenced by FROM and JOIN clauses, with or without backticks
+TABLE_REFERENCE_PATTERN = re.compile(r"\b(?:from|join)\s+(`[^`]+`|[A-Za-z_][\w\-]*(?:\.[A-Za-z_][\w\-]*){1,2})", re.IGNORECASE)
+
+class QueryResultCache:
+    def __init__(self, max_entries=64, max_bytes=256 * 2 ** 20, spill_dir=None, spill_threshold_bytes=32 * 2 ** 20):
+        """
+        Initialize the QueryResultCache class, which keeps the results of read-only queries keyed by their normalized
+        SQL and a version token of the database, so a query is only run again once the data it reads may have
+        changed. Results are evicted least recently used first. DML, DDL and queries using volatile functions bypass
+        the cache.
+
+        Args:
+            max_entries (int): Maximum number of cached results.
+            max_bytes (int): Maximum memory held by the results cached in memory.
+            spill_dir (str, optional): Directory results larger than spill_threshold_bytes are written to as Parquet
+                                       files instead of being held in memory. Without it, they are not cached.
+            spill_threshold_bytes (int): Size from which a result is spilled to disk.
+        """
+
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.spill_threshold_bytes = spill_threshold_bytes
+        self.entries = OrderedDict()
+        self.memory_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize_sql(sql):
+        """
+        Returns the SQL without comments, trailing semicolons and redundant whitespace, so equivalent spellings of a
+        query share an entry. Quoted literals and identifiers are left untouched.
+        """
+
+        normalized = SQL_TOKEN_PATTERN.sub(lambda match: match.group(1) if match.group(1) is not None else " ", sql)
+
+        return normalized.strip().rstrip(';').strip()
+
+    @classmethod
+    def is_cacheable(cls, sql):
+        """
+        Returns whether the result of a query can be cached: a single read-only statement without volatile functions.
+        """
+
+        normalized = cls.normalize_sql(sql)
+        unquoted = SQL_TOKEN_PATTERN.sub(lambda match: "''" if match.group(1) else " ", normalized)
+
+        if not normalized or ';' in unquoted:
+            return False
+
+        first_keyword = unquoted.lstrip('( ').split(None, 1)[0].lower()
+        if first_keyword not in CACHEABLE_STATEMENTS:
+            return False
+
+        # A common table expression can precede a data-modifying statement
+        if re.search(r"\b(insert|update|delete|merge|create|drop|alter|copy|attach|detach|truncate)\b", unquoted, re.IGNORECASE):
+            return False
+
+        return not VOLATILE_FUNCTIONS.search(unquoted)
+
+    @classmethod
+    def referenced_tables(cls, sql):
+        """
+        Returns the tables a query reads from its FROM and JOIN clauses, e.g. to build a BigQuery version token.
+
+        Returns:
+            list of str: Table names without backticks, in order of appearance.
+        """
+
+        tables = [reference.strip('`') for reference in TABLE_REFERENCE_PATTERN.findall(cls.normalize_sql(sql))]
+
+        return list(dict.fromkeys(tables))
+
+    def cache_key(self, sql, version):
+        return hashlib.sha256(json.dumps([self.normalize_sql(sql), version], default=str).encode('utf8')).hexdigest()
+
+    def get(self, sql, version):
+        """
+        Returns the cached result of a query at a database version, or None if it is not cached.
+        """
+
+        key = self.cache_key(sql, version)
+
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+
+        result, spilled_path, _ = entry
+
+        if spilled_path is None:
+            return result
+
+        try:
+            return pd.read_parquet(spilled_path)
+        except (OSError, ValueError):
+            # The spilled file was removed from outside
+            self.discard(key)
+            return None
+
+    def put(self, sql, version, result):
+        """
+        Caches the result of a query at a database version, spilling it to disk if it is large, and evicts the least
+        recently used results beyond the limits.
+        """
+
+        key = self.cache_key(sql, version)
+        size = int(result.memory_usage(deep=True).sum())
+        spilled_path = None
+
+        # A previous entry of the same key spilled to the same file
+        self.discard(key)
+
+        if size > self.spill_threshold_bytes:
+            if self.spill_dir is None:
+                return
+
+            os.makedirs(self.spill_dir, exist_ok=True)
+            spilled_path = os.path.join(self.spill_dir, f"{key}.parquet")
+
+            try:
+                result.to_parquet(f"{spilled_path}.tmp", index=False)
+                os.replace(f"{spilled_path}.tmp", spilled_path)
+            except Exception:
+                # Results whose columns Parquet cannot store stay uncached
+                self.remove_spilled(f"{spilled_path}.tmp")
+                return
+
+            result = None
+            size = 0
+
+        with self._lock:
+            self.entries[key] = (result, spilled_path, size)
+            self.memory_bytes += size
+
+            evicted = []
+            while len(self.entries) > self.max_entries or (self.memory_bytes > self.max_bytes and len(self.entries) > 1):
+                evicted.append(self.entries.popitem(last=False))
+                self.memory_bytes -= evicted[-1][1][2]
+
+        for _, (_, evicted_path, _) in evicted:
+            self.remove_spilled(evicted_path)
+
+    def discard(self, key):
+        with self._lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.memory_bytes -= entry[2]
+
+        if entry is not None:
+            self.remove_spilled(entry[1])
+
+    def remove_spilled(self, spilled_path):
+        if spilled_path is not None and os.path.exists(spilled_path):
+            os.remove(spilled_path)
+
+    def run(self, sql, version, execute):
+        """
+        Returns the result of a query from the cache, or runs it and caches its result. Queries that cannot be cached,
+        or whose database has no version, always run.
+
+        Args:
+            sql (str): The query.
+            version (hashable): Version token of the data the query reads, e.g. DuckDBConnectionManager.version().
+            execute (callable): Function running the query and returning a pandas DataFrame.
+
+        Returns:
+            tuple: (result, cached), where cached is True if the result came from the cache.
+        """
+
+        if version is None or not self.is_cacheable(sql):
+            with self._lock:
+                self.bypasses += 1
+            return execute(), False
+
+        result = self.get(sql, version)
+
+        if result is not None:
+            with self._lock:
+                self.hits += 1
+            return result, True
+
+        with self._lock:
+            self.misses += 1
+
+        result = execute()
+        if isinstance(result, pd.DataFrame):
+            self.put(sql, version, result)
+
+        return result, False
+
+    def clear(self):
+        """
+        Drops every cached result, including the spilled files.
+        """
+
+        with self._lock:
+            entries, self.entries = list(self.entries.values()), OrderedDict()
+            self.memory_bytes = 0
+
+        for _, spilled_path, _ in entries:
+            self.remove_spilled(spilled_path)
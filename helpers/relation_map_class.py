@@ -1,20 +1,86 @@
-import duckdb
+import pyarrow as pa
 from google.cloud import bigquery
 from google.cloud.exceptions import NotFound
 from google.cloud.bigquery import SchemaField
 
-from .utility_class import BigQueryHelper
+from .bulk_writer_class import DuckDBBulkWriter
+from .connection_class import DuckDBConnectionManager
+from .metrics_class import BuildMetrics
+from .utility_class import BigQueryHelper, INDEX_TABLES
+from .worker_pool_class import DuckDBWorkerPool
+
+RELATION_VERIFICATION_SCHEMA = pa.schema([
+    ('table_name_left', pa.string()),
+    ('column_name_left', pa.string()),
+    ('table_name_right', pa.string()),
+    ('column_name_right', pa.string()),
+    ('verified_ratio', pa.float64()),
+    ('orphan_count', pa.int64()),
+])
+
 class DuckDBRelationMap:
-    def __init__(self, db_path):
+    def __init__(self, db_path, max_workers=None):
         """
         Initialize the RelationMap class with the path to the DuckDB database.
 
         Args:
         db_path (str): Path to the DuckDB database file.
+        max_workers (int, optional): Number of referenced tables verified concurrently. Defaults to the number of CPUs.
         """
         self.db_path = db_path
+        self.connections = DuckDBConnectionManager.get(db_path)
+        self.bulk_writer = DuckDBBulkWriter(db_path)
+        self.worker_pool = DuckDBWorkerPool(db_path, max_workers=max_workers)
+        
+    def statistics_filter(self, statistics_table_id, alias_a, alias_b, min_key_likeness=None):
+        """
+        Builds the joins and predicate discarding candidate edges by their column statistics: edges whose columns have
+        value ranges that do not overlap, and, if min_key_likeness is given, edges where neither column can be a key.
+
+        Args:
+            statistics_table_id (str): Identifier for the column statistics table.
+            alias_a (str): Alias of the index table on the left side of the edge.
+            alias_b (str): Alias of the index table on the right side of the edge.
+            min_key_likeness (float, optional): Minimum cardinality of at least one side, allowing two standard errors
+                                                for approximate distinct counts. Edges matched by name have no
+                                                cardinality gate, so this drops edges an unpruned build keeps.
+
+        Returns:
+            tuple: (joins, predicate) to add to the edge query.
+        """
+
+        joins = f"""
+        left join {statistics_table_id} statistics_a
+            on {alias_a}.table_name = statistics_a.table_name and {alias_a}.column_name = statistics_a.column_name
+        left join {statistics_table_id} statistics_b
+            on {alias_b}.table_name = statistics_b.table_name and {alias_b}.column_name = statistics_b.column_name
+        """
+        
+        # Columns without statistics are kept
+        predicate = f"""
+            and case
+                when statistics_a.min_numeric is not null and statistics_b.min_numeric is not null
+                    then statistics_a.max_numeric >= statistics_b.min_numeric and statistics_b.max_numeric >= statistics_a.min_numeric
+                when statistics_a.min_value is not null and statistics_b.min_value is not null
+                    then statistics_a.max_value >= statistics_b.min_value and statistics_b.max_value >= statistics_a.min_value
+                else true
+            end
+        """
+        
+        if min_key_likeness is not None:
+            key_likeness = "coalesce(least((statistics_{side}.distinct_count + 2 * coalesce(statistics_{side}.distinct_error, 0)) / nullif(statistics_{side}.non_null_count, 0), 1), 0)"
+            
+            predicate += f"""
+            and (
+                statistics_a.table_name is null or statistics_b.table_name is null
+                or greatest({key_likeness.format(side='a')}, {key_likeness.format(side='b')}) >= {float(min_key_likeness)}
+            )
+            """
         
-    def create_relation_map(self, index_table_id, similarity_table_id, target_table_id = 'relation_map'):
+        return joins, predicate
+
+    def create_relation_map(self, index_table_id, similarity_table_id, target_table_id = 'relation_map', tables=None,
+                            statistics_table_id=None, min_key_likeness=None, containment_table_id=None):
         """
         Creates a relation map in the DuckDB database. This map represents relationships between tables based on
         column similarities and other criteria.
@@ -24,12 +90,54 @@ class DuckDBRelationMap:
             similarity_table_id (str): Identifier for the similarity table used to build relations.
             target_table_id (str, optional): Name of the target table where the relation map will be stored. 
                                              Defaults to 'relation_map'.
+            tables (list of str, optional): If given, only the edges involving these tables are replaced instead of
+                                            rebuilding the whole relation map.
+            statistics_table_id (str, optional): If given, edges are pruned with the column statistics in this table,
+                                                 see statistics_filter.
+            min_key_likeness (float, optional): If given, edges where no side can reach this cardinality are pruned too,
+                                                see statistics_filter.
+            containment_table_id (str, optional): If given, the edges of this containment index, from a column to the
+                                                  key column containing its values, are added to the relation map.
 
         Returns:
             str: A log message indicating the success or failure of the operation.
         """
-
-        conn = duckdb.connect(self.db_path)
+        
+        if statistics_table_id is not None:
+            name_joins, name_predicate = self.statistics_filter(statistics_table_id, 'inter_a', 'inter_b', min_key_likeness)
+            similarity_joins, similarity_predicate = self.statistics_filter(statistics_table_id, 'similarity_a', 'similarity_b', min_key_likeness)
+        else:
+            name_joins = name_predicate = similarity_joins = similarity_predicate = ""
+        
+        containment_query = ""
+        if containment_table_id is not None:
+            # The referenced side is a key column, which is often named 'id', so only the referencing side is filtered
+            containment_query = f"""
+        union all
+        
+        select
+            cast(containment_a.table_name as string) as table_name_left,
+            cast(containment_b.table_name as string) as table_name_right,
+            cast(containment_a.column_name as string) as column_name_left,
+            cast(containment_b.column_name as string) as column_name_right,
+            cast(containment_a.data_type as string) as data_type_left,
+            cast(containment_b.data_type as string) as data_type_right,
+            containment_a.cardinality as cardinality_left,
+            containment_b.cardinality as cardinality_right,
+            coalesce(containment_a.cardinality_error, 0) as cardinality_error_left,
+            coalesce(containment_b.cardinality_error, 0) as cardinality_error_right,
+            containment.containment as weight,
+            2 as priority
+            
+        from {containment_table_id} containment
+        inner join {index_table_id} containment_a
+            on containment.table1 = containment_a.table_name and containment.column1 = containment_a.column_name
+        inner join {index_table_id} containment_b
+            on containment.table2 = containment_b.table_name and containment.column2 = containment_b.column_name
+            
+        where containment_a.column_name != ('id')
+            and containment_a.column_name not like ('%deleted%')
+            """
 
         query = f"""
         select 
@@ -41,6 +149,8 @@ class DuckDBRelationMap:
             cast(inter_b.data_type as string) as data_type_right,
             inter_a.cardinality as cardinality_left,
             inter_b.cardinality as cardinality_right,
+            coalesce(inter_a.cardinality_error, 0) as cardinality_error_left,
+            coalesce(inter_b.cardinality_error, 0) as cardinality_error_right,
             1 as weight,
             0 as priority
             
@@ -49,11 +159,13 @@ class DuckDBRelationMap:
             on inter_a.table_name != inter_b.table_name
             and inter_a.column_name = inter_b.column_name
             and inter_a.data_type = inter_b.data_type
+        {name_joins}
             
         where (inter_a.column_name != ('id') and inter_b.column_name != ('id'))
             and (inter_a.column_name not like ('%deleted%') and inter_b.column_name not like ('%deleted%'))
             and inter_a.data_type != 'DOUBLE'
             and inter_b.data_type != 'DOUBLE'
+            {name_predicate}
             
         union all
         
@@ -66,6 +178,8 @@ class DuckDBRelationMap:
             cast(similarity_b.data_type as string) as data_type_right,
             similarity_a.cardinality as cardinality_left,
             similarity_b.cardinality as cardinality_right,
+            coalesce(similarity_a.cardinality_error, 0) as cardinality_error_left,
+            coalesce(similarity_b.cardinality_error, 0) as cardinality_error_right,
             similarity.similarity_index as weight,
             1 as priority
             
@@ -74,43 +188,179 @@ class DuckDBRelationMap:
             on similarity.table1 = similarity_a.table_name and similarity.column1 = similarity_a.column_name
         inner join {index_table_id} similarity_b
             on similarity.table2 = similarity_b.table_name and similarity.column2 = similarity_b.column_name
+        {similarity_joins}
             
         where similarity_a.cardinality >= 0.5
             and similarity_b.cardinality >= 0.5
             and similarity_a.column_name != ('id') and similarity_b.column_name != ('id')
+            {similarity_predicate}
+        {containment_query}
 
         """
+        # Edges start unverified, so the map always has the columns verify_relation_map fills in
+        query = f"select *, null::double as verified_ratio, null::bigint as orphan_count from ({query})"
         log = ""
         
         try:
-            relation = conn.execute(query).fetchdf()
-
-            # Handling the creation of a new table or appending to an existing one
-            
-            conn.register('relation_df', relation)
-            conn.execute(f"create or replace table {target_table_id} as select * from relation_df")
+            # The relation query is written to the target table inside DuckDB, without a round trip through Python
+            if tables is None:
+                self.bulk_writer.write_query(target_table_id, query)
+            else:
+                # A map created before the verification columns existed is appended to by name
+                with self.connections.writer() as conn:
+                    if conn.execute("select count(*) from information_schema.tables where table_name = ?", [target_table_id]).fetchone()[0]:
+                        conn.execute(f"alter table {target_table_id} add column if not exists verified_ratio double")
+                        conn.execute(f"alter table {target_table_id} add column if not exists orphan_count bigint")
+                
+                tables_predicate = "table_name_left in (select unnest(?::varchar[])) or table_name_right in (select unnest(?::varchar[]))"
+                self.bulk_writer.write_query(
+                    target_table_id, f"select * from ({query}) where {tables_predicate}", [list(tables), list(tables)],
+                    mode='append', delete_where=tables_predicate, delete_params=[list(tables), list(tables)]
+                )
 
             log = log + ("Relation map successful")
         
         except Exception as e:
+            BuildMetrics.active().fail(e)
             log = log + (f"Relation map error: {e}")
         
         return log
 
-    def serialize_relation_map(self, map_table_id):
+    def verify_referenced_table(self, conn, table_name, edges):
+        """
+        Verifies every candidate edge pointing at one referenced table in a single query. The referenced table is
+        scanned once into a materialized CTE, and each edge is checked against it with a left join whose unmatched
+        rows, the anti-join, are the orphans.
+
+        Args:
+            conn (duckdb.DuckDBPyConnection): Connection or cursor to use.
+            table_name (str): Name of the referenced table.
+            edges (list of tuples): (table_name_left, column_name_left, column_name_right) of each edge pointing at it.
+
+        Returns:
+            list of tuples: Each tuple contains (table_name_left, column_name_left, table_name_right, column_name_right,
+                            verified_ratio, orphan_count), where verified_ratio is the fraction of distinct non-null
+                            values of the left column found in the right column, and orphan_count the number of
+                            non-null left rows without a match.
+        """
+        
+        referenced_columns = ", ".join(f'"{column_name}"' for column_name in dict.fromkeys(column_right for _, _, column_right in edges))
+        
+        edge_queries = [
+            f"""
+            select
+                {i} as edge,
+                count(distinct referencing.value) as distinct_values,
+                count(distinct referencing.value) filter (where referenced.value is not null) as matched_values,
+                count(*) filter (where referenced.value is null) as orphan_count
+            from (select "{column_left}" as value from "{table_left}" where "{column_left}" is not null) referencing
+            left join (select distinct "{column_right}" as value from referenced_table) referenced
+                on referencing.value = referenced.value
+            """
+            for i, (table_left, column_left, column_right) in enumerate(edges)
+        ]
+        
+        sql = f"""
+        with referenced_table as materialized (
+            select {referenced_columns} from "{table_name}"
+        )
+        {" union all ".join(edge_queries)}
+        """
+        
+        with BuildMetrics.active().measure('verify_table', table_name) as record:
+            verified = conn.execute(sql).fetchall()
+            record.add(queries=1)
+        
+        results = []
+        
+        for i, distinct_values, matched_values, orphan_count in verified:
+            table_left, column_left, column_right = edges[i]
+            verified_ratio = matched_values / distinct_values if distinct_values else None
+            results.append((table_left, column_left, table_name, column_right, verified_ratio, orphan_count))
+        
+        return results
+
+    def verify_relation_map(self, map_table_id='relation_map', tables=None):
+        """
+        Verifies the candidate edges of a relation map against the data and stores the exact results on each edge, in
+        the 'verified_ratio' and 'orphan_count' columns. Edges are grouped by the table they reference, so each
+        referenced table is scanned once for all of its edges, and referenced tables are verified concurrently.
+
+        Args:
+            map_table_id (str): Identifier for the map table that contains the relationship data.
+            tables (list of str, optional): If given, only the edges involving these tables are verified.
+
+        Returns:
+            str: A log message indicating the success or failure of the operation.
+        """
+        
+        query = f"""
+            select distinct table_name_left, column_name_left, table_name_right, column_name_right
+            from {map_table_id}
+        """
+        params = None
+        
+        if tables is not None:
+            query += " where table_name_left in (select unnest(?::varchar[])) or table_name_right in (select unnest(?::varchar[]))"
+            params = [list(tables), list(tables)]
+        
+        log = ""
+        
+        try:
+            with self.connections.reader() as conn:
+                edges_df = conn.execute(query, params).fetchdf()
+            
+            referenced_tables = [
+                (table_name, list(edges[['table_name_left', 'column_name_left', 'column_name_right']].itertuples(index=False, name=None)))
+                for table_name, edges in edges_df.groupby('table_name_right', sort=True)
+            ]
+            
+            verified = self.worker_pool.map_cursors(lambda cursor, table: self.verify_referenced_table(cursor, table[0], table[1]), referenced_tables)
+            
+            with self.connections.writer() as conn:
+                conn.execute(f"alter table {map_table_id} add column if not exists verified_ratio double")
+                conn.execute(f"alter table {map_table_id} add column if not exists orphan_count bigint")
+            
+            self.bulk_writer.write(
+                map_table_id, [edge for table_edges in verified for edge in table_edges], mode='merge', schema=RELATION_VERIFICATION_SCHEMA,
+                key_columns=['table_name_left', 'column_name_left', 'table_name_right', 'column_name_right']
+            )
+            
+            log = log + (f"Relation verification successful for {len(edges_df)} edges over {len(referenced_tables)} referenced tables")
+        
+        except Exception as e:
+            BuildMetrics.active().fail(e)
+            log = log + (f"Relation verification error: {e}")
+        
+        return log
+
+    def is_verified(self, conn, map_table_id):
+        """
+        Returns whether verify_relation_map has verified at least one edge of a relation map.
+        """
+        
+        has_column = conn.execute(
+            "select count(*) from information_schema.columns where table_name = ? and column_name = 'verified_ratio'", [map_table_id]
+        ).fetchone()[0]
+        
+        return bool(has_column) and conn.execute(f"select count(verified_ratio) from {map_table_id}").fetchone()[0] > 0
+
+    def serialize_relation_map(self, map_table_id, min_verified_ratio=None):
         """
         Serializes the relation map into a human-readable format, including a description of the database schema
-        and the relationships between tables.
+        and the relationships between tables. A side is treated as "one" when its cardinality is within its recorded
+        error bound of 1, so approximate cardinalities are not misread as "many".
 
         Args:
             map_table_id (str): Identifier for the map table that contains the relationship data.
+            min_verified_ratio (float, optional): If given, only edges verified by verify_relation_map with at least
+                                                  this inclusion ratio are serialized. Raises a ValueError if the
+                                                  relation map has not been verified.
 
         Returns:
             str: A string representation of the database schema and the relation map.
         """
         
-        conn = duckdb.connect(self.db_path)
-        
         index_query = f"""
             select 
                 table_name,
@@ -118,28 +368,37 @@ class DuckDBRelationMap:
                 data_type
             from information_schema.columns
             
-            where table_name not in ('similarity_index','cardinality_index','relation_map')
+            where table_name not in {INDEX_TABLES}
         """ 
         relation_query = f"""
             select 
                 table_name_left,
                 column_name_left,
                 data_type_left,
-                if(cardinality_left < 1, 'many','one') as join_type_left,
+                if(cardinality_left < 1 - cardinality_error_left, 'many','one') as join_type_left,
                 
                 table_name_right,
                 column_name_right,
                 data_type_right,
-                if(cardinality_right < 1, 'many','one') as join_type_right
+                if(cardinality_right < 1 - cardinality_error_right, 'many','one') as join_type_right
                 
             from {map_table_id}
             
-            where cardinality_left = 1 or cardinality_right = 1
+            where (cardinality_left >= 1 - cardinality_error_left or cardinality_right >= 1 - cardinality_error_right)
         """
+        relation_params = None
+        
+        if min_verified_ratio is not None:
+            relation_query += " and verified_ratio >= ?"
+            relation_params = [min_verified_ratio]
         
         # Execute queries with DuckDB
-        index_map = conn.execute(index_query).fetchdf()
-        relation_map_enriched = conn.execute(relation_query).fetchdf()
+        with self.connections.reader() as conn:
+            if min_verified_ratio is not None and not self.is_verified(conn, map_table_id):
+                raise ValueError(f"Relation map '{map_table_id}' has not been verified: run verification first")
+            
+            index_map = conn.execute(index_query).fetchdf()
+            relation_map_enriched = conn.execute(relation_query, relation_params).fetchdf()
         
         # Create a schema map for tables and columns with data types
         schema_map = {}
@@ -171,9 +430,9 @@ class DuckDBRelationMap:
         return schema_str + schema_map_str
 
 class BigQueryRelationMap:
-    def __init__(self, key_path):
+    def __init__(self, key_path, client=None):
         self.key_path = key_path
-        self.bigquery_helper = BigQueryHelper(key_path)
+        self.bigquery_helper = BigQueryHelper(key_path, client=client)
         
     def build_bigquery_relation_map(self, project_id, dataset_id, index_table_id, jaccard_table_id, target_table_id, sim_threshold=0, replace=False):
         query = f"""
@@ -246,12 +505,12 @@ class BigQueryRelationMap:
             left_node.table as table_name_left,
             left_node.column as column_name_left,
             left_node.datatype as datatype_left,
-            IF(map.left_card < 1, 'many','one') AS join_type_left,
+            IF(map.left_card < 1 - IFNULL(left_node.cardinality_error, 0), 'many','one') AS join_type_left,
             right_node.dataset as dataset_right,
             right_node.table as table_name_right,
             right_node.column as column_name_right,
             right_node.datatype as datatype_right,
-            IF(map.right_card < 1, 'many','one') AS join_type_right
+            IF(map.right_card < 1 - IFNULL(right_node.cardinality_error, 0), 'many','one') AS join_type_right
         
         FROM `{project_id}.{dataset_id}.{map_table_id}` map
         INNER JOIN `{project_id}.{dataset_id}.{index_table_id}` left_node
@@ -1,68 +1,361 @@
-from datasketch import MinHash
+from datasketch import MinHash, MinHashLSH, MinHashLSHEnsemble
+import itertools
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
-import duckdb
+import pyarrow as pa
+import datetime
 from google.cloud import bigquery
 from google.cloud.bigquery import SchemaField
 from google.cloud.exceptions import NotFound
 
-from .utility_class import BigQueryHelper
+from .utility_class import BigQueryHelper, INDEX_TABLES
+from .bulk_writer_class import DuckDBBulkWriter
+from .column_statistics_class import DuckDBColumnStatistics
+from .connection_class import DuckDBConnectionManager
+from .metrics_class import BuildMetrics
+from .minhash_class import BatchMinHash, compute_minhash
+from .worker_pool_class import DuckDBWorkerPool
+
+SIMILARITY_INDEX_SCHEMA = pa.schema([
+    ('table1', pa.string()),
+    ('column1', pa.string()),
+    ('table2', pa.string()),
+    ('column2', pa.string()),
+    ('similarity_index', pa.float64()),
+])
+
+CONTAINMENT_INDEX_SCHEMA = pa.schema([
+    ('table1', pa.string()),
+    ('column1', pa.string()),
+    ('table2', pa.string()),
+    ('column2', pa.string()),
+    ('containment', pa.float64()),
+])
+
+MINHASH_SIGNATURES_SCHEMA = pa.schema([
+    ('table_name', pa.string()),
+    ('column_name', pa.string()),
+    ('num_perm', pa.int32()),
+    ('seed', pa.int32()),
+    ('signature', pa.binary()),
+    ('row_count', pa.int64()),
+    ('built_at', pa.timestamp('us')),
+    ('sketch_method', pa.string()),
+])
+
+def same_type_column_pairs(dataframe, table_key, column_key, type_key):
+    """
+    Enumerates the unique pairs of columns that share a data type and belong to different tables, in the order the
+    columns appear in the dataframe. Columns are grouped by data type first, so the work is proportional to the number
+    of pairs produced rather than the square of the number of columns.
+
+    Args:
+    dataframe (pandas.DataFrame): DataFrame describing one column per row.
+    table_key (str): Name of the dataframe column holding the table name.
+    column_key (str): Name of the dataframe column holding the column name.
+    type_key (str): Name of the dataframe column holding the data type.
+
+    Returns:
+    list of tuples: Each tuple contains (table1, column1, table2, column2).
+    """
+    rows = list(dataframe[[table_key, column_key, type_key]].itertuples(index=False, name=None))
+
+    positions_by_type = {}
+    for position, (_, _, data_type) in enumerate(rows):
+        positions_by_type.setdefault(data_type, []).append(position)
+
+    pair_positions = []
+    for positions in positions_by_type.values():
+        for position1, position2 in itertools.combinations(positions, 2):
+            if rows[position1][0] != rows[position2][0]:
+                pair_positions.append((position1, position2))
+
+    pair_positions.sort()
+
+    return [(rows[p1][0], rows[p1][1], rows[p2][0], rows[p2][1]) for p1, p2 in pair_positions]
+
+def compute_minhash_signature(task):
+    """
+    Computes the MinHash hash values of a column's values. Defined at module level so it can run in a process pool.
+
+    Args:
+    task (tuple): (values, num_perm, seed, sketch_method)
+
+    Returns:
+    numpy.ndarray: Hash values of the MinHash.
+    """
+    values, num_perm, seed, sketch_method = task
+
+    return compute_minhash(values, num_perm=num_perm, seed=seed, sketch_method=sketch_method).hashvalues
+
 class DuckDBSimilarityIndex:
-    def __init__(self, db_path):
+    def __init__(self, db_path, sketch_method='numpy', max_workers=None, use_processes=False, batch_size=1000000):
         """
         Initialize the SimilarityIndex class with the path to the DuckDB database.
 
         Args:
         db_path (str): Path to the DuckDB database file.
+        sketch_method (str): How column values are sketched: 'numpy' hashes whole columns with the vectorized
+                             BatchMinHash engine, 'python' updates a MinHash one value at a time, and 'duckdb'
+                             computes the signature inside DuckDB so only num_perm integers reach Python.
+                             Signatures built with different methods are not comparable and are stored separately.
+        max_workers (int, optional): Number of columns read and sketched concurrently. Defaults to the number of CPUs.
+        use_processes (bool): If True, the Python-side 'numpy' and 'python' sketching runs in a process pool while
+                              column reads stay on threads.
+        batch_size (int, optional): Number of rows per Arrow record batch when columns are streamed into their sketch,
+                                    which bounds memory use regardless of table size. If None, each column is fetched
+                                    whole. Columns sketched in a process pool are always fetched whole.
         """
         self.db_path = db_path
+        self.sketch_method = sketch_method
+        self.use_processes = use_processes
+        self.batch_size = batch_size
+        self.connections = DuckDBConnectionManager.get(db_path)
+        self.bulk_writer = DuckDBBulkWriter(db_path)
+        self.worker_pool = DuckDBWorkerPool(db_path, max_workers=max_workers)
 
-    def get_column_values(self, table_name, column_name):
+    def get_column_values(self, table_name, column_name, conn=None):
         """
         Fetches the values of a specific column from a table in the DuckDB database.
 
         Args:
         table_name (str): Name of the table.
         column_name (str): Name of the column.
+        conn (duckdb.DuckDBPyConnection, optional): Connection or cursor to use. A cursor on the shared connection
+                                                    is opened and closed if omitted.
 
         Returns:
-        pandas.Series: Series containing the values from the specified column.
+        pandas.Series: Series containing the values from the specified column, or None if it could not be read.
         """
         
-        conn = duckdb.connect(self.db_path)
+        close_conn = conn is None
+        
+        if close_conn:
+            conn = self.connections.cursor()
         
         query = f"SELECT {column_name} FROM {table_name}"
         
         try:
-            result = conn.execute(query).fetchdf()
+            with BuildMetrics.active().profile('get_column_values'):
+                result = conn.execute(query).fetchdf()
+            
+            BuildMetrics.active().add(rows=len(result), bytes=result.memory_usage(deep=False).sum(), queries=1)
             
             return result[column_name]
         
         except Exception as e:
-            print(f"An error occurred: {e}")
+            BuildMetrics.active().fail(e)
             
-            return pd.Series()
+            # Not an empty column, whose signature would be stored and reused instead of reading the column again
+            return None
         
         finally:
-            conn.close()
+            if close_conn:
+                conn.close()
 
-    def compute_minhash(self, values, num_perm=128):
+    def iter_column_batches(self, table_name, column_name, batch_size=None, conn=None):
+        """
+        Streams the values of a column as Arrow record batches, so only one batch is held in memory at a time.
+
+        Args:
+        table_name (str): Name of the table.
+        column_name (str): Name of the column.
+        batch_size (int, optional): Number of rows per batch. Defaults to this instance's batch_size.
+        conn (duckdb.DuckDBPyConnection, optional): Connection or cursor to use. A cursor on the shared connection
+                                                    is opened and closed if omitted.
+
+        Yields:
+        pyarrow.Array: The values of the column, one batch at a time.
+        """
+        
+        close_conn = conn is None
+        
+        if close_conn:
+            conn = self.connections.cursor()
+        
+        batch_size = batch_size or self.batch_size or 1000000
+        
+        try:
+            result = conn.execute(f'select "{column_name}" from "{table_name}"')
+            metrics = BuildMetrics.active()
+            metrics.add(queries=1)
+            
+            # to_arrow_reader replaces fetch_record_batch in newer DuckDB releases
+            if hasattr(result, 'to_arrow_reader'):
+                reader = result.to_arrow_reader(batch_size)
+            else:
+                reader = result.fetch_record_batch(batch_size)
+            
+            for batch in reader:
+                metrics.add(rows=batch.num_rows, bytes=batch.nbytes)
+                yield batch.column(0)
+        
+        finally:
+            if close_conn:
+                conn.close()
+
+    def compute_minhash_batches(self, batches, num_perm=128, seed=1):
+        """
+        Computes the MinHash of a column streamed in batches, updating the sketch one batch at a time.
+
+        Args:
+        batches (iterable): Iterable of value batches, e.g. from iter_column_batches.
+        num_perm (int): Number of permutations used in MinHash calculation.
+        seed (int): Seed of the MinHash permutations.
+
+        Returns:
+        tuple: (MinHash object of all batches, number of values sketched)
+        """
+        
+        with BuildMetrics.active().profile('compute_minhash'):
+            if self.sketch_method == 'numpy':
+                sketch = BatchMinHash(num_perm=num_perm, seed=seed)
+                
+                for batch in batches:
+                    sketch.update(batch)
+                
+                return sketch.minhash(), sketch.row_count
+            
+            m = MinHash(num_perm=num_perm, seed=seed)
+            row_count = 0
+            
+            for batch in batches:
+                # Dates convert to timestamps, as in fetchdf, so both read paths produce the same signature
+                values = batch.to_pandas(date_as_object=False) if hasattr(batch, 'to_pandas') else batch
+                
+                for v in values:
+                    m.update(str(v).encode('utf8'))
+                
+                row_count += len(values)
+            
+            return m, row_count
+
+    def compute_minhash(self, values, num_perm=128, seed=1):
         """
         Computes the MinHash of a collection of values.
 
         Args:
         values (iterable): Iterable of values to compute the MinHash.
         num_perm (int): Number of permutations used in MinHash calculation.
+        seed (int): Seed of the MinHash permutations.
 
         Returns:
         MinHash: MinHash object representing the MinHash of the given values.
         """
         
-        m = MinHash(num_perm=num_perm)
+        with BuildMetrics.active().profile('compute_minhash'):
+            return compute_minhash(values, num_perm=num_perm, seed=seed, sketch_method=self.sketch_method)
+
+    def compute_minhash_pushdown(self, table_name, column_name, num_perm=128, seed=1, conn=None):
+        """
+        Computes the MinHash of a column inside DuckDB. Each of the num_perm hash functions is hash(value, seed, i)
+        truncated to 32 bits, and its minimum is aggregated over the distinct non-null values of the column, so memory
+        use and transfer cost do not depend on the number of rows.
+
+        Args:
+        table_name (str): Name of the table.
+        column_name (str): Name of the column.
+        num_perm (int): Number of permutations used in MinHash calculation.
+        seed (int): Seed of the MinHash permutations.
+        conn (duckdb.DuckDBPyConnection, optional): Connection or cursor to use. A cursor on the shared connection
+                                                    is opened and closed if omitted.
+
+        Returns:
+        tuple: (MinHash object of the column, number of rows in the table)
+        """
+        
+        close_conn = conn is None
+        
+        if close_conn:
+            conn = self.connections.cursor()
+        
+        # An empty column keeps the initial MinHash value, the maximum 32-bit hash
+        aggregates = ", ".join(f"coalesce(min(hash(value, {seed}, {i}) & 4294967295), 4294967295)" for i in range(num_perm))
+        
+        query = f"""
+        select
+            (select count(*) from "{table_name}") as row_count,
+            {aggregates}
+        from (
+            select distinct "{column_name}" as value
+            from "{table_name}"
+            where "{column_name}" is not null
+        )
+        """
+        
+        try:
+            with BuildMetrics.active().profile('compute_minhash_pushdown'):
+                result = conn.execute(query).fetchone()
+        finally:
+            if close_conn:
+                conn.close()
+        
+        BuildMetrics.active().add(rows=result[0], queries=1)
+            
+        m = MinHash(num_perm=num_perm, seed=seed)
+        m.hashvalues = np.array(result[1:], dtype=m.hashvalues.dtype)
+        
+        return m, result[0]
+
+    def read_column(self, conn, column):
+        """
+        Fetches the values of a single column whole, to be sketched in another process.
+
+        Args:
+        conn (duckdb.DuckDBPyConnection): Connection or cursor to read the column with.
+        column (tuple): (table_name, column_name) of the column.
+
+        Returns:
+        pandas.Series: Series containing the values of the column, or None if it could not be read.
+        """
+        table_name, column_name = column
+        
+        with BuildMetrics.active().measure('read_column', table_name, column_name):
+            return self.get_column_values(table_name, column_name, conn=conn)
+
+    def sketch_column(self, conn, column, k, seed=1):
+        """
+        Reads and sketches a single column with this instance's sketch method.
+
+        Args:
+        conn (duckdb.DuckDBPyConnection): Connection or cursor to read the column with.
+        column (tuple): (table_name, column_name) of the column.
+        k (int): Number of permutations used in MinHash calculation.
+        seed (int): Seed of the MinHash permutations.
+
+        Returns:
+        tuple: (hash values of the MinHash, number of rows sketched), or None if the column could not be read.
+        """
+        table_name, column_name = column
         
-        for v in values:
-            m.update(str(v).encode('utf8'))
+        with BuildMetrics.active().measure('sketch_column', table_name, column_name):
+            if self.sketch_method == 'duckdb':
+                try:
+                    minhash, row_count = self.compute_minhash_pushdown(table_name, column_name, num_perm=k, seed=seed, conn=conn)
+                except Exception as e:
+                    BuildMetrics.active().fail(e)
+                    return None
+                
+                return minhash.hashvalues, row_count
             
-        return m
+            if self.batch_size is None:
+                values = self.get_column_values(table_name, column_name, conn=conn)
+                
+                if values is None:
+                    return None
+                
+                return self.compute_minhash(values, num_perm=k, seed=seed).hashvalues, len(values)
+            
+            try:
+                batches = self.iter_column_batches(table_name, column_name, conn=conn)
+                minhash, row_count = self.compute_minhash_batches(batches, num_perm=k, seed=seed)
+            except Exception as e:
+                BuildMetrics.active().fail(e)
+                return None
+            
+            return minhash.hashvalues, row_count
 
     def compute_similarity_index_minhash(self, minhash1, minhash2):
         """
@@ -77,39 +370,257 @@ class DuckDBSimilarityIndex:
         """
         return minhash1.jaccard(minhash2)
 
-    def compute_similarity_index_for_assets(self, dataframe, k, similarity_threshold=0.7):
+    def build_minhash_signatures(self, columns, k, seed=1, refresh=True):
+        """
+        Sketches each column exactly once and persists the MinHash signatures in the 'minhash_signatures' table,
+        so pairwise comparisons can be made against stored signatures instead of re-reading column data.
+
+        Args:
+        columns (iterable of tuples): (table_name, column_name) pairs to sketch.
+        k (int): Number of permutations used in MinHash calculation.
+        seed (int): Seed of the MinHash permutations.
+        refresh (bool): If True, re-sketches every column. If False, only sketches columns without a stored signature.
+
+        Returns:
+        str: A log message indicating the success or failure of the operation.
+        """
+        log = ""
+        
+        with self.connections.writer() as conn:
+            conn.execute("""
+                create table if not exists minhash_signatures (
+                    table_name varchar,
+                    column_name varchar,
+                    num_perm integer,
+                    seed integer,
+                    signature blob,
+                    row_count bigint,
+                    built_at timestamp,
+                    sketch_method varchar
+                )
+                """)
+            conn.execute("alter table minhash_signatures add column if not exists sketch_method varchar")
+            
+            stored = set()
+            
+            if not refresh:
+                stored_df = conn.execute(
+                    "select table_name, column_name from minhash_signatures where num_perm = ? and seed = ? and sketch_method = ?",
+                    [k, seed, self.sketch_method]
+                ).fetchdf()
+                stored = set(zip(stored_df['table_name'], stored_df['column_name']))
+
+        to_sketch = [column for column in dict.fromkeys(columns) if column not in stored]
+        
+        if self.use_processes and self.sketch_method != 'duckdb':
+            # Bound the number of columns held in memory at once to a few per worker
+            batch_size = self.worker_pool.max_workers * 4
+            sketches = []
+            
+            for start in range(0, len(to_sketch), batch_size):
+                batch = to_sketch[start:start + batch_size]
+                values = self.worker_pool.map_cursors(lambda cursor, column: self.read_column(cursor, column), batch)
+                read = [v for v in values if v is not None]
+                hashvalues = iter(self.worker_pool.map_processes(compute_minhash_signature, [(v, k, seed, self.sketch_method) for v in read]))
+                sketches.extend(None if v is None else (next(hashvalues), len(v)) for v in values)
+        else:
+            sketches = self.worker_pool.map_cursors(lambda cursor, column: self.sketch_column(cursor, column, k, seed=seed), to_sketch)
+
+        signatures = []
+        
+        for (table_name, column_name), sketch in zip(to_sketch, sketches):
+            if sketch is None:
+                continue
+            
+            hashvalues, row_count = sketch
+            signatures.append((table_name, column_name, k, seed, hashvalues.tobytes(), row_count, datetime.datetime.now(), self.sketch_method))
+
+        try:
+            self.bulk_writer.write(
+                'minhash_signatures', signatures, mode='merge', schema=MINHASH_SIGNATURES_SCHEMA,
+                key_columns=['table_name', 'column_name', 'num_perm', 'seed', 'sketch_method']
+            )
+            
+            log = log + (f"MinHash signatures built for {len(signatures)} columns")
+        
+        except Exception as e:
+            BuildMetrics.active().fail(e)
+            log = log + (f"MinHash signatures error: {e}")
+        
+        return log
+
+    def load_minhash_signatures(self, k, seed=1):
+        """
+        Loads the stored MinHash signatures built with the given number of permutations and seed by this instance's
+        sketch method.
+
+        Args:
+        k (int): Number of permutations used in MinHash calculation.
+        seed (int): Seed of the MinHash permutations.
+
+        Returns:
+        dict: Maps (table_name, column_name) to the MinHash object rebuilt from its stored signature.
+        """
+        with self.connections.reader() as conn:
+            signatures_df = conn.execute(
+                "select table_name, column_name, signature from minhash_signatures where num_perm = ? and seed = ? and sketch_method = ?",
+                [k, seed, self.sketch_method]
+            ).fetchdf()
+
+        signatures = {}
+        
+        for table_name, column_name, signature in signatures_df.itertuples(index=False):
+            minhash = MinHash(num_perm=k, seed=seed)
+            minhash.hashvalues = np.frombuffer(signature, dtype=minhash.hashvalues.dtype).copy()
+            signatures[(table_name, column_name)] = minhash
+            
+        return signatures
+
+    def compute_lsh_candidate_pairs(self, dataframe, signatures, k, similarity_threshold):
+        """
+        Generates candidate column pairs with MinHash LSH instead of enumerating every same-type pair. Each column is
+        inserted once into an LSH index for its data type, and only pairs that collide in at least one band, i.e. are
+        likely to have a similarity index above the threshold, are returned.
+
+        Args:
+        dataframe (pandas.DataFrame): DataFrame containing 'table_name', 'column_name', and 'data_type' columns.
+        signatures (dict): Maps (table_name, column_name) to its MinHash object.
+        k (int): Number of permutations used in MinHash calculation.
+        similarity_threshold (float): Jaccard threshold the LSH banding is tuned for.
+
+        Returns:
+        list of tuples: Each tuple contains (table1, column1, table2, column2).
+        """
+        rows = list(dict.fromkeys(dataframe[['table_name', 'column_name', 'data_type']].itertuples(index=False, name=None)))
+        positions = {(table_name, column_name): position for position, (table_name, column_name, _) in enumerate(rows)}
+
+        lsh_by_type = {}
+        for table_name, column_name, data_type in rows:
+            minhash = signatures.get((table_name, column_name))
+            if minhash is None:
+                continue
+            
+            if data_type not in lsh_by_type:
+                lsh_by_type[data_type] = MinHashLSH(threshold=similarity_threshold, num_perm=k)
+            lsh_by_type[data_type].insert((table_name, column_name), minhash)
+
+        pair_positions = set()
+        for table_name, column_name, data_type in rows:
+            minhash = signatures.get((table_name, column_name))
+            if minhash is None:
+                continue
+            
+            for candidate_table, candidate_column in lsh_by_type[data_type].query(minhash):
+                if candidate_table != table_name:
+                    position1 = positions[(table_name, column_name)]
+                    position2 = positions[(candidate_table, candidate_column)]
+                    pair_positions.add((min(position1, position2), max(position1, position2)))
+
+        return [(rows[p1][0], rows[p1][1], rows[p2][0], rows[p2][1]) for p1, p2 in sorted(pair_positions)]
+
+    def remove_minhash_signatures(self, tables):
+        """
+        Deletes the stored MinHash signatures of the given tables, e.g. tables that were dropped or changed.
+
+        Args:
+        tables (list of str): Names of the tables whose signatures are removed.
+
+        Returns:
+        str: A log message indicating the success or failure of the operation.
+        """
+        log = ""
+        
+        with self.connections.writer() as conn:
+            try:
+                if conn.execute("select count(*) from information_schema.tables where table_name = 'minhash_signatures'").fetchone()[0]:
+                    conn.execute("delete from minhash_signatures where table_name in (select unnest(?::varchar[]))", [list(tables)])
+            
+                log = log + (f"MinHash signatures removed for {len(tables)} tables")
+        
+            except Exception as e:
+                BuildMetrics.active().fail(e)
+                log = log + (f"MinHash signatures error: {e}")
+        
+        return log
+
+    def compute_similarity_index_for_assets(self, dataframe, k, similarity_threshold=0.7, seed=1, refresh_signatures=True, use_lsh=False, tables=None,
+                                            statistics_table_id=None, min_key_likeness=None):
         """
         Computes similarity indices for all unique pairs of columns in a dataframe that have the same data type and 
-        appends only those with a similarity index above a specified threshold.
+        appends only those with a similarity index above a specified threshold. Every column involved is sketched
+        once into the 'minhash_signatures' table, and all pairs are compared against the stored signatures.
 
         Args:
         dataframe (pandas.DataFrame): DataFrame containing 'table_name', 'column_name', and 'data_type' columns.
         k (int): Number of permutations used in MinHash calculation.
         similarity_threshold (float): Minimum similarity index threshold for the results to be appended.
+        seed (int): Seed of the MinHash permutations.
+        refresh_signatures (bool): If False, reuses signatures already stored for a column instead of re-sketching it.
+        use_lsh (bool): If True, only compares the candidate pairs returned by MinHash LSH instead of all same-type pairs.
+        tables (list of str, optional): If given, only pairs involving these tables are computed. Their columns are
+                                        re-sketched, while other columns reuse their stored signatures.
+        statistics_table_id (str, optional): If given, the column statistics in this table are used to discard pairs
+                                             whose value ranges do not overlap or whose distinct counts are too far
+                                             apart to reach the threshold, before any column is sketched.
+        min_key_likeness (float, optional): If given with statistics_table_id, columns whose cardinality cannot reach
+                                            it are not compared at all. Only use it when the similarity index feeds
+                                            nothing but the relation map, whose similarity edges require a
+                                            cardinality of 0.5 on both sides.
 
         Returns:
         list of tuples: Each tuple contains (table1, column1, table2, column2, similarity_index).
         """
-        filtered_df = dataframe[dataframe['table_name'] != 'similarity_index']
+        filtered_df = dataframe[~dataframe['table_name'].isin(INDEX_TABLES)]
         selected_columns_df = filtered_df[['table_name', 'column_name', 'data_type']]
+        
+        if tables is not None:
+            tables = set(tables)
+        
+        statistics = {}
+        if statistics_table_id is not None:
+            column_statistics = DuckDBColumnStatistics(self.db_path, statistics_table_id=statistics_table_id)
+            statistics = column_statistics.load_statistics()
+            
+            if min_key_likeness is not None:
+                columns = list(zip(selected_columns_df['table_name'], selected_columns_df['column_name']))
+                key_columns = set(column_statistics.prune_columns(columns, statistics, min_key_likeness))
+                selected_columns_df = selected_columns_df[[column in key_columns for column in columns]]
+        
+        def involves_tables(pair):
+            return pair[0] in tables or pair[2] in tables
 
-        column_pairs = []
-        for index1, row1 in selected_columns_df.iterrows():
-            for index2, row2 in selected_columns_df.iterrows():
-                if index1 != index2:
-                    table1, col1, type1 = row1['table_name'], row1['column_name'], row1['data_type']
-                    table2, col2, type2 = row2['table_name'], row2['column_name'], row2['data_type']
-
-                    if type1 == type2 and table1 != table2 and (table2, col2, table1, col1) not in column_pairs:
-                        column_pairs.append((table1, col1, table2, col2))
+        if use_lsh:
+            columns = list(selected_columns_df[['table_name', 'column_name']].itertuples(index=False, name=None))
+        else:
+            column_pairs = same_type_column_pairs(selected_columns_df, 'table_name', 'column_name', 'data_type')
+            if tables is not None:
+                column_pairs = [pair for pair in column_pairs if involves_tables(pair)]
+            if statistics:
+                column_pairs = column_statistics.prune_column_pairs(column_pairs, statistics, similarity_threshold)
+            columns = [(table1, col1) for table1, col1, _, _ in column_pairs] + [(table2, col2) for _, _, table2, col2 in column_pairs]
+            
+        if tables is None:
+            self.build_minhash_signatures(columns, k, seed=seed, refresh=refresh_signatures)
+        else:
+            self.build_minhash_signatures([column for column in columns if column[0] in tables], k, seed=seed, refresh=True)
+            self.build_minhash_signatures([column for column in columns if column[0] not in tables], k, seed=seed, refresh=False)
+            
+        signatures = self.load_minhash_signatures(k, seed=seed)
+        
+        if use_lsh:
+            column_pairs = self.compute_lsh_candidate_pairs(selected_columns_df, signatures, k, similarity_threshold)
+            if tables is not None:
+                column_pairs = [pair for pair in column_pairs if involves_tables(pair)]
+            if statistics:
+                column_pairs = column_statistics.prune_column_pairs(column_pairs, statistics, similarity_threshold)
 
         similarity_df = []
         for table1, col1, table2, col2 in column_pairs:
-            values1 = self.get_column_values(table1, col1) 
-            values2 = self.get_column_values(table2, col2)
-
-            minhash1 = self.compute_minhash(values1, num_perm=k)
-            minhash2 = self.compute_minhash(values2, num_perm=k)
+            minhash1 = signatures.get((table1, col1))
+            minhash2 = signatures.get((table2, col2))
+            
+            if minhash1 is None or minhash2 is None:
+                continue
 
             similarity_index = self.compute_similarity_index_minhash(minhash1, minhash2)
             if similarity_index >= similarity_threshold:
@@ -117,54 +628,237 @@ class DuckDBSimilarityIndex:
 
         return similarity_df
 
-    def create_similarity_index_table(self, similarity_index):
+    def load_column_sizes(self, signatures, statistics_table_id='column_statistics'):
         """
-        Creates a table in the DuckDB database and inserts the similarity results.
+        Returns the number of distinct values of each sketched column, taken from the column statistics when they
+        exist and otherwise estimated from the column's MinHash.
 
         Args:
-        similarity_index (list of tuples): The similarity results to be stored, where each tuple is 
-                                            (table1, column1, table2, column2, similarity_index).
+        signatures (dict): Maps (table_name, column_name) to its MinHash object.
+        statistics_table_id (str): Name of the column statistics table.
+
+        Returns:
+        dict: Maps (table_name, column_name) to its number of distinct values.
+        """
+        statistics = DuckDBColumnStatistics(self.db_path, statistics_table_id=statistics_table_id).load_statistics()
+
+        sizes = {}
+        for column, minhash in signatures.items():
+            distinct_count = statistics.get(column, {}).get('distinct_count')
+            sizes[column] = max(int(round(distinct_count if distinct_count is not None else minhash.count())), 1)
+
+        return sizes
+
+    def compute_containment(self, minhash1, minhash2, size1, size2):
+        """
+        Estimates the containment of the first column's values in the second column's values, |A ∩ B| / |A|, from
+        their Jaccard similarity index and their numbers of distinct values.
+
+        Args:
+        minhash1 (MinHash): MinHash of the contained column.
+        minhash2 (MinHash): MinHash of the containing column.
+        size1 (int): Number of distinct values of the contained column.
+        size2 (int): Number of distinct values of the containing column.
+
+        Returns:
+        float: Estimated containment, between 0 and 1.
+        """
+        jaccard = minhash1.jaccard(minhash2)
+
+        return min(jaccard * (size1 + size2) / ((1 + jaccard) * size1), 1.0)
+
+    def compute_containment_candidate_pairs(self, dataframe, signatures, sizes, key_columns, k, containment_threshold, num_part=16):
+        """
+        Finds, for every column, the key columns that are likely to contain its values. The key columns of each data
+        type are indexed once in an LSH Ensemble, which partitions them by size so a query is answered in sublinear
+        time without comparing the column to every key.
+
+        Args:
+        dataframe (pandas.DataFrame): DataFrame containing 'table_name', 'column_name', and 'data_type' columns.
+        signatures (dict): Maps (table_name, column_name) to its MinHash object.
+        sizes (dict): Maps (table_name, column_name) to its number of distinct values.
+        key_columns (set of tuples): (table_name, column_name) of the columns that can be referenced.
+        k (int): Number of permutations used in MinHash calculation.
+        containment_threshold (float): Containment threshold the LSH Ensemble is tuned for.
+        num_part (int): Number of size partitions of each LSH Ensemble.
+
+        Returns:
+        list of tuples: Each tuple contains (table1, column1, table2, column2), where column2 is a key column that
+                        may contain the values of column1.
+        """
+        rows = [
+            row for row in dict.fromkeys(dataframe[['table_name', 'column_name', 'data_type']].itertuples(index=False, name=None))
+            if (row[0], row[1]) in signatures
+        ]
+
+        entries_by_type = {}
+        for table_name, column_name, data_type in rows:
+            if (table_name, column_name) in key_columns:
+                entries_by_type.setdefault(data_type, []).append(((table_name, column_name), signatures[(table_name, column_name)], sizes[(table_name, column_name)]))
+
+        ensembles = {}
+        for data_type, entries in entries_by_type.items():
+            ensembles[data_type] = MinHashLSHEnsemble(threshold=containment_threshold, num_perm=k, num_part=min(num_part, len(entries)))
+            ensembles[data_type].index(entries)
+
+        column_pairs = []
+        for table_name, column_name, data_type in rows:
+            if data_type not in ensembles:
+                continue
+
+            candidates = ensembles[data_type].query(signatures[(table_name, column_name)], sizes[(table_name, column_name)])
+
+            for candidate_table, candidate_column in sorted(candidates):
+                if candidate_table != table_name:
+                    column_pairs.append((table_name, column_name, candidate_table, candidate_column))
+
+        return column_pairs
+
+    def compute_containment_index_for_assets(self, dataframe, k, containment_threshold=0.8, seed=1, refresh_signatures=True, tables=None,
+                                             index_table_id='cardinality_index', min_key_cardinality=0.95, statistics_table_id='column_statistics'):
+        """
+        Finds the columns whose values are contained in a key column of another table, the signature of a foreign key.
+        Unlike the Jaccard similarity index, containment stays high when a small referencing column is compared to a
+        large key column. Columns are sketched into the 'minhash_signatures' table as in
+        compute_similarity_index_for_assets, and candidates are generated with an LSH Ensemble.
+
+        Args:
+        dataframe (pandas.DataFrame): DataFrame containing 'table_name', 'column_name', and 'data_type' columns.
+        k (int): Number of permutations used in MinHash calculation.
+        containment_threshold (float): Minimum containment for a column pair to be returned.
+        seed (int): Seed of the MinHash permutations.
+        refresh_signatures (bool): If False, reuses signatures already stored for a column instead of re-sketching it.
+        tables (list of str, optional): If given, only pairs involving these tables are computed.
+        index_table_id (str): Cardinality index the key columns are read from.
+        min_key_cardinality (float): Minimum cardinality of a key column.
+        statistics_table_id (str): Column statistics the distinct counts are read from, if they exist.
+
+        Returns:
+        list of tuples: Each tuple contains (table1, column1, table2, column2, containment), where the values of
+                        column1 are contained in the key column column2.
+        """
+        filtered_df = dataframe[~dataframe['table_name'].isin(INDEX_TABLES)]
+        selected_columns_df = filtered_df[['table_name', 'column_name', 'data_type']]
+        columns = list(selected_columns_df[['table_name', 'column_name']].itertuples(index=False, name=None))
+
+        self.build_minhash_signatures(columns, k, seed=seed, refresh=refresh_signatures)
+
+        with self.connections.reader() as conn:
+            key_df = conn.execute(
+                f"select table_name, column_name from {index_table_id} where cardinality >= ? - coalesce(cardinality_error, 0)",
+                [min_key_cardinality]
+            ).fetchdf()
+        key_columns = set(zip(key_df['table_name'], key_df['column_name']))
+
+        signatures = self.load_minhash_signatures(k, seed=seed)
+        sizes = self.load_column_sizes(signatures, statistics_table_id=statistics_table_id)
+
+        column_pairs = self.compute_containment_candidate_pairs(selected_columns_df, signatures, sizes, key_columns, k, containment_threshold)
+        if tables is not None:
+            tables = set(tables)
+            column_pairs = [pair for pair in column_pairs if pair[0] in tables or pair[2] in tables]
+
+        containment_df = []
+        for table1, col1, table2, col2 in column_pairs:
+            containment = self.compute_containment(signatures[(table1, col1)], signatures[(table2, col2)], sizes[(table1, col1)], sizes[(table2, col2)])
+            if containment >= containment_threshold:
+                containment_df.append((table1, col1, table2, col2, containment))
+
+        return containment_df
+
+    def create_containment_index_table(self, containment_index, tables=None):
+        """
+        Creates the 'containment_index' table in the DuckDB database and inserts the containment results in a single
+        bulk write.
+
+        Args:
+        containment_index (list of tuples): The containment results to be stored, where each tuple is
+                                            (table1, column1, table2, column2, containment).
+        tables (list of str, optional): If given, only the rows involving these tables are replaced by the results
+                                        instead of recreating the whole table.
         """
-        conn = duckdb.connect(self.db_path)
-        
         log = ""
-        
+
         try:
-            create_table_query = """
-                create or replace table similarity_index (
-                    table1 varchar,
-                    column1 varchar,
-                    table2 varchar,
-                    column2 varchar,
-                    similarity_index double
+            if tables is None:
+                self.bulk_writer.write('containment_index', containment_index, mode='replace', schema=CONTAINMENT_INDEX_SCHEMA)
+            else:
+                self.bulk_writer.write(
+                    'containment_index', containment_index, mode='append', schema=CONTAINMENT_INDEX_SCHEMA,
+                    delete_where="table1 in (select unnest(?::varchar[])) or table2 in (select unnest(?::varchar[]))",
+                    delete_params=[list(tables), list(tables)]
                 )
-                """
-            conn.execute(create_table_query)
+
+            log = log + ("Containment index table insert successful")
         except Exception as e:
-            log = log + (f"Similarity index table error: {e}")
+            BuildMetrics.active().fail(e)
+            log = log + (f"Containment index table insert error: {e}")
+
+        return log
 
+    def create_similarity_index_table(self, similarity_index, tables=None):
+        """
+        Creates a table in the DuckDB database and inserts the similarity results in a single bulk write.
+
+        Args:
+        similarity_index (list of tuples): The similarity results to be stored, where each tuple is 
+                                            (table1, column1, table2, column2, similarity_index).
+        tables (list of str, optional): If given, only the rows involving these tables are replaced by the results
+                                        instead of recreating the whole table.
+        """
+        log = ""
+        
         try:
-            # Insert the data into the table
-            insert_query = "insert into similarity_index (table1, column1, table2, column2, similarity_index) values (?, ?, ?, ?, ?)"
-            for result in similarity_index:
-                conn.execute(insert_query, result)
+            if tables is None:
+                self.bulk_writer.write('similarity_index', similarity_index, mode='replace', schema=SIMILARITY_INDEX_SCHEMA)
+            else:
+                self.bulk_writer.write(
+                    'similarity_index', similarity_index, mode='append', schema=SIMILARITY_INDEX_SCHEMA,
+                    delete_where="table1 in (select unnest(?::varchar[])) or table2 in (select unnest(?::varchar[]))",
+                    delete_params=[list(tables), list(tables)]
+                )
 
             log = log + ("Similarity index table insert successful")
         except Exception as e:
-            log = log + (f"Similarity index table insert error: {e}")         
+            BuildMetrics.active().fail(e)
+            log = log + (f"Similarity index table insert error: {e}")
             
-        conn.commit()
-        conn.close()
-
         return log
 
 class BigQuerySimilarityIndex:
     
-    def __init__(self, key_path):
+    def __init__(self, key_path, client=None, max_workers=None):
+        """
+        Initialize the SimilarityIndex class for BigQuery.
+
+        Args:
+        key_path (str): Path to the service account key file.
+        client (google.cloud.bigquery.Client, optional): Client to use instead of one created from key_path.
+        max_workers (int, optional): Number of tables sketched concurrently. Defaults to the number of CPUs.
+        """
         self.key_path = key_path
-        self.bigquery_helper = BigQueryHelper(key_path)
+        self.bigquery_helper = BigQueryHelper(key_path, client=client)
+        self.max_workers = max_workers or os.cpu_count() or 1
+
+    def build_bigquery_jaccard(self, project_id, dataset_id, table_id, target_dataset_id, target_table_id, k, replace, sketch_table_id='oqr_column_sketches', refresh_sketches=True):
+        """
+        Builds the similarity index of the columns listed in the cardinality index. Every column is sketched once
+        into the sketch table, and all same-type column pairs are compared locally against the stored sketches.
+
+        Args:
+        project_id (str): Project of the index tables.
+        dataset_id (str): Dataset holding the cardinality index, the sketch table and the similarity index.
+        table_id (str): Name of the cardinality index table.
+        target_dataset_id (str): Dataset of the source tables.
+        target_table_id (str): Name of the similarity index table.
+        k (int): Number of smallest fingerprints kept per column.
+        replace (bool): If True, replaces the similarity index instead of appending to it.
+        sketch_table_id (str): Name of the table the column sketches are stored in.
+        refresh_sketches (bool): If False, reuses the stored sketches of tables that were already sketched with k.
 
-    def build_bigquery_jaccard(self, project_id, dataset_id, table_id, target_dataset_id, target_table_id, k, replace):
+        Returns:
+        str: A log message.
+        """
         schema = [
             SchemaField('table_a', 'STRING', mode='REQUIRED'),
             SchemaField('column_a', 'STRING', mode='REQUIRED'),
@@ -179,18 +873,18 @@ class BigQuerySimilarityIndex:
         table = self.bigquery_helper.client.create_table(table, exists_ok=True)
 
         dataframe = self.bigquery_helper.get_bigquery_table_to_dataframe(dataset_id, table_id)
-        results = self.compute_jaccard_index_for_assets(project_id, dataframe, target_dataset_id, k)
+        sketches = self.build_bigquery_sketches(project_id, dataframe, target_dataset_id, dataset_id, sketch_table_id, k, refresh=refresh_sketches)
+        results = self.compute_jaccard_index_for_assets(project_id, dataframe, target_dataset_id, k, sketches=sketches)
 
         job_config = bigquery.LoadJobConfig(schema=schema)
         job_config.write_disposition = bigquery.WriteDisposition.WRITE_TRUNCATE if replace else bigquery.WriteDisposition.WRITE_APPEND
-        results_df = pd.DataFrame(results)
-        results_df.columns = [
+        results_df = pd.DataFrame(results, columns=[
             'table_a',
             'column_a',
             'table_b',
             'column_b',
             'jaccard'
-        ]
+        ])
         job = self.bigquery_helper.client.load_table_from_dataframe(results_df, table_ref, job_config=job_config)
         job.result()
         
@@ -198,46 +892,183 @@ class BigQuerySimilarityIndex:
 
         return log
 
-    def compute_jaccard_index_for_assets(self, project_id, dataframe, dataset, k):
-        selected_columns_df = dataframe[['table', 'column', 'datatype']]
-        column_pairs = set()
+    def sketch_bigquery_table(self, project_id, dataset, table, column_names, k):
+        """
+        Computes the bottom-k sketch, the k smallest distinct FARM_FINGERPRINT values, of every listed column of a
+        table in a single query. NULL is sketched as a value, TO_JSON_STRING's 'null', as in the per-pair queries.
+
+        Args:
+        project_id (str): Project of the table.
+        dataset (str): Dataset of the table.
+        table (str): Name of the table.
+        column_names (list of str): Columns of the table to sketch.
+        k (int): Number of smallest fingerprints kept per column.
+
+        Returns:
+        dict: Maps each column name to a sorted numpy.ndarray of at most k int64 fingerprints.
+        """
+        fingerprints = " UNION ALL ".join(
+            f"SELECT '{column_name}' AS column_name, FARM_FINGERPRINT(TO_JSON_STRING(t.`{column_name}`)) AS h "
+            f"FROM `{project_id}.{dataset}.{table}` AS t"
+            for column_name in column_names
+        )
+
+        query = f"""
+        SELECT column_name, h
+        FROM (
+            SELECT column_name, h, ROW_NUMBER() OVER (PARTITION BY column_name ORDER BY h) AS position
+            FROM (SELECT DISTINCT column_name, h FROM ({fingerprints}))
+        )
+        WHERE position <= {k}
+        """
+        rows = self.bigquery_helper.client.query(query).result().to_dataframe()
+
+        sketches = {column_name: np.array([], dtype=np.int64) for column_name in column_names}
+
+        for column_name, hashes in rows.groupby('column_name'):
+            sketches[column_name] = np.sort(hashes['h'].to_numpy(dtype=np.int64))
+
+        return sketches
+
+    def build_bigquery_sketches(self, project_id, dataframe, dataset, sketch_dataset_id, sketch_table_id, k, refresh=True):
+        """
+        Sketches every column listed in the dataframe with one query per table, running tables concurrently, and
+        stores the sketches in the sketch table with a single load job.
+
+        Args:
+        project_id (str): Project of the source tables and the sketch table.
+        dataframe (pandas.DataFrame): DataFrame containing 'table', 'column' and 'datatype' columns.
+        dataset (str): Dataset of the source tables.
+        sketch_dataset_id (str): Dataset of the sketch table.
+        sketch_table_id (str): Name of the sketch table.
+        k (int): Number of smallest fingerprints kept per column.
+        refresh (bool): If False, reuses the stored sketches of tables that were already sketched with k.
+
+        Returns:
+        dict: Maps (table, column) to its sketch.
+        """
+        schema = [
+            SchemaField('dataset', 'STRING', mode='REQUIRED'),
+            SchemaField('table', 'STRING', mode='REQUIRED'),
+            SchemaField('column', 'STRING', mode='REQUIRED'),
+            SchemaField('k', 'INTEGER', mode='REQUIRED'),
+            SchemaField('sketch', 'INTEGER', mode='REPEATED'),
+            SchemaField('built_at', 'TIMESTAMP'),
+        ]
+        sketch_ref = self.bigquery_helper.client.dataset(sketch_dataset_id).table(sketch_table_id)
+
+        sketches = {}
+        stored_tables = set()
+
+        if not refresh:
+            try:
+                self.bigquery_helper.client.get_table(sketch_ref)
+                stored = self.bigquery_helper.run_query(f"""
+                    SELECT table, column, sketch
+                    FROM `{project_id}.{sketch_dataset_id}.{sketch_table_id}`
+                    WHERE dataset = '{dataset}' AND k = {k}
+                """)
+                for table, column, sketch in stored.itertuples(index=False):
+                    sketches[(table, column)] = np.sort(np.asarray(sketch, dtype=np.int64))
+                    stored_tables.add(table)
+            except NotFound:
+                pass
+
+        tables = [
+            (table, list(dict.fromkeys(columns['column'])))
+            for table, columns in dataframe.groupby('table', sort=False)
+            if not all((table, column) in sketches for column in columns['column'])
+        ]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            table_sketches = list(executor.map(lambda table: self.sketch_bigquery_table(project_id, dataset, table[0], table[1], k), tables))
+
+        new_sketches = []
+        built_at = datetime.datetime.now(datetime.timezone.utc)
+
+        for (table, _), column_sketches in zip(tables, table_sketches):
+            for column, sketch in column_sketches.items():
+                sketches[(table, column)] = sketch
+                new_sketches.append((dataset, table, column, k, sketch.tolist(), built_at))
+
+        if new_sketches:
+            if refresh:
+                try:
+                    self.bigquery_helper.client.get_table(sketch_ref)
+                    sketch_table_exists = True
+                except NotFound:
+                    sketch_table_exists = False
+            else:
+                sketch_table_exists = bool(stored_tables & {table for table, _ in tables})
+
+            if sketch_table_exists:
+                # Stale sketches of tables that were sketched again are replaced; the table is shared with other
+                # datasets and other values of k, whose sketches are kept
+                sketched_tables = ", ".join(f"'{table}'" for table, _ in tables)
+                self.bigquery_helper.client.query(f"""
+                    DELETE FROM `{project_id}.{sketch_dataset_id}.{sketch_table_id}`
+                    WHERE dataset = '{dataset}' AND k = {k} AND table IN ({sketched_tables})
+                """).result()
+
+            job_config = bigquery.LoadJobConfig(schema=schema)
+            job_config.write_disposition = bigquery.WriteDisposition.WRITE_APPEND
+            sketches_df = pd.DataFrame(new_sketches, columns=['dataset', 'table', 'column', 'k', 'sketch', 'built_at'])
+            self.bigquery_helper.client.load_table_from_dataframe(sketches_df, sketch_ref, job_config=job_config).result()
+
+        return sketches
+
+    def compute_bottom_k_jaccard(self, sketch1, sketch2, k):
+        """
+        Estimates the Jaccard index of two columns from their bottom-k sketches: the k smallest fingerprints of the
+        union of both sketches are a uniform sample of the union of both columns, and the fraction of the sample found
+        in both sketches estimates the fraction of the union found in both columns. The estimate is exact when the
+        columns have fewer than k distinct values between them.
+
+        Args:
+        sketch1 (numpy.ndarray): Sorted bottom-k sketch of the first column.
+        sketch2 (numpy.ndarray): Sorted bottom-k sketch of the second column.
+        k (int): Number of smallest fingerprints kept per column.
+
+        Returns:
+        float: Estimated Jaccard index.
+        """
+        union_sample = np.union1d(sketch1, sketch2)[:k]
+
+        if len(union_sample) == 0:
+            return 0.0
+
+        in_both = np.isin(union_sample, sketch1, assume_unique=True) & np.isin(union_sample, sketch2, assume_unique=True)
+
+        return float(in_both.sum()) / len(union_sample)
+
+    def compute_jaccard_index_for_assets(self, project_id, dataframe, dataset, k, sketches=None):
+        """
+        Computes the Jaccard index of every pair of columns of the same type in different tables.
+
+        Args:
+        project_id (str): Project of the source tables.
+        dataframe (pandas.DataFrame): DataFrame containing 'table', 'column' and 'datatype' columns.
+        dataset (str): Dataset of the source tables.
+        k (int): Number of smallest fingerprints kept per column.
+        sketches (dict, optional): Maps (table, column) to its sketch. Columns without a sketch are sketched with one
+                                   query per table.
+
+        Returns:
+        list of tuples: Each tuple contains (table1, column1, table2, column2, jaccard_index).
+        """
         jaccard_results = []
 
-        for index1, row1 in selected_columns_df.iterrows():
-            for index2 in range(index1 + 1, len(selected_columns_df)):
-                row2 = selected_columns_df.iloc[index2]
-                table1, col1, type1 = row1['table'], row1['column'], row1['datatype']
-                table2, col2, type2 = row2['table'], row2['column'], row2['datatype']
-
-                # Ensure datatypes are the same and tables are different
-                if type1 == type2 and table1 != table2:
-                    pair = (table1, col1, table2, col2)
-
-                    # Avoid processing the same pair again
-                    if pair not in column_pairs:
-                        column_pairs.add(pair)
-
-                        # Query to compute Jaccard index
-                        query = f"""
-                        WITH minhash_A AS (
-                            SELECT DISTINCT FARM_FINGERPRINT(TO_JSON_STRING(t.{col1})) AS h
-                            FROM {project_id}.{dataset}.{table1} AS t
-                            ORDER BY h
-                            LIMIT {k}
-                        ),
-                        minhash_B AS (
-                            SELECT DISTINCT FARM_FINGERPRINT(TO_JSON_STRING(t.{col2})) AS h
-                            FROM {project_id}.{dataset}.{table2} AS t
-                            ORDER BY h
-                            LIMIT {k}
-                        )
-                        SELECT COUNT(*) / {k} AS APPROXIMATE_JACCARD_INDEX
-                        FROM minhash_A
-                        INNER JOIN minhash_B ON minhash_A.h = minhash_B.h
-                        """
-                        query_result = self.bigquery_helper.client.query(query).result()
-                        jaccard_index = list(query_result)[0].APPROXIMATE_JACCARD_INDEX
-
-                        jaccard_results.append((table1, col1, table2, col2, jaccard_index))
+        sketches = dict(sketches or {})
+        missing = dataframe[[(table, column) not in sketches for table, column in zip(dataframe['table'], dataframe['column'])]]
+
+        for table, columns in missing.groupby('table', sort=False):
+            for column, sketch in self.sketch_bigquery_table(project_id, dataset, table, list(dict.fromkeys(columns['column'])), k).items():
+                sketches[(table, column)] = sketch
+
+        # Datatypes are the same and tables are different for every enumerated pair
+        for table1, col1, table2, col2 in same_type_column_pairs(dataframe, 'table', 'column', 'datatype'):
+            jaccard_index = self.compute_bottom_k_jaccard(sketches[(table1, col1)], sketches[(table2, col2)], k)
+
+            jaccard_results.append((table1, col1, table2, col2, jaccard_index))
 
         return jaccard_results
@@ -1,13 +1,41 @@
 import pandas as pd
+import re
+import threading
+import time
 import uuid
 import json
+from concurrent.futures import ThreadPoolExecutor
 from google.cloud import bigquery
 from google.cloud.exceptions import NotFound
 
+from .metrics_class import BuildMetrics
+
+# Tables written by the index builds; they are excluded when profiling and serializing the source schema
+INDEX_TABLES = ('similarity_index', 'cardinality_index', 'relation_map', 'minhash_signatures', 'table_fingerprints', 'column_statistics', 'containment_index', 'csv_load_manifest', 'pipeline_state', 'oqr_build_metrics')
+
+# Column metadata discovered from INFORMATION_SCHEMA, keyed by (project, dataset or region), with the time it was read
+_METADATA_CACHE = {}
+_METADATA_CACHE_LOCK = threading.Lock()
+
+# INFORMATION_SCHEMA reports standard SQL type names, while Table.schema reports legacy ones; assets use the legacy names
+STANDARD_TO_LEGACY_TYPES = {
+    'INT64': 'INTEGER',
+    'FLOAT64': 'FLOAT',
+    'BOOL': 'BOOLEAN',
+    'STRUCT': 'RECORD',
+}
+
+ASSET_COLUMNS = ['uuid', 'dataset', 'table', 'column', 'datatype', 'description', 'cardinality', 'cardinality_method', 'cardinality_error']
+
 class BigQueryHelper:
-    def __init__(self, key_path):
+    def __init__(self, key_path, client=None, metadata_ttl=300, max_workers=8):
         self.key_path = key_path
-        self.client = self.create_bigquery_client()
+        # A client can be injected, e.g. the DuckDB-backed fake in tests/local_bigquery.py
+        self.client = client if client is not None else self.create_bigquery_client()
+        # Seconds column metadata read from INFORMATION_SCHEMA is reused for
+        self.metadata_ttl = metadata_ttl
+        # Number of concurrent API calls when falling back to crawling tables one by one
+        self.max_workers = max_workers
 
     def create_bigquery_client(self):
         client = bigquery.Client.from_service_account_json(self.key_path)
@@ -24,31 +52,142 @@ class BigQueryHelper:
         df = query_job.result().to_dataframe()
         return df
 
+    def get_asset_row(self, dataset_id, table_id, column_name, datatype, description):
+        unique_string = f"{dataset_id}_{table_id}_{column_name}"
+        unique_id = uuid.uuid5(uuid.NAMESPACE_DNS, unique_string)
+        unique_id_str = str(unique_id)
+        row = {
+            'uuid': unique_id_str,
+            'dataset': dataset_id,
+            'table': table_id,
+            'column': column_name,
+            'datatype': datatype,
+            'description': description,
+            'cardinality': None,
+            'cardinality_method': None,
+            'cardinality_error': None
+        }
+        return row
+
     def get_index_rows(self, dataset_id, dataset_ref):
+        """
+        Crawls the tables of a dataset through the API, fetching table schemas concurrently.
+        """
+        tables = list(self.client.list_tables(dataset_ref))
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            table_infos = list(executor.map(lambda table: self.client.get_table(dataset_ref.table(table.table_id)), tables))
+
         rows = []
-        tables = self.client.list_tables(dataset_ref)
-        for table in tables:
-            table_id = table.table_id
-            table_ref = dataset_ref.table(table_id)
-            table_info = self.client.get_table(table_ref)
+        for table, table_info in zip(tables, table_infos):
             for col in table_info.schema:
-                unique_string = f"{dataset_id}_{table_id}_{col.name}"
-                unique_id = uuid.uuid5(uuid.NAMESPACE_DNS, unique_string)
-                unique_id_str = str(unique_id)
-                row = {
-                    'uuid': unique_id_str,
-                    'dataset': dataset_id,
-                    'table': table_id,
-                    'column': col.name,
-                    'datatype': col.field_type,
-                    'description':col.description,
-                    'cardinality': None
-                }
-                rows.append(row)
+                rows.append(self.get_asset_row(dataset_id, table.table_id, col.name, col.field_type, col.description))
         return rows
 
-    def get_bigquery_assets(self, target_dataset_id=None):
+    def normalize_datatype(self, data_type):
+        """
+        Maps an INFORMATION_SCHEMA data type to the type name reported by the table API, e.g. INT64 to INTEGER,
+        STRUCT<...> to RECORD and ARRAY<INT64> to INTEGER. Type parameters such as STRING(10) are dropped.
+        """
+        data_type = data_type.strip().upper()
+
+        while data_type.startswith('ARRAY<') and data_type.endswith('>'):
+            data_type = data_type[len('ARRAY<'):-1].strip()
+
+        base_type = re.split(r'[<(]', data_type, maxsplit=1)[0].strip()
+
+        return STANDARD_TO_LEGACY_TYPES.get(base_type, base_type)
+
+    def get_column_metadata(self, dataset_id=None, region=None):
+        """
+        Reads table, column, type and description of every top-level column of a dataset, or of every dataset in a
+        region, from INFORMATION_SCHEMA in a single query. Results are cached for metadata_ttl seconds.
+
+        Args:
+            dataset_id (str, optional): Dataset to describe.
+            region (str, optional): Region to describe, e.g. 'us', when dataset_id is not given.
+
+        Returns:
+            list of dict: One asset row per column.
+        """
+        project_id = self.client.project
+        scope = f"{project_id}.{dataset_id}" if dataset_id is not None else f"{project_id}.region-{region.lower()}"
+        key = (project_id, dataset_id or f"region-{region.lower()}")
+
+        with _METADATA_CACHE_LOCK:
+            cached = _METADATA_CACHE.get(key)
+
+        if cached is not None and time.time() - cached[0] < self.metadata_ttl:
+            return [dict(row) for row in cached[1]]
+
+        query = f"""
+        SELECT
+            columns.table_schema AS dataset,
+            columns.table_name AS table_name,
+            columns.column_name AS column_name,
+            columns.data_type AS data_type,
+            paths.description AS description
+        FROM `{scope}.INFORMATION_SCHEMA.COLUMNS` AS columns
+        LEFT JOIN `{scope}.INFORMATION_SCHEMA.COLUMN_FIELD_PATHS` AS paths
+            ON columns.table_schema = paths.table_schema
+            AND columns.table_name = paths.table_name
+            AND columns.column_name = paths.column_name
+            AND paths.field_path = columns.column_name
+        ORDER BY columns.table_schema, columns.table_name, columns.ordinal_position
+        """
+        metadata = self.run_query(query)
+
+        rows = [
+            self.get_asset_row(dataset, table_name, column_name, self.normalize_datatype(data_type), description if isinstance(description, str) else None)
+            for dataset, table_name, column_name, data_type, description in metadata.itertuples(index=False)
+        ]
+
+        with _METADATA_CACHE_LOCK:
+            _METADATA_CACHE[key] = (time.time(), rows)
+
+        return [dict(row) for row in rows]
+
+    def invalidate_metadata_cache(self):
+        """
+        Drops the cached INFORMATION_SCHEMA metadata of this client's project, e.g. after tables were created.
+        """
+        with _METADATA_CACHE_LOCK:
+            for key in [key for key in _METADATA_CACHE if key[0] == self.client.project]:
+                del _METADATA_CACHE[key]
+
+    def get_bigquery_assets(self, target_dataset_id=None, region=None, use_information_schema=True):
+        """
+        Lists every column of a dataset, or of every dataset in the project, as rows of the cardinality index.
+
+        Args:
+            target_dataset_id (str, optional): Dataset to list. All datasets are listed if omitted.
+            region (str, optional): Region of the datasets. When listing all datasets, a region lets a single
+                                    INFORMATION_SCHEMA query cover all of them.
+            use_information_schema (bool): If True, reads metadata from INFORMATION_SCHEMA, falling back to crawling
+                                           tables through the API if that fails. If False, always crawls.
+
+        Returns:
+            pandas.DataFrame: One row per column.
+        """
         rows = []
+
+        if use_information_schema:
+            try:
+                if target_dataset_id is not None:
+                    rows = self.get_column_metadata(dataset_id=target_dataset_id)
+                elif region is not None:
+                    rows = self.get_column_metadata(region=region)
+                else:
+                    dataset_ids = [dataset.dataset_id for dataset in self.client.list_datasets()]
+                    with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                        for dataset_rows in executor.map(lambda dataset_id: self.get_column_metadata(dataset_id=dataset_id), dataset_ids):
+                            rows.extend(dataset_rows)
+
+                return pd.DataFrame(rows, columns=ASSET_COLUMNS)
+            except Exception as e:
+                BuildMetrics.active().fail(f"INFORMATION_SCHEMA discovery failed, crawling tables instead: {e}")
+                rows = []
+
         if target_dataset_id is not None:
             dataset_ref = self.client.dataset(target_dataset_id)
             rows.extend(self.get_index_rows(target_dataset_id, dataset_ref))
@@ -58,7 +197,7 @@ class BigQueryHelper:
                 dataset_ref = self.client.dataset(dataset_id)
                 rows.extend(self.get_index_rows(dataset_id, dataset_ref))
 
-        return pd.DataFrame(rows, columns=['uuid', 'dataset', 'table', 'column', 'datatype', 'description', 'cardinality'])
+        return pd.DataFrame(rows, columns=ASSET_COLUMNS)
     
     def run_query(self, query=None):
         if query is not None:
@@ -66,6 +205,25 @@ class BigQueryHelper:
             df = query_job.result().to_dataframe()
             return df
 
+    def get_tables_version(self, table_ids):
+        """
+        Returns a version token of tables from their last modification times, e.g. to key cached query results.
+
+        Args:
+            table_ids (list of str): Tables as 'dataset.table' or 'project.dataset.table'.
+
+        Returns:
+            tuple: (table_id, last modified) of each table, or None if there are no tables or one cannot be read.
+        """
+        if not table_ids:
+            return None
+
+        try:
+            return tuple((table_id, self.client.get_table(table_id).modified) for table_id in sorted(table_ids))
+        except Exception:
+            # e.g. a table the query creates, or a missing permission: the query then runs uncached and reports its own error
+            return None
+
     def list_datasets_and_tables(self, project_id):
         """
         Returns a dictionary with datasets as keys and lists of tables as values for the specified project_id.
@@ -88,7 +246,7 @@ class BigQueryHelper:
                 datasets_and_tables[dataset_id] = table_names
 
         except Exception as e:
-            print(f"Error occurred while listing datasets and tables: {e}")
+            BuildMetrics.active().fail(f"Error occurred while listing datasets and tables: {e}")
             return {}
 
         return datasets_and_tables
@@ -0,0 +1,80 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from .connection_class import DuckDBConnectionManager
+
+class DuckDBWorkerPool:
+    def __init__(self, db_path, max_workers=None):
+        """
+        Initialize the DuckDBWorkerPool class, which fans per-table and per-column work out over a pool of workers.
+        Results are always returned in the order of the submitted items, regardless of completion order.
+
+        Args:
+            db_path (str): Path to the DuckDB database file.
+            max_workers (int, optional): Number of concurrent workers. Defaults to the number of CPUs.
+        """
+
+        self.db_path = db_path
+        self.connections = DuckDBConnectionManager.get(db_path)
+        self.max_workers = max_workers or os.cpu_count() or 1
+
+    def map_cursors(self, fn, items):
+        """
+        Calls fn(cursor, item) for every item on a thread pool. Each worker thread gets its own cursor of the
+        database's shared connection, so all workers see the same database without opening it again.
+
+        Args:
+            fn (callable): Function taking a DuckDB cursor and an item.
+            items (iterable): Items to process.
+
+        Returns:
+            list: The result of fn for each item, in the order of the items.
+        """
+
+        items = list(items)
+
+        if self.max_workers == 1 or len(items) <= 1:
+            with self.connections.reader() as cursor:
+                return [fn(cursor, item) for item in items]
+
+        local = threading.local()
+        cursors = []
+        lock = threading.Lock()
+        # Worker cursors belong to the work of the calling thread
+        tracked = DuckDBConnectionManager.tracked_cursors()
+
+        def run(item):
+            if not hasattr(local, 'cursor'):
+                with DuckDBConnectionManager.track_cursors(tracked):
+                    local.cursor = self.connections.cursor()
+                with lock:
+                    cursors.append(local.cursor)
+            return fn(local.cursor, item)
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                return list(executor.map(run, items))
+        finally:
+            for cursor in cursors:
+                cursor.close()
+
+    def map_processes(self, fn, items):
+        """
+        Calls fn(item) for every item on a process pool, for CPU-bound Python work that would otherwise hold the GIL.
+
+        Args:
+            fn (callable): Picklable, module-level function taking an item.
+            items (iterable): Picklable items to process.
+
+        Returns:
+            list: The result of fn for each item, in the order of the items.
+        """
+
+        items = list(items)
+
+        if self.max_workers == 1 or len(items) <= 1:
+            return [fn(item) for item in items]
+
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(fn, items))
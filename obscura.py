@@ -1,11 +1,12 @@
 import streamlit as st
 import pandas as pd
-import duckdb
 import os
+import atexit
 import datetime
+import tempfile
 
 from streamlit import session_state as state
-from helpers import DuckDBSimilarityIndex, BigQuerySimilarityIndex, DuckDBCardinalityIndex, BigQueryCardinalityIndex, DuckDBRelationMap, callOpenAI, CSVLoaderToDuckDB, BigQueryHelper, BigQueryRelationMap
+from helpers import DuckDBSimilarityIndex, BigQuerySimilarityIndex, DuckDBCardinalityIndex, BigQueryCardinalityIndex, DuckDBRelationMap, callOpenAI, CSVLoaderToDuckDB, BigQueryHelper, BigQueryRelationMap, DuckDBIncrementalIndex, DuckDBConnectionManager, BuildJobRunner, QueryResultCache
 
 # Initializing session state values for persistence between application reruns
 
@@ -41,6 +42,28 @@ if 'openai_api_key' not in state:
 if 'openai_response' not in state:
     state.openai_response = None
 
+# Builds run in background threads shared by every session, so they survive reruns and browser refreshes
+build_runner = BuildJobRunner.get()
+
+# The BigQuery client is built once per key file rather than on every rerun. DuckDB connections are already shared
+# per database file by DuckDBConnectionManager.
+@st.cache_resource(show_spinner=False)
+def get_bigquery_helper(key_path):
+    return BigQueryHelper(key_path)
+
+# Keyed by the version of the database file, so the listing is read again once a build or query wrote to it
+@st.cache_data(show_spinner=False)
+def list_duckdb_tables(database_path, database_version):
+    with DuckDBConnectionManager.get(database_path).reader() as conn_query:
+        return conn_query.execute("select * from information_schema.tables").fetchdf()
+
+# Keyed by the number of finished builds; tables created outside the app show up after the TTL
+@st.cache_data(show_spinner=False, ttl=600)
+def list_bigquery_tables(key_path, project_id, build_generation):
+    datasets_and_tables = get_bigquery_helper(key_path).list_datasets_and_tables(project_id)
+    dataset_table_pairs = [(dataset, table) for dataset, tables in datasets_and_tables.items() for table in tables]
+    return pd.DataFrame(dataset_table_pairs, columns=['dataset', 'table'])
+
 # Streamlit UI
 st.title('Obscura Pro Machina')
 "---"
@@ -49,23 +72,33 @@ state.database_select = st.selectbox(label='Select your database', options=('Duc
 
 if state.database_select == 'DuckDB' and state.database_source != 'DuckDB':
     state.database_path = st.text_input('DuckDB File Path',value='demo_data.duckdb')
-    conn_query = duckdb.connect(state.database_path)
-    state.database_schema = conn_query.execute("select * from information_schema.tables").fetchdf()
     state.database_source = 'DuckDB'
-    conn_query.commit()
-    conn_query.close()
+
+if state.database_source == 'DuckDB':
+    # Memory budget, parallelism and spill location shared by every query on the database file
+    with st.expander('DuckDB Settings'):
+        memory_limit = st.text_input('Memory limit (e.g. 4GB)')
+        threads = st.number_input('Threads (0 for DuckDB default)', min_value=0, value=0, step=1)
+        temp_directory = st.text_input('Spill directory')
+    duckdb_connections = DuckDBConnectionManager.get(state.database_path, memory_limit=memory_limit or None, threads=threads or None, temp_directory=temp_directory or None)
+    for setting, error in duckdb_connections.rejected_settings.items():
+        st.warning(f"DuckDB setting {setting} was not applied, the default is used instead: {error}")
+    state.database_schema = list_duckdb_tables(state.database_path, duckdb_connections.version())
     
 if state.database_select == 'BigQuery' and state.database_source != 'BigQuery':
-    bigquery_connection = BigQueryHelper(key_path)
-    state.database_path = bigquery_connection.get_project_id_from_key_file()
-    project_id = state.database_path
-    datasets_and_tables = bigquery_connection.list_datasets_and_tables(project_id)
-    dataset_table_pairs = [(dataset, table) for dataset, tables in datasets_and_tables.items() for table in tables]
-    state.database_schema = pd.DataFrame(dataset_table_pairs, columns=['dataset', 'table'])
+    state.database_path = get_bigquery_helper(key_path).get_project_id_from_key_file()
     state.database_source = 'BigQuery'
 
+if state.database_source == 'BigQuery':
+    bigquery_connection = get_bigquery_helper(key_path)
+    state.database_schema = list_bigquery_tables(key_path, state.database_path, build_runner.generation)
+
 # Display schema information
 st.subheader('Database Schema')
+if st.button("Refresh Schema"):
+    list_duckdb_tables.clear()
+    list_bigquery_tables.clear()
+    st.rerun()
 st.dataframe(state.database_schema, use_container_width=True, hide_index=True)
 
 # SQL Query Input
@@ -73,79 +106,205 @@ st.dataframe(state.database_schema, use_container_width=True, hide_index=True)
 st.subheader('Write SQL Query')
 sql_query = st.text_area("Enter your SQL query here:")
 
+# Results of read-only queries, shared by every session and reused until the data they read changes
+@st.cache_resource(show_spinner=False)
+def get_query_cache():
+    query_cache = QueryResultCache(spill_dir=tempfile.mkdtemp(prefix='obscura_query_cache_'))
+    atexit.register(query_cache.clear)
+    return query_cache
+
+def run_query(sql):
+    query_cache = get_query_cache()
+    if state.database_source == 'DuckDB':
+        duckdb_connections = DuckDBConnectionManager.get(state.database_path)
+        database_version = duckdb_connections.version()
+
+        # Read-only queries do not wait for the writer, e.g. while a build is running
+        session = duckdb_connections.reader if QueryResultCache.is_cacheable(sql) else duckdb_connections.writer
+
+        def execute():
+            with session() as conn_query:
+                return conn_query.execute(sql).fetchdf()
+    elif state.database_source == 'BigQuery':
+        # Reading the tables' last_modified is free, unlike running the query again
+        database_version = bigquery_connection.get_tables_version(QueryResultCache.referenced_tables(sql))
+
+        def execute():
+            return bigquery_connection.run_query(sql)
+
+    version = (state.database_path, database_version) if database_version is not None else None
+    return query_cache.run(sql, version, execute)
+
+def show_query_result(sql):
+    try:
+        result, cached = run_query(sql)
+        if cached:
+            st.caption("Cached result: the data the query reads has not changed since it last ran.")
+        st.dataframe(result)
+    except Exception as e:
+        st.error(f"An error occurred: {e}")
+
 # Display Query Results
 if st.button('Run Query'):
-        try:
-            if state.database_source == 'DuckDB':
-                conn_query = duckdb.connect(state.database_path)
-                result = conn_query.execute(sql_query).fetchdf()
-                conn_query.commit()
-                conn_query.close()
-            elif state.database_source == 'BigQuery':
-                bigquery_connection = BigQueryHelper(key_path)
-                result = bigquery_connection.run_query(sql_query)
-            st.dataframe(result)
-        except Exception as e:
-            st.error(f"An error occurred: {e}")
+    show_query_result(sql_query)
 
 # Database utility functions        
 "---"
 st.subheader("Utilities")
 
+def submit_build(kind, label, target, **params):
+    # An identical build that is still queued or running is not started twice
+    key = BuildJobRunner.job_key(kind, state.database_path, **params)
+    db_path = state.database_path if state.database_source == 'DuckDB' else None
+    job, created = build_runner.submit(label, target, key, db_path=db_path)
+    if not created:
+        st.warning(f"{label} is already {job.status}.")
+
 col1, col2, col3, col4 = st.columns(4, gap="small")
 
 with col1:
     if state.database_source == 'DuckDB':
+        # Files are skipped when unchanged since they were last loaded
+        reload_all_files = st.checkbox("Reload unchanged files")
+        # Sources are converted once to Parquet and queried through views
+        stage_as_parquet = st.checkbox("Stage as Parquet")
         if st.button("Build Database File"):
             data_dir = 'data'
-            loader = CSVLoaderToDuckDB(data_dir, state.database_path)
-            loader.load_csv_files()
+            loader = CSVLoaderToDuckDB(data_dir, state.database_path, staging_dir='staging' if stage_as_parquet else None)
+            submit_build('load', "Build Database File", lambda job: loader.load_csv_files(skip_unchanged=not reload_all_files, display=False),
+                         reload_all_files=reload_all_files, stage_as_parquet=stage_as_parquet)
             
     if state.database_source == 'BigQuery':
         state.source_dataset = st.text_input('Source BigQuery Dataset')
         state.target_dataset = st.text_input('Target BigQuery Dataset')
 
 with col2:
+    approximate_cardinality = st.checkbox("Approximate cardinality")
     if st.button("Build Cardinality Index"):
         if state.database_source == 'DuckDB':
-            db_cardinality = DuckDBCardinalityIndex('demo_data.duckdb')
-            cardinality_index = db_cardinality.create_cardinality_table()
-            cardinality_update = db_cardinality.update_duckdb_table_with_cardinality()
+            db_cardinality = DuckDBCardinalityIndex(state.database_path)
+
+            def build_cardinality(job):
+                cardinality_index = db_cardinality.create_cardinality_table()
+                cardinality_update = db_cardinality.update_duckdb_table_with_cardinality(approximate=approximate_cardinality)
+                return [cardinality_index, cardinality_update]
         
         if state.database_source == 'BigQuery':
-            bigquery_connection = BigQueryHelper(key_path)
-            assets = bigquery_connection.get_bigquery_assets(state.source_dataset)
-            build_cardinality_index = BigQueryCardinalityIndex(key_path)
-            cardinality_index = build_cardinality_index.build_bigquery_index(state.database_path, assets, state.target_dataset,'oqr_cardinality_index',replace=True)
-            cardinality_update = build_cardinality_index.update_bigquery_table_with_cardinality(state.database_path, state.target_dataset,'oqr_cardinality_index')
+            source_dataset, target_dataset, project_id = state.source_dataset, state.target_dataset, state.database_path
+
+            def build_cardinality(job):
+                assets = bigquery_connection.get_bigquery_assets(source_dataset)
+                build_cardinality_index = BigQueryCardinalityIndex(key_path, client=bigquery_connection.client)
+                cardinality_index = build_cardinality_index.build_bigquery_index(project_id, assets, target_dataset,'oqr_cardinality_index',replace=True)
+                cardinality_update = build_cardinality_index.update_bigquery_table_with_cardinality(project_id, target_dataset,'oqr_cardinality_index', approximate=approximate_cardinality)
+                return [cardinality_index, cardinality_update]
         
-        st.write(cardinality_update)
+        submit_build('cardinality', "Build Cardinality Index", build_cardinality, approximate=approximate_cardinality,
+                     source_dataset=state.source_dataset, target_dataset=state.target_dataset)
         
 with col3:
-    if st.button("Build Similarity Index") and state.target_dataset is not None:
+    use_lsh = st.checkbox("LSH candidates")
+    # Column statistics are gathered with the cardinality index
+    prune_with_statistics = st.checkbox("Prune with column statistics")
+    statistics_table_id = 'column_statistics' if prune_with_statistics else None
+    # Containment finds foreign keys whose values are a small subset of the referenced key
+    use_containment = st.checkbox("Containment (foreign keys)")
+    containment_table_id = 'containment_index' if use_containment else None
+    # The target dataset only applies to BigQuery builds
+    if st.button("Build Similarity Index") and (state.database_source == 'DuckDB' or state.target_dataset is not None):
         # Number of minhash functions
         k = 128
         if state.database_source == 'DuckDB':
-            df_info_schema_cols = conn_query.execute("select * from information_schema.columns").fetchdf()
-            db_similarity = DuckDBSimilarityIndex('demo_data.duckdb')
-            similarity_results = db_similarity.compute_similarity_index_for_assets(df_info_schema_cols, k, similarity_threshold=0.8)
-            similarity_index = db_similarity.create_similarity_index_table(similarity_results)
-            st.write(similarity_index)
+            db_similarity = DuckDBSimilarityIndex(state.database_path)
+
+            def build_similarity(job):
+                with DuckDBConnectionManager.get(db_similarity.db_path).reader() as conn_query:
+                    df_info_schema_cols = conn_query.execute("select * from information_schema.columns").fetchdf()
+                similarity_results = db_similarity.compute_similarity_index_for_assets(
+                    df_info_schema_cols, k, similarity_threshold=0.8, use_lsh=use_lsh, statistics_table_id=statistics_table_id
+                )
+                logs = [db_similarity.create_similarity_index_table(similarity_results)]
+                if use_containment:
+                    containment_results = db_similarity.compute_containment_index_for_assets(df_info_schema_cols, k, containment_threshold=0.8, refresh_signatures=False)
+                    logs.append(db_similarity.create_containment_index_table(containment_results))
+                return logs
         if state.database_source == 'BigQuery':
-            db_similarity = BigQuerySimilarityIndex(key_path)
-            similarity_index = db_similarity.build_bigquery_jaccard(state.database_path, state.target_dataset, 'oqr_cardinality_index', state.source_dataset, 'oqr_similarity_index', k, replace=True)
-            st.write(similarity_index)
+            source_dataset, target_dataset, project_id = state.source_dataset, state.target_dataset, state.database_path
+
+            def build_similarity(job):
+                db_similarity = BigQuerySimilarityIndex(key_path, client=bigquery_connection.client)
+                return db_similarity.build_bigquery_jaccard(project_id, target_dataset, 'oqr_cardinality_index', source_dataset, 'oqr_similarity_index', k, replace=True)
+
+        submit_build('similarity', "Build Similarity Index", build_similarity, use_lsh=use_lsh, prune_with_statistics=prune_with_statistics,
+                     use_containment=use_containment, source_dataset=state.source_dataset, target_dataset=state.target_dataset)
 
 with col4:
+    # Verified edges carry their exact inclusion ratio, and only edges verified above it are serialized
+    verify_relations = st.checkbox("Verify relations")
+    min_verified_ratio = 0.95 if verify_relations else None
     if st.button("Build Relation Map"):
         if state.database_source == 'DuckDB':
-            db_relation_map = DuckDBRelationMap('demo_data.duckdb')
-            built_relation_map = db_relation_map.create_relation_map(index_table_id='cardinality_index', similarity_table_id='similarity_index')
-            st.write(built_relation_map)
+            db_relation_map = DuckDBRelationMap(state.database_path)
+
+            def build_relation_map(job):
+                built_relation_map = db_relation_map.create_relation_map(index_table_id='cardinality_index', similarity_table_id='similarity_index', statistics_table_id=statistics_table_id,
+                                                                          containment_table_id=containment_table_id)
+                logs = [built_relation_map]
+                if verify_relations:
+                    logs.append(db_relation_map.verify_relation_map('relation_map'))
+                return logs
         if state.database_source == 'BigQuery':
-            db_relation_map = BigQueryRelationMap(key_path)
-            built_relation_map = db_relation_map.build_bigquery_relation_map(state.database_path, state.target_dataset, 'oqr_cardinality_index', 'oqr_similarity_index', 'oqr_relation_map', sim_threshold=0.95, replace=True)
-            st.write(built_relation_map)
+            target_dataset, project_id = state.target_dataset, state.database_path
+
+            def build_relation_map(job):
+                db_relation_map = BigQueryRelationMap(key_path, client=bigquery_connection.client)
+                return db_relation_map.build_bigquery_relation_map(project_id, target_dataset, 'oqr_cardinality_index', 'oqr_similarity_index', 'oqr_relation_map', sim_threshold=0.95, replace=True)
+
+        submit_build('relation_map', "Build Relation Map", build_relation_map, prune_with_statistics=prune_with_statistics,
+                     use_containment=use_containment, verify_relations=verify_relations, target_dataset=state.target_dataset)
+
+if state.database_source == 'DuckDB':
+    if st.button("Refresh Changed Tables"):
+        # Rebuilds the cardinality index, similarity index and relation map only for tables that changed
+        incremental_index = DuckDBIncrementalIndex(state.database_path, similarity_threshold=0.8, approximate=approximate_cardinality, use_lsh=use_lsh,
+                                                   prune_with_statistics=prune_with_statistics, use_containment=use_containment,
+                                                   verify_relations=verify_relations)
+        submit_build('refresh', "Refresh Changed Tables", lambda job: incremental_index.refresh_indexes(), approximate=approximate_cardinality,
+                     use_lsh=use_lsh, prune_with_statistics=prune_with_statistics, use_containment=use_containment, verify_relations=verify_relations)
+
+# Progress of the builds, refreshed every second while one of them is queued or running
+polling_builds = build_runner.has_active_jobs()
+
+@st.fragment(run_every=1 if polling_builds else None)
+def show_build_jobs():
+    jobs = build_runner.list_jobs()
+    if not jobs:
+        return
+
+    st.subheader("Builds")
+    for job in jobs:
+        with st.container(border=True):
+            st.markdown(f"**{job.label}** ({job.status}, {job.elapsed():.0f}s)")
+            progress = job.progress()
+            if progress:
+                st.caption(" | ".join(f"{stage}: {counters['completed']} done, {counters['failed']} failed, {counters['rows_scanned']:,} rows"
+                                      for stage, counters in progress.items()))
+            for log in job.logs:
+                st.write(log)
+            if job.error:
+                st.error(job.error)
+            if job.is_active() and st.button("Cancel", key=f"cancel_{job.job_id}"):
+                job.cancel()
+
+    if not build_runner.has_active_jobs() and st.button("Clear Finished Builds"):
+        build_runner.clear_finished()
+        st.rerun()
+
+    # Once every build has finished, a full rerun stops the polling
+    if polling_builds and not build_runner.has_active_jobs():
+        st.rerun()
+
+show_build_jobs()
 
 "---"
 st.subheader("Relation Map")
@@ -153,11 +312,15 @@ st.subheader("Relation Map")
 if st.button("Serialize Relaion Map") or state.relation_map:
     # build_bigquery_relation_map(self, project_id, dataset_id, index_table_id, jaccard_table_id, target_table_id, sim_threshold=0, replace=False)
     if state.database_source == 'DuckDB':
-        db_relation_map = DuckDBRelationMap('demo_data.duckdb')
-        state.relation_map = db_relation_map.serialize_relation_map('relation_map')
+        db_relation_map = DuckDBRelationMap(state.database_path)
+        try:
+            state.relation_map = db_relation_map.serialize_relation_map('relation_map', min_verified_ratio=min_verified_ratio)
+        except Exception as e:
+            st.error(f"Relation map error: {e}")
+            st.stop()
 
     if state.database_source == 'BigQuery':
-        db_relation_map = BigQueryRelationMap(key_path)
+        db_relation_map = BigQueryRelationMap(key_path, client=bigquery_connection.client)
         state.relation_map = db_relation_map.serialize_bigquery_relation_map(state.database_path, state.target_dataset, 'oqr_cardinality_index', 'oqr_relation_map')
     
     download_map = state.relation_map.replace('#','').replace('*','')
@@ -186,6 +349,8 @@ if st.button("Serialize Relaion Map") or state.relation_map:
             query = choice.message.content
             st.write("SQL Query:")
             st.code(query, language="SQL")
+            if st.button("Run Generated Query", key=f"run_generated_query_{i}"):
+                show_query_result(query)
 
     if st.button("Clear Response"):
         state.openai_response = None
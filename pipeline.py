@@ -0,0 +1,86 @@
+"""
+Builds the indexes of a DuckDB database without the app, for scheduled rebuilds. Stages whose inputs did not change
+since their last successful run are skipped. The database file must not be open in the app meanwhile, as the app holds
+its lock while it runs.
+
+Run from the repository root:
+
+    python pipeline.py --db demo_data.duckdb --data-dir data --output relation_map.txt
+"""
+import argparse
+import json
+import sys
+
+from helpers import BuildMetrics, DuckDBConnectionManager, DuckDBIndexPipeline
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build the cardinality index, similarity index and relation map of a DuckDB database.")
+    parser.add_argument('--db', default='demo_data.duckdb', help="Path to the DuckDB database file. It cannot be open in the running app, which locks it.")
+    parser.add_argument('--data-dir', help="Directory of CSV files to load first. Without it, the database is used as is.")
+    parser.add_argument('--output', help="File the serialized relation map is written to.")
+    parser.add_argument('--k', type=int, default=128, help="Number of MinHash permutations.")
+    parser.add_argument('--similarity-threshold', type=float, default=0.8, help="Minimum similarity index of a stored column pair.")
+    parser.add_argument('--approximate', action='store_true', help="Estimate cardinalities with approx_count_distinct.")
+    parser.add_argument('--use-lsh', action='store_true', help="Generate similarity candidates with MinHash LSH.")
+    parser.add_argument('--prune-with-statistics', action='store_true', help="Prune candidates with the column statistics.")
+    parser.add_argument('--containment', action='store_true', help="Add foreign key edges found by containment.")
+    parser.add_argument('--verify', action='store_true', help="Verify relation map edges against the data.")
+    parser.add_argument('--min-verified-ratio', type=float, default=0.95, help="Minimum verified ratio of a serialized edge with --verify.")
+    parser.add_argument('--csv-options', help="JSON object mapping CSV file names to read_csv options.")
+    parser.add_argument('--staging-dir', help="Stage CSV files as Parquet in this directory.")
+    parser.add_argument('--max-workers', type=int, help="Number of concurrent workers per stage.")
+    parser.add_argument('--memory-limit', help="DuckDB memory limit, e.g. 4GB.")
+    parser.add_argument('--threads', type=int, help="Number of DuckDB threads.")
+    parser.add_argument('--temp-directory', help="Directory DuckDB spills to beyond the memory limit.")
+    parser.add_argument('--metrics-log', help="JSON-lines file the build metrics are appended to. They are always written to the oqr_build_metrics table.")
+    parser.add_argument('--profile-dir', help="Profile the hot paths with cProfile and write one .prof file per hot path to this directory.")
+    parser.add_argument('--force', nargs='*', help="Run the listed stages, or every stage if none are listed, even if their inputs are unchanged.")
+
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    connections = DuckDBConnectionManager.get(args.db, memory_limit=args.memory_limit, threads=args.threads, temp_directory=args.temp_directory)
+
+    metrics = BuildMetrics(args.db, log_path=args.metrics_log, profile=args.profile_dir is not None)
+
+    pipeline = DuckDBIndexPipeline(
+        args.db,
+        data_dir=args.data_dir,
+        output_path=args.output,
+        k=args.k,
+        similarity_threshold=args.similarity_threshold,
+        approximate=args.approximate,
+        use_lsh=args.use_lsh,
+        prune_with_statistics=args.prune_with_statistics,
+        use_containment=args.containment,
+        verify_relations=args.verify,
+        min_verified_ratio=args.min_verified_ratio,
+        csv_options=json.loads(args.csv_options) if args.csv_options else None,
+        staging_dir=args.staging_dir,
+        max_workers=args.max_workers,
+        metrics=metrics,
+    )
+
+    force = args.force if args.force else args.force == []
+    results = pipeline.run(force=force)
+
+    # The connection opens with the first stage, which is when DuckDB checks the settings
+    for setting, error in connections.rejected_settings.items():
+        print(f"DuckDB setting {setting} was not applied, the default was used instead: {error}")
+
+    for stage, (status, log) in results.items():
+        print(f"[{stage}] {status}")
+        print(log)
+
+    if args.profile_dir:
+        for path in metrics.write_profiles(args.profile_dir):
+            print(f"Profile written to {path}")
+
+    DuckDBConnectionManager.close_all()
+
+    return 1 if any(status in ('failed', 'blocked') for status, _ in results.values()) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,28 @@
+import os
+import sys
+
+import pytest
+
+# The tests import the helpers package from the repository root, and the test-support modules from this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from helpers import BigQueryHelper
+from local_bigquery import LocalBigQueryClient
+
+@pytest.fixture
+def bigquery_client():
+    """
+    A LocalBigQueryClient with a 'source' dataset of two tables, 'orders' referencing 'customers'.
+    """
+
+    client = LocalBigQueryClient()
+    client.create_dataset('source')
+    client.query("create table source.customers as select range as customer_id, 'name_' || (range % 40) as name from range(100)").result()
+    client.query("create table source.orders as select range as order_id, range % 100 as customer_id, range % 7 as status from range(500)").result()
+    client.reset_jobs()
+
+    # The metadata cache outlives a test, and every test's client is a new project with the same name
+    BigQueryHelper(None, client=client).invalidate_metadata_cache()
+
+    return client
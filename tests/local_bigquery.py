@@ -0,0 +1,350 @@
+import re
+import threading
+from collections import Counter
+
+import duckdb
+import pandas as pd
+from google.cloud import bigquery
+from google.cloud.bigquery import SchemaField
+from google.cloud.bigquery.table import Row
+from google.cloud.exceptions import NotFound
+
+# BigQuery column types and the DuckDB types they are stored as
+BIGQUERY_TO_DUCKDB_TYPES = {
+    'STRING': 'VARCHAR',
+    'BYTES': 'BLOB',
+    'INTEGER': 'BIGINT',
+    'INT64': 'BIGINT',
+    'FLOAT': 'DOUBLE',
+    'FLOAT64': 'DOUBLE',
+    'NUMERIC': 'DECIMAL(38, 9)',
+    'BOOLEAN': 'BOOLEAN',
+    'BOOL': 'BOOLEAN',
+    'DATE': 'DATE',
+    'DATETIME': 'TIMESTAMP',
+    'TIMESTAMP': 'TIMESTAMPTZ',
+    'TIME': 'TIME',
+    'JSON': 'JSON',
+}
+
+DUCKDB_TO_BIGQUERY_TYPES = {
+    'VARCHAR': 'STRING',
+    'BLOB': 'BYTES',
+    'TINYINT': 'INTEGER',
+    'SMALLINT': 'INTEGER',
+    'INTEGER': 'INTEGER',
+    'BIGINT': 'INTEGER',
+    'HUGEINT': 'INTEGER',
+    'UBIGINT': 'INTEGER',
+    'FLOAT': 'FLOAT',
+    'DOUBLE': 'FLOAT',
+    'BOOLEAN': 'BOOLEAN',
+    'DATE': 'DATE',
+    'TIMESTAMP': 'DATETIME',
+    'TIMESTAMP WITH TIME ZONE': 'TIMESTAMP',
+    'TIME': 'TIME',
+    'JSON': 'JSON',
+}
+
+# Standard SQL type names reported by the emulated INFORMATION_SCHEMA views
+DUCKDB_TO_STANDARD_SQL_TYPES = {
+    'VARCHAR': 'STRING',
+    'BLOB': 'BYTES',
+    'TINYINT': 'INT64',
+    'SMALLINT': 'INT64',
+    'INTEGER': 'INT64',
+    'BIGINT': 'INT64',
+    'HUGEINT': 'INT64',
+    'UBIGINT': 'INT64',
+    'FLOAT': 'FLOAT64',
+    'DOUBLE': 'FLOAT64',
+    'BOOLEAN': 'BOOL',
+    'DATE': 'DATE',
+    'TIMESTAMP': 'DATETIME',
+    'TIMESTAMP WITH TIME ZONE': 'TIMESTAMP',
+    'TIME': 'TIME',
+    'JSON': 'JSON',
+}
+
+# DuckDB macros standing in for the BigQuery functions used by the index builds
+BIGQUERY_FUNCTION_MACROS = [
+    "create or replace macro safe_divide(a, b) as case when b = 0 then null else a / b end",
+    "create or replace macro farm_fingerprint(x) as (hash(x)::hugeint - 9223372036854775808)::bigint",
+    # BigQuery serializes NULL as 'null', where DuckDB's to_json returns NULL
+    "create or replace macro to_json_string(x) as coalesce(to_json(x)::varchar, 'null')",
+]
+
+class LocalQueryJob:
+    def __init__(self, result):
+        """
+        Completed job returned by LocalBigQueryClient, mirroring the parts of a BigQuery job the helpers use.
+        """
+        self._result = result
+
+    def result(self):
+        return self._result
+
+class LocalRowIterator:
+    def __init__(self, dataframe):
+        """
+        Query result returned by LocalQueryJob.result, iterable as BigQuery rows or convertible to a DataFrame.
+        """
+        self._dataframe = dataframe
+        self.total_rows = len(dataframe)
+
+    def __iter__(self):
+        field_to_index = {column: i for i, column in enumerate(self._dataframe.columns)}
+
+        for values in self._dataframe.itertuples(index=False, name=None):
+            yield Row(values, field_to_index)
+
+    def to_dataframe(self):
+        return self._dataframe.copy()
+
+class LocalBigQueryClient:
+    def __init__(self, project='local_project', db_path=':memory:'):
+        """
+        Initialize the LocalBigQueryClient class, a stand-in for google.cloud.bigquery.Client backed by DuckDB, so the
+        BigQuery index builds can run and be checked offline. Datasets are DuckDB schemas, backticked identifiers and
+        the BigQuery functions used by the helpers are translated, and every job is recorded so tests can assert how
+        many queries, DML statements and load jobs a build issued.
+
+        Args:
+            project (str): Project ID reported by the client. It is also the DuckDB catalog name, so it must be a
+                           valid unquoted identifier for queries that reference tables without backticks.
+            db_path (str): DuckDB database holding the datasets. Defaults to an in-memory database.
+        """
+
+        self.project = project
+        self.jobs = []
+        self._jobs_lock = threading.Lock()
+        self._conn = duckdb.connect()
+        self._conn.execute(f"attach '{db_path}' as \"{project}\"")
+        self._conn.execute(f'use "{project}"')
+
+        for macro in BIGQUERY_FUNCTION_MACROS:
+            self._conn.execute(macro)
+
+    def _cursor(self):
+        cursor = self._conn.cursor()
+        cursor.execute(f'use "{self.project}"')
+        return cursor
+
+    def _record(self, job_type, detail):
+        with self._jobs_lock:
+            self.jobs.append((job_type, detail))
+
+    def job_counts(self):
+        """
+        Counts the recorded jobs by type: 'query' for SELECT statements, 'dml' for INSERT, UPDATE, DELETE and MERGE,
+        'ddl' for other statements and 'load' for load jobs.
+
+        Returns:
+            collections.Counter: Number of jobs of each type.
+        """
+        with self._jobs_lock:
+            return Counter(job_type for job_type, _ in self.jobs)
+
+    def reset_jobs(self):
+        with self._jobs_lock:
+            self.jobs = []
+
+    def translate_sql(self, sql, quote_keywords=True):
+        """
+        Translates BigQuery SQL to DuckDB SQL: backticked paths become quoted identifiers, BigQuery-only type names are
+        mapped to their DuckDB equivalents, and, in queries and DML, 'table' and 'column' (identifiers in BigQuery but
+        reserved words in DuckDB, and column names of the cardinality index) are quoted.
+        """
+        sql = re.sub(r'`([^`]*)\.INFORMATION_SCHEMA\.(\w+)`', lambda match: self._information_schema_view(match.group(1), match.group(2)), sql, flags=re.IGNORECASE)
+        sql = re.sub(r'`([^`]*)`', lambda match: '.'.join(f'"{part}"' for part in match.group(1).split('.')), sql)
+
+        # Only rewrite outside of string literals and quoted identifiers
+        parts = re.split(r"('(?:[^']|'')*'|\"[^\"]*\")", sql)
+
+        for i in range(0, len(parts), 2):
+            part = re.sub(r'\bINT64\b', 'BIGINT', parts[i], flags=re.IGNORECASE)
+            part = re.sub(r'\bFLOAT64\b', 'DOUBLE', part, flags=re.IGNORECASE)
+            part = re.sub(r'\bBYTES\b', 'BLOB', part, flags=re.IGNORECASE)
+
+            if quote_keywords:
+                part = re.sub(r'\b(table|column)\b', lambda match: f'"{match.group(1).lower()}"', part, flags=re.IGNORECASE)
+
+            parts[i] = part
+
+        return ''.join(parts)
+
+    def _information_schema_view(self, scope, view):
+        """
+        Returns a subquery emulating a BigQuery INFORMATION_SCHEMA view (TABLES, COLUMNS or COLUMN_FIELD_PATHS) of a
+        dataset or region scope such as 'project.dataset', 'dataset' or 'project.region-us'.
+        """
+        dataset_id = scope.split('.')[-1]
+        where = f"table_catalog = '{self.project}'"
+
+        if not dataset_id.lower().startswith('region-'):
+            where += f" and table_schema = '{dataset_id}'"
+
+        if view.upper() == 'TABLES':
+            return f"(select table_catalog, table_schema, table_name, table_type from information_schema.tables where {where})"
+
+        data_type = "case " + " ".join(
+            f"when data_type = '{duckdb_type}' then '{standard_type}' when data_type = '{duckdb_type}[]' then 'ARRAY<{standard_type}>'"
+            for duckdb_type, standard_type in DUCKDB_TO_STANDARD_SQL_TYPES.items()
+        ) + " when data_type like 'DECIMAL%' then 'NUMERIC' else 'STRING' end"
+
+        if view.upper() == 'COLUMNS':
+            return f"""(select table_catalog, table_schema, table_name, column_name, ordinal_position, {data_type} as data_type
+                from information_schema.columns where {where})"""
+
+        if view.upper() == 'COLUMN_FIELD_PATHS':
+            return f"""(select table_catalog, table_schema, table_name, column_name, column_name as field_path, {data_type} as data_type,
+                column_comment as description from information_schema.columns where {where})"""
+
+        raise NotFound(f"INFORMATION_SCHEMA.{view} is not available in the local client")
+
+    def _table_path(self, table):
+        """
+        Returns (dataset_id, table_id) of a Table, TableReference or 'project.dataset.table' string.
+        """
+        if isinstance(table, str):
+            table = bigquery.TableReference.from_string(table, default_project=self.project)
+
+        return table.dataset_id, table.table_id
+
+    def _column_type(self, field):
+        column_type = BIGQUERY_TO_DUCKDB_TYPES.get(field.field_type.upper(), 'VARCHAR')
+
+        return f"{column_type}[]" if field.mode == 'REPEATED' else column_type
+
+    def _table_exists(self, cursor, dataset_id, table_id):
+        return cursor.execute(
+            "select count(*) from information_schema.tables where table_catalog = ? and table_schema = ? and table_name = ?",
+            [self.project, dataset_id, table_id]
+        ).fetchone()[0] > 0
+
+    def query(self, query, job_config=None):
+        statement = query.strip().split(None, 1)[0].upper() if query.strip() else ''
+
+        if statement in ('SELECT', 'WITH', '('):
+            job_type = 'query'
+        elif statement in ('INSERT', 'UPDATE', 'DELETE', 'MERGE'):
+            job_type = 'dml'
+        else:
+            job_type = 'ddl'
+
+        self._record(job_type, query)
+
+        cursor = self._cursor()
+
+        try:
+            result = cursor.execute(self.translate_sql(query, quote_keywords=job_type != 'ddl'))
+            dataframe = result.fetchdf() if result.description is not None else pd.DataFrame()
+        finally:
+            cursor.close()
+
+        return LocalQueryJob(LocalRowIterator(dataframe))
+
+    def dataset(self, dataset_id, project=None):
+        return bigquery.DatasetReference(project or self.project, dataset_id)
+
+    def create_dataset(self, dataset, exists_ok=False):
+        dataset_id = dataset if isinstance(dataset, str) else dataset.dataset_id
+
+        with self._cursor() as cursor:
+            cursor.execute(f'create schema {"if not exists " if exists_ok else ""}"{dataset_id}"')
+
+        return bigquery.Dataset(self.dataset(dataset_id))
+
+    def list_datasets(self, project=None):
+        with self._cursor() as cursor:
+            dataset_ids = [row[0] for row in cursor.execute(
+                "select schema_name from information_schema.schemata where catalog_name = ? and schema_name not in ('main', 'information_schema', 'pg_catalog') order by 1",
+                [self.project]
+            ).fetchall()]
+
+        return [bigquery.Dataset(self.dataset(dataset_id, project)) for dataset_id in dataset_ids]
+
+    def list_tables(self, dataset):
+        dataset_id = dataset.split('.')[-1] if isinstance(dataset, str) else dataset.dataset_id
+
+        with self._cursor() as cursor:
+            table_ids = [row[0] for row in cursor.execute(
+                "select table_name from information_schema.tables where table_catalog = ? and table_schema = ? order by 1",
+                [self.project, dataset_id]
+            ).fetchall()]
+
+        return [bigquery.Table(self.dataset(dataset_id).table(table_id)) for table_id in table_ids]
+
+    def get_table(self, table):
+        dataset_id, table_id = self._table_path(table)
+
+        with self._cursor() as cursor:
+            columns = cursor.execute(
+                "select column_name, data_type, column_comment from information_schema.columns where table_catalog = ? and table_schema = ? and table_name = ? order by ordinal_position",
+                [self.project, dataset_id, table_id]
+            ).fetchall()
+
+        if not columns:
+            raise NotFound(f"Table {self.project}:{dataset_id}.{table_id} not found")
+
+        schema = []
+        for column_name, data_type, description in columns:
+            mode = 'REPEATED' if data_type.endswith('[]') else 'NULLABLE'
+            data_type = data_type.removesuffix('[]')
+            field_type = 'NUMERIC' if data_type.startswith('DECIMAL') else DUCKDB_TO_BIGQUERY_TYPES.get(data_type, 'STRING')
+            schema.append(SchemaField(column_name, field_type, mode=mode, description=description))
+
+        return bigquery.Table(self.dataset(dataset_id).table(table_id), schema=schema)
+
+    def create_table(self, table, exists_ok=False):
+        dataset_id, table_id = self._table_path(table)
+        self._record('api', f"create_table {dataset_id}.{table_id}")
+
+        with self._cursor() as cursor:
+            cursor.execute(f'create schema if not exists "{dataset_id}"')
+
+            if self._table_exists(cursor, dataset_id, table_id):
+                if not exists_ok:
+                    raise ValueError(f"Table {dataset_id}.{table_id} already exists")
+            else:
+                columns = ", ".join(f'"{field.name}" {self._column_type(field)}' for field in table.schema)
+                cursor.execute(f'create table "{dataset_id}"."{table_id}" ({columns})')
+
+        return self.get_table(table)
+
+    def delete_table(self, table, not_found_ok=False):
+        dataset_id, table_id = self._table_path(table)
+        self._record('api', f"delete_table {dataset_id}.{table_id}")
+
+        with self._cursor() as cursor:
+            if not self._table_exists(cursor, dataset_id, table_id):
+                if not_found_ok:
+                    return
+                raise NotFound(f"Table {self.project}:{dataset_id}.{table_id} not found")
+
+            cursor.execute(f'drop table "{dataset_id}"."{table_id}"')
+
+    def load_table_from_dataframe(self, dataframe, destination, job_config=None):
+        dataset_id, table_id = self._table_path(destination)
+        self._record('load', f"{dataset_id}.{table_id}")
+
+        schema = list(job_config.schema or []) if job_config is not None else []
+        truncate = job_config is not None and job_config.write_disposition == bigquery.WriteDisposition.WRITE_TRUNCATE
+
+        with self._cursor() as cursor:
+            cursor.execute(f'create schema if not exists "{dataset_id}"')
+            cursor.register('load_df', dataframe)
+
+            if not self._table_exists(cursor, dataset_id, table_id):
+                if schema:
+                    columns = ", ".join(f'"{field.name}" {self._column_type(field)}' for field in schema)
+                    cursor.execute(f'create table "{dataset_id}"."{table_id}" ({columns})')
+                else:
+                    cursor.execute(f'create table "{dataset_id}"."{table_id}" as select * from load_df where false')
+            elif truncate:
+                cursor.execute(f'delete from "{dataset_id}"."{table_id}"')
+
+            cursor.execute(f'insert into "{dataset_id}"."{table_id}" by name select * from load_df')
+            cursor.unregister('load_df')
+
+        return LocalQueryJob(None)
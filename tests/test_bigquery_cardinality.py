@@ -0,0 +1,60 @@
+import pytest
+
+from helpers import BigQueryCardinalityIndex, BigQueryHelper
+
+def build_index(client):
+    assets = BigQueryHelper(None, client=client).get_bigquery_assets('source')
+    cardinality_index = BigQueryCardinalityIndex(None, client=client)
+    cardinality_index.build_bigquery_index(client.project, assets, 'target', 'oqr_cardinality_index', replace=True)
+
+    return cardinality_index
+
+def cardinalities(client):
+    rows = client.query("SELECT table, column, cardinality FROM `target.oqr_cardinality_index`").result().to_dataframe()
+
+    return {(row['table'], row['column']): row['cardinality'] for row in rows.to_dict('records')}
+
+def test_single_scan_issues_one_select_per_table_one_load_and_one_merge(bigquery_client):
+    cardinality_index = build_index(bigquery_client)
+    bigquery_client.reset_jobs()
+
+    cardinality_index.update_bigquery_table_with_cardinality(bigquery_client.project, 'target', 'oqr_cardinality_index')
+
+    counts = bigquery_client.job_counts()
+    statements = [detail.strip().split(None, 1)[0].upper() for job_type, detail in bigquery_client.jobs if job_type in ('query', 'dml')]
+
+    # One read of the index, then one SELECT per source table
+    assert counts['query'] == 1 + 2
+    assert counts['load'] == 1
+    assert counts['dml'] == 1
+    assert statements.count('MERGE') == 1
+    assert 'UPDATE' not in statements
+
+def test_single_scan_matches_per_column_updates(bigquery_client):
+    cardinality_index = build_index(bigquery_client)
+    cardinality_index.update_bigquery_table_with_cardinality(bigquery_client.project, 'target', 'oqr_cardinality_index')
+    single_scan = cardinalities(bigquery_client)
+
+    cardinality_index = build_index(bigquery_client)
+    cardinality_index.update_bigquery_table_with_cardinality(bigquery_client.project, 'target', 'oqr_cardinality_index', single_scan=False)
+    per_column = cardinalities(bigquery_client)
+
+    assert single_scan == per_column
+    assert single_scan[('customers', 'customer_id')] == 1.0
+    assert single_scan[('orders', 'status')] == 7 / 500
+
+def test_single_scan_drops_the_staging_table_when_the_merge_fails(bigquery_client, monkeypatch):
+    cardinality_index = build_index(bigquery_client)
+    query = bigquery_client.query
+
+    def failing_merge(sql, job_config=None):
+        if sql.strip().upper().startswith('MERGE'):
+            raise RuntimeError("MERGE failed")
+        return query(sql, job_config=job_config)
+
+    monkeypatch.setattr(bigquery_client, 'query', failing_merge)
+
+    with pytest.raises(RuntimeError, match="MERGE failed"):
+        cardinality_index.update_bigquery_table_with_cardinality(bigquery_client.project, 'target', 'oqr_cardinality_index')
+
+    assert [table.table_id for table in bigquery_client.list_tables('target')] == ['oqr_cardinality_index']
@@ -0,0 +1,65 @@
+from helpers import BigQueryCardinalityIndex, BigQueryHelper, BigQuerySimilarityIndex
+
+def build_cardinality_index(client):
+    assets = BigQueryHelper(None, client=client).get_bigquery_assets('source')
+    BigQueryCardinalityIndex(None, client=client).build_bigquery_index(client.project, assets, 'target', 'oqr_cardinality_index', replace=True)
+
+def build_similarity_index(client, k=16):
+    similarity_index = BigQuerySimilarityIndex(None, client=client)
+
+    return similarity_index.build_bigquery_jaccard(client.project, 'target', 'oqr_cardinality_index', 'source', 'oqr_similarity_index', k, replace=True)
+
+def stored_sketches(client):
+    rows = client.query("SELECT dataset, k, table FROM `target.oqr_column_sketches`").result().to_dataframe()
+
+    return rows.groupby(['dataset', 'k'])['table'].nunique().to_dict()
+
+def test_build_issues_one_query_per_source_table_and_two_loads(bigquery_client):
+    build_cardinality_index(bigquery_client)
+    bigquery_client.reset_jobs()
+
+    build_similarity_index(bigquery_client)
+
+    counts = bigquery_client.job_counts()
+
+    # One read of the cardinality index, then one sketch query per source table
+    assert counts['query'] == 1 + 2
+    # The sketches and the similarity index are each written by one load job
+    assert counts['load'] == 2
+    assert counts['dml'] == 0
+
+def test_similarity_index_finds_the_shared_key(bigquery_client):
+    build_cardinality_index(bigquery_client)
+    build_similarity_index(bigquery_client)
+
+    rows = bigquery_client.query("SELECT table_a, column_a, table_b, column_b, jaccard FROM `target.oqr_similarity_index`").result().to_dataframe()
+    jaccard = {frozenset([(row['table_a'], row['column_a']), (row['table_b'], row['column_b'])]): row['jaccard'] for row in rows.to_dict('records')}
+
+    assert jaccard[frozenset([('customers', 'customer_id'), ('orders', 'customer_id')])] == 1.0
+
+def test_refresh_keeps_sketches_of_other_datasets_and_k(bigquery_client):
+    build_cardinality_index(bigquery_client)
+    build_similarity_index(bigquery_client, k=16)
+    bigquery_client.query("INSERT INTO `target.oqr_column_sketches` (dataset, table, column, k, sketch) VALUES ('other', 'customers', 'customer_id', 16, [1, 2, 3])").result()
+
+    build_similarity_index(bigquery_client, k=32)
+    bigquery_client.reset_jobs()
+    build_similarity_index(bigquery_client, k=16)
+
+    # Refreshing replaces the sketches of the sketched tables with one DELETE and appends the new ones
+    assert bigquery_client.job_counts()['dml'] == 1
+    assert stored_sketches(bigquery_client) == {('source', 16): 2, ('source', 32): 2, ('other', 16): 1}
+
+def test_null_is_sketched_as_a_value(bigquery_client):
+    # Both tables hold the customer ids and NULLs, so NULL counts towards their union and intersection alike
+    bigquery_client.query("create table source.refunds as select if(range < 100, range, null) as customer_id from range(120)").result()
+    bigquery_client.query("create table source.visits as select if(range < 100, range, null) as customer_id from range(150)").result()
+    build_cardinality_index(bigquery_client)
+    build_similarity_index(bigquery_client, k=128)
+
+    rows = bigquery_client.query("SELECT table_a, column_a, table_b, column_b, jaccard FROM `target.oqr_similarity_index`").result().to_dataframe()
+    jaccard = {frozenset([row['table_a'], row['table_b']]): row['jaccard'] for row in rows.to_dict('records') if row['column_a'] == row['column_b'] == 'customer_id'}
+
+    # NULL is a value of the nullable columns only, as TO_JSON_STRING(NULL) is 'null'
+    assert jaccard[frozenset(['refunds', 'visits'])] == 1.0
+    assert jaccard[frozenset(['customers', 'refunds'])] == 100 / 101
@@ -0,0 +1,55 @@
+import threading
+import time
+
+from helpers import BuildJobRunner, BuildMetrics, DuckDBConnectionManager, DuckDBWorkerPool
+
+def test_cancel_interrupts_only_the_queries_of_the_job(tmp_path):
+    db_path = str(tmp_path / 'jobs.duckdb')
+    connections = DuckDBConnectionManager.get(db_path)
+    started = threading.Barrier(3)
+
+    def build(job):
+        # The job queries on worker threads, as the index builds do
+        def query(cursor, _):
+            started.wait()
+            return cursor.execute("select count(*) from range(10000000000) a where a.range % 7 = 3").fetchone()[0]
+        return [str(result) for result in DuckDBWorkerPool(db_path, max_workers=2).map_cursors(query, range(2))]
+
+    runner = BuildJobRunner()
+    job, _ = runner.submit("Slow build", build, BuildJobRunner.job_key('slow', db_path), db_path=db_path)
+
+    # A query of another session, running while the job is cancelled
+    session_results = []
+    with connections.reader() as cursor:
+        session_query = threading.Thread(target=lambda: session_results.append(cursor.execute(
+            "select count(*) from range(300000000) a where a.range % 7 = 3"
+        ).fetchone()[0]))
+        started.wait()
+        session_query.start()
+        time.sleep(0.2)
+
+        assert job.cancel()
+        job.thread.join(timeout=30)
+        session_query.join(timeout=60)
+
+    assert job.status == 'cancelled'
+    assert session_results == [300000000 // 7 + 1]
+
+def test_job_status_comes_from_the_build_metrics(tmp_path):
+    db_path = str(tmp_path / 'jobs.duckdb')
+    runner = BuildJobRunner()
+
+    # Logs quoting data or column names are not failures
+    quoting, _ = runner.submit("Quoting build", lambda job: "Column cardinality_error: profiled", BuildJobRunner.job_key('quoting', db_path), db_path=db_path)
+
+    def handled_failure(job):
+        BuildMetrics.active().fail(ValueError("unreadable column"))
+        return "Sketched the readable columns"
+
+    failing, _ = runner.submit("Failing build", handled_failure, BuildJobRunner.job_key('failing', db_path), db_path=db_path)
+
+    for job in (quoting, failing):
+        job.thread.join(timeout=30)
+
+    assert quoting.status == 'completed'
+    assert failing.status == 'failed'
@@ -0,0 +1,23 @@
+import pyarrow as pa
+
+from helpers import DuckDBBulkWriter
+
+SCHEMA = pa.schema([('table_name', pa.string()), ('column_name', pa.string()), ('cardinality', pa.float64())])
+
+def test_merge_updates_matching_rows_and_inserts_the_others(tmp_path):
+    writer = DuckDBBulkWriter(str(tmp_path / 'writer.duckdb'))
+    writer.write_query('cardinality_index', """
+        select * from (values ('orders', 'id', 1.0::double, 'exact'), ('orders', 'status', 0.1::double, 'exact'))
+            as rows(table_name, column_name, cardinality, method)
+    """)
+
+    # Only some of the columns are merged: the others keep their values, and are null in inserted rows
+    writer.write(
+        'cardinality_index', [('orders', 'status', 0.2), ('customers', 'id', 1.0)], mode='merge', schema=SCHEMA,
+        key_columns=['table_name', 'column_name']
+    )
+
+    with writer.connections.reader() as conn:
+        rows = conn.execute("select * from cardinality_index order by all").fetchall()
+
+    assert rows == [('customers', 'id', 1.0, None), ('orders', 'id', 1.0, 'exact'), ('orders', 'status', 0.2, 'exact')]
@@ -0,0 +1,19 @@
+from helpers import DuckDBConnectionManager
+
+def test_invalid_setting_falls_back_to_the_default(tmp_path):
+    db_path = str(tmp_path / 'settings.duckdb')
+    connections = DuckDBConnectionManager.get(db_path, memory_limit='lots')
+
+    # An invalid value given before the connection opens does not prevent opening it
+    with connections.reader() as conn:
+        default_limit = conn.execute("select current_setting('memory_limit')").fetchone()[0]
+    assert 'memory_limit' in connections.rejected_settings
+
+    DuckDBConnectionManager.get(db_path, memory_limit='1GB')
+    assert connections.rejected_settings == {}
+
+    # An invalid value given later resets the setting to its default instead of failing every session
+    DuckDBConnectionManager.get(db_path, memory_limit='not a size')
+    with connections.reader() as conn:
+        assert conn.execute("select current_setting('memory_limit')").fetchone()[0] == default_limit
+    assert 'memory_limit' in connections.rejected_settings
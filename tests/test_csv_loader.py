@@ -0,0 +1,33 @@
+from helpers import CSVLoaderToDuckDB
+
+def write_orders(data_dir, rows):
+    data_dir.mkdir(exist_ok=True)
+    (data_dir / 'orders.csv').write_text("order_id,status\n" + "".join(f"{i},{i % 3}\n" for i in range(rows)))
+
+def test_reload_removes_only_the_stale_files_of_the_same_csv(tmp_path):
+    write_orders(tmp_path / 'data', 10)
+    staging_dir = tmp_path / 'staging'
+    loader = CSVLoaderToDuckDB(str(tmp_path / 'data'), str(tmp_path / 'obscura.duckdb'), staging_dir=str(staging_dir))
+    loader.connect_db()
+
+    assert "Successfully" in loader.load_csv_file('orders.csv')
+    first_staged = set(staging_dir.iterdir())
+
+    # A staged file of another CSV whose name starts with the same stem
+    other_staged = staging_dir / 'orders-archive-0123456789abcdef.parquet'
+    other_staged.write_bytes(b'')
+
+    write_orders(tmp_path / 'data', 20)
+    assert "Successfully" in loader.load_csv_file('orders.csv')
+
+    assert other_staged.exists()
+    assert not first_staged & set(staging_dir.iterdir())
+    assert loader.conn_build.execute("select count(*) from orders").fetchone()[0] == 20
+
+def test_staging_dir_with_a_quote(tmp_path):
+    write_orders(tmp_path / 'data', 10)
+    loader = CSVLoaderToDuckDB(str(tmp_path / 'data'), str(tmp_path / 'obscura.duckdb'), staging_dir=str(tmp_path / "o'staging"))
+    loader.connect_db()
+
+    assert "Successfully" in loader.load_csv_file('orders.csv')
+    assert loader.conn_build.execute("select count(*) from orders").fetchone()[0] == 10
@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+from datasketch import MinHash
+
+from helpers.minhash_class import BatchMinHash, _precomputed_hash
+
+@pytest.mark.parametrize('scheme', [None, 'legacy'])
+def test_batch_update_matches_per_value_update(scheme):
+    values = np.random.default_rng(0).integers(0, 10 ** 9, 50000)
+    sketch = BatchMinHash(num_perm=64, seed=7, chunk_size=4096)
+
+    # datasketch releases before 2.0 have no scheme argument, and only the legacy scheme
+    options = {} if scheme is None else {'scheme': scheme}
+    try:
+        expected = MinHash(num_perm=64, seed=7, hashfunc=_precomputed_hash, **options)
+    except TypeError:
+        pytest.skip("datasketch without permutation schemes")
+    sketch._minhash = expected.copy()
+
+    sketch.update(values[:20000])
+    sketch.update(values[20000:])
+    expected.update_batch(sketch.hash_values(values).tolist())
+
+    assert np.array_equal(sketch.minhash().hashvalues, expected.hashvalues)
+    assert sketch.row_count == len(values)
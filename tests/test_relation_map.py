@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+from helpers import DuckDBIndexPipeline, DuckDBRelationMap
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+def build_indexes(directory, **options):
+    """
+    Builds the cardinality index, similarity index and relation map of the bundled CSV files in a new database.
+    """
+
+    db_path = str(directory / 'obscura.duckdb')
+    results = DuckDBIndexPipeline(db_path, data_dir=DATA_DIR, staging_dir=str(directory / 'staging'), **options).run()
+    assert all(status == 'ran' for status, _ in results.values()), results
+
+    return db_path
+
+def read_sorted(db_path, query):
+    with DuckDBRelationMap(db_path).connections.reader() as conn:
+        return sorted(conn.execute(query).fetchall())
+
+@pytest.fixture
+def indexed_db(tmp_path):
+    """
+    A DuckDB database of the bundled CSV files with its cardinality index, similarity index and relation map.
+    """
+
+    return build_indexes(tmp_path)
+
+def test_serialize_unverified_map_asks_for_verification(indexed_db):
+    relation_map = DuckDBRelationMap(indexed_db)
+
+    with pytest.raises(ValueError, match="run verification first"):
+        relation_map.serialize_relation_map('relation_map', min_verified_ratio=0.95)
+
+    # Without verification, the whole map is serialized
+    assert relation_map.serialize_relation_map('relation_map')
+
+def test_serialize_verified_map(indexed_db):
+    relation_map = DuckDBRelationMap(indexed_db)
+
+    assert "successful" in relation_map.verify_relation_map('relation_map')
+    assert relation_map.serialize_relation_map('relation_map', min_verified_ratio=0.95)
+
+    # Rebuilding the edges of a table resets their verification, and leaves the other edges verified
+    assert "successful" in relation_map.create_relation_map('cardinality_index', 'similarity_index', tables=['sfdc_user'])
+
+    with relation_map.connections.reader() as conn:
+        verified_counts = dict(conn.execute("""
+            select table_name_left = 'sfdc_user' or table_name_right = 'sfdc_user', count(verified_ratio)
+            from relation_map group by 1
+        """).fetchall())
+
+    assert verified_counts[True] == 0 and verified_counts[False] > 0
+    assert relation_map.serialize_relation_map('relation_map', min_verified_ratio=0.95)
+
+def test_pruning_keeps_the_unpruned_results(tmp_path):
+    (tmp_path / 'unpruned').mkdir()
+    (tmp_path / 'pruned').mkdir()
+    unpruned = build_indexes(tmp_path / 'unpruned')
+    pruned = build_indexes(tmp_path / 'pruned', prune_with_statistics=True)
+
+    similarity_query = "select table1, column1, table2, column2, round(similarity_index, 6) from similarity_index"
+    relation_query = "select table_name_left, column_name_left, table_name_right, column_name_right, priority from relation_map"
+
+    assert read_sorted(unpruned, similarity_query)
+    assert read_sorted(pruned, similarity_query) == read_sorted(unpruned, similarity_query)
+    assert read_sorted(pruned, relation_query) == read_sorted(unpruned, relation_query)
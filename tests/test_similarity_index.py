@@ -0,0 +1,18 @@
+import pytest
+
+from helpers import DuckDBConnectionManager, DuckDBSimilarityIndex
+
+@pytest.mark.parametrize('use_processes', [False, True])
+def test_unreadable_column_is_not_stored(tmp_path, use_processes):
+    db_path = str(tmp_path / 'similarity.duckdb')
+    with DuckDBConnectionManager.get(db_path).writer() as conn:
+        conn.execute("create table customers as select range as customer_id from range(100)")
+
+    similarity_index = DuckDBSimilarityIndex(db_path, batch_size=None, max_workers=2, use_processes=use_processes)
+    similarity_index.build_minhash_signatures([('customers', 'customer_id'), ('customers', 'missing_column')], 64)
+
+    with similarity_index.connections.reader() as conn:
+        stored = conn.execute("select table_name, column_name, row_count from minhash_signatures").fetchall()
+
+    # A failed read is retried on the next build rather than cached as an empty column
+    assert stored == [('customers', 'customer_id', 100)]